@@ -14,6 +14,15 @@ admin.site.register(TheatreHall)
 admin.site.register(Genre)
 admin.site.register(Actor)
 admin.site.register(Play)
-admin.site.register(Performance)
 admin.site.register(Reservation)
-admin.site.register(Ticket)
+
+
+@admin.register(Performance)
+class PerformanceAdmin(admin.ModelAdmin):
+    list_select_related = ("play",)
+
+
+@admin.register(Ticket)
+class TicketAdmin(admin.ModelAdmin):
+    list_select_related = ("performance__play",)
+    raw_id_fields = ("performance", "reservation")
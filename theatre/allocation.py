@@ -0,0 +1,116 @@
+"""Best-available seat allocation over an in-memory occupancy grid.
+
+Each row of the grid is a string of ``0`` (free) and ``1`` (sold or held)
+characters sliced out of the performance seat map, so free runs are found
+with a regular expression instead of a Python loop per seat. Within a run
+the block closest to the centre of the row is the only one worth scoring,
+which keeps the search linear in the number of free runs.
+"""
+import re
+
+from theatre import holds
+
+FREE_RUN = re.compile("0+")
+
+# How much one row away from the middle costs compared to moving the block
+# all the way from the centre of a row to its edge.
+ROW_WEIGHT = 1.5
+
+MAX_HOLD_ATTEMPTS = 10
+
+
+class NoSeatsAvailable(Exception):
+    pass
+
+
+def occupancy_rows(seat_map, held_seats=()):
+    """Return the occupancy of each row as a string of ``0``/``1``."""
+    total = seat_map.rows * seat_map.seats_in_row
+    grid = format(
+        int.from_bytes(seat_map.bits, "big"), f"0{len(seat_map.bits) * 8}b"
+    )[:total]
+    rows = [
+        grid[start: start + seat_map.seats_in_row]
+        for start in range(0, total, seat_map.seats_in_row)
+    ]
+    for row, seat in held_seats:
+        if 1 <= row <= seat_map.rows and 1 <= seat <= seat_map.seats_in_row:
+            line = rows[row - 1]
+            rows[row - 1] = line[: seat - 1] + "1" + line[seat:]
+    return rows
+
+
+def score_block(row, first_seat, party_size, rows, seats_in_row):
+    """Lower is better: distance of the block from the centre of its row
+    and of the row from the middle of the hall, both scaled to ``[0, 1]``."""
+    seat_centre = (seats_in_row + 1) / 2
+    block_centre = first_seat + (party_size - 1) / 2
+    row_centre = (rows + 1) / 2
+    seat_distance = abs(block_centre - seat_centre) / max(seat_centre - 1, 1)
+    row_distance = abs(row - row_centre) / max(row_centre - 1, 1)
+    return round(seat_distance + ROW_WEIGHT * row_distance, 6)
+
+
+def candidate_blocks(seat_map, party_size, held_seats=(), rows=None):
+    """Return ``(score, row, first_seat)`` of the best block in every free
+    run that fits the party, best first."""
+    seats_in_row = seat_map.seats_in_row
+    ideal_start = round((seats_in_row - party_size) / 2) + 1
+    allowed_rows = set(rows) if rows else None
+
+    candidates = []
+    for row, line in enumerate(occupancy_rows(seat_map, held_seats), start=1):
+        if allowed_rows is not None and row not in allowed_rows:
+            continue
+        for run in FREE_RUN.finditer(line):
+            first, last = run.start() + 1, run.end()
+            if last - first + 1 < party_size:
+                continue
+            start = min(max(ideal_start, first), last - party_size + 1)
+            candidates.append(
+                (
+                    score_block(
+                        row, start, party_size, seat_map.rows, seats_in_row
+                    ),
+                    row,
+                    start,
+                )
+            )
+    candidates.sort()
+    return candidates
+
+
+def allocate(performance, party_size, rows=None, hold_for=None, minutes=None):
+    """Find the best block of adjacent free seats of a performance.
+
+    With ``hold_for`` (a user id) the block is held right away; if another
+    request wins a race for some of its seats, the next best block is tried.
+    Returns ``(score, seats, hold)``.
+    """
+    held_seats = holds.held_seats(performance.id)
+    candidates = candidate_blocks(
+        performance.seat_map, party_size, held_seats, rows
+    )
+    if not candidates:
+        raise NoSeatsAvailable
+
+    if hold_for is None:
+        score, row, start = candidates[0]
+        return score, _block(row, start, party_size), None
+
+    lost = set()
+    for score, row, start in candidates[:MAX_HOLD_ATTEMPTS]:
+        seats = _block(row, start, party_size)
+        if lost.intersection(seats):
+            continue
+        try:
+            hold = holds.hold_seats(hold_for, performance, seats, minutes)
+        except holds.SeatsUnavailable as e:
+            lost.update(e.seats)
+            continue
+        return score, seats, hold
+    raise NoSeatsAvailable
+
+
+def _block(row, start, party_size):
+    return [(row, seat) for seat in range(start, start + party_size)]
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class TheatreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'theatre'
+
+    def ready(self):
+        from theatre import signals  # noqa: F401
+        from theatre_service.db import checks  # noqa: F401
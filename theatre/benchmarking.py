@@ -0,0 +1,277 @@
+"""Helpers shared by the ``benchmark_*`` management commands.
+
+Benchmarks run against a throwaway database created the same way the test
+runner creates one, so they can be pointed at any settings without touching
+real data. Requests are timed end to end through the DRF test client,
+together with the number of queries each of them runs.
+"""
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, connections
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from rest_framework.views import APIView
+
+from theatre.models import (
+    Performance,
+    Play,
+    Reservation,
+    TheatreHall,
+    Ticket,
+)
+
+# Metrics compared between runs; for each, whether a higher value is better.
+COMPARED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "queries_per_request": False,
+    "throughput_rps": True,
+}
+
+
+@dataclass
+class Sample:
+    latency: float
+    queries: int
+    status: int
+    conflict: bool = False
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples, elapsed):
+    latencies = [sample.latency * 1000 for sample in samples]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample.status)] = statuses.get(str(sample.status), 0) + 1
+    return {
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+        "p99_ms": _round(percentile(latencies, 99)),
+        "max_ms": _round(max(latencies, default=None)),
+        "queries_per_request": _round(
+            statistics.fmean(sample.queries for sample in samples)
+            if samples
+            else None
+        ),
+        "max_queries": max((sample.queries for sample in samples), default=0),
+        "conflict_rate": _round(
+            sum(sample.conflict for sample in samples) / len(samples)
+            if samples
+            else None
+        ),
+        "statuses": statuses,
+    }
+
+
+def _round(value, digits=3):
+    return None if value is None else round(value, digits)
+
+
+def run_concurrently(request, requests, concurrency):
+    """Call ``request(worker_state)`` ``requests`` times from ``concurrency``
+    threads and summarize the samples.
+
+    ``request`` returns ``(status, conflict)``. ``worker_state`` is a dict
+    private to the calling thread, e.g. to keep a client in.
+    """
+    counter = iter(range(requests))
+    lock = threading.Lock()
+    samples = []
+
+    def worker():
+        state = {}
+        own_samples = []
+        try:
+            while True:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    status, conflict = request(state)
+                    latency = time.perf_counter() - started
+                own_samples.append(
+                    Sample(latency, len(queries), status, conflict)
+                )
+        finally:
+            connections.close_all()
+        with lock:
+            samples.extend(own_samples)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return summarize(samples, time.perf_counter() - started)
+
+
+@contextmanager
+def benchmark_environment(keepdb=False, verbosity=0):
+    """Run against a fresh test database with request throttling off."""
+    for alias in connections:
+        database = connections[alias].settings_dict
+        if connections[alias].vendor == "sqlite" and not database["TEST"].get(
+            "NAME"
+        ):
+            # Writers to a shared in-memory database fail at once when the
+            # table is locked instead of waiting their turn as they do on a
+            # database file.
+            database["TEST"]["NAME"] = os.path.join(
+                tempfile.gettempdir(), f"benchmark_{alias}.sqlite3"
+            )
+
+    setup_test_environment()
+    old_config = setup_databases(
+        verbosity=verbosity, interactive=False, keepdb=keepdb
+    )
+    # Rejected requests are expected and would flood the output.
+    request_logger = logging.getLogger("django.request")
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        with mock.patch.object(APIView, "get_throttles", return_value=[]):
+            yield
+    finally:
+        request_logger.setLevel(level)
+        teardown_databases(old_config, verbosity=verbosity, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed(
+    halls=2,
+    rows=20,
+    seats_in_row=30,
+    performances=10,
+    users=20,
+    sold_rows=0,
+    start=datetime(2030, 1, 1, 19, tzinfo=timezone.utc),
+):
+    """Create halls with ``performances`` performances each, one play per
+    hall and ``users`` users, and sell the last ``sold_rows`` rows of every
+    performance. Returns the created users and performances."""
+    User = get_user_model()
+    password = make_password(None)
+    created_users = User.objects.bulk_create(
+        User(email=f"benchmark{index}@example.com", password=password)
+        for index in range(users)
+    )
+    created_halls = TheatreHall.objects.bulk_create(
+        TheatreHall(name=f"Hall {index}", rows=rows, seats_in_row=seats_in_row)
+        for index in range(halls)
+    )
+    plays = Play.objects.bulk_create(
+        Play(title=f"Play {index}", description="Benchmark play")
+        for index in range(halls)
+    )
+    created_performances = Performance.objects.bulk_create(
+        Performance(
+            show_time=start + timedelta(days=day),
+            play=play,
+            theatre_hall=hall,
+        )
+        for hall, play in zip(created_halls, plays)
+        for day in range(performances)
+    )
+    if sold_rows:
+        reservations = Reservation.objects.bulk_create(
+            Reservation(user=created_users[index % len(created_users)])
+            for index in range(len(created_performances))
+        )
+        Ticket.objects.bulk_reserve(
+            Ticket(
+                row=row,
+                seat=seat,
+                performance=performance,
+                reservation=reservation,
+            )
+            for performance, reservation in zip(
+                created_performances, reservations
+            )
+            for row in range(rows - sold_rows + 1, rows + 1)
+            for seat in range(1, seats_in_row + 1)
+        )
+    return created_users, created_performances
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def write_results(path, results):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+def read_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(results, baseline, threshold=10.0):
+    """Return ``(scenario, metric, before, after, change %, regressed)`` for
+    every compared metric present in both result sets. A metric regressed
+    if it got worse by more than ``threshold`` percent."""
+    rows = []
+    for scenario, after in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if before.get(metric) is None or after.get(metric) is None:
+                continue
+            if before[metric]:
+                change = (after[metric] - before[metric]) / before[metric] * 100
+            else:
+                change = 0.0 if after[metric] == before[metric] else math.inf
+            regressed = (
+                change < -threshold if higher_is_better else change > threshold
+            )
+            rows.append(
+                (
+                    scenario,
+                    metric,
+                    before[metric],
+                    after[metric],
+                    round(change, 1),
+                    regressed,
+                )
+            )
+    return rows
@@ -0,0 +1,232 @@
+"""Version stamps and the response cache built on top of them.
+
+A version stamp is an opaque number stored in the cache under a name such as
+``performances:42``. Cached responses are keyed by the stamps of everything
+they were built from, so bumping a stamp makes every dependent response
+unreachable at once without having to find and delete it. Stamps are taken
+from the clock rather than incremented, so a stamp evicted from the cache
+comes back as a new value instead of resurrecting old entries.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from theatre_service import db_router, metrics
+
+HITS_KEY = "response-cache:hits"
+MISSES_KEY = "response-cache:misses"
+LOCK_TIMEOUT = 5
+LOCK_WAIT = 1.0
+
+
+def _version_key(name):
+    return f"version:{name}"
+
+
+def _new_stamp():
+    return time.time_ns()
+
+
+def get_versions(*names):
+    """Return the current stamp of each name, creating missing ones."""
+    keys = {_version_key(name): name for name in names}
+    stamps = cache.get_many(keys)
+    for key in set(keys) - set(stamps):
+        cache.add(key, _new_stamp(), None)
+        stamps[key] = cache.get(key)
+    return {keys[key]: stamp for key, stamp in stamps.items()}
+
+
+def bump(*names):
+    stamp = _new_stamp()
+    cache.set_many({_version_key(name): stamp for name in names}, None)
+
+
+def bump_on_commit(*names):
+    """Bump stamps now and again once the current transaction commits.
+
+    The first bump hides cached responses right away; the second one drops
+    responses that concurrent requests rebuilt from the database before
+    the write became visible to them.
+    """
+    bump(*names)
+    transaction.on_commit(lambda: bump(*names))
+
+
+@contextmanager
+def lock(key):
+    """Best-effort mutex around read-modify-write of a cache entry."""
+    key = f"{key}:lock"
+    deadline = time.monotonic() + LOCK_WAIT
+    locked = cache.add(key, 1, LOCK_TIMEOUT)
+    while not locked and time.monotonic() < deadline:
+        time.sleep(0.005)
+        locked = cache.add(key, 1, LOCK_TIMEOUT)
+    try:
+        yield
+    finally:
+        if locked:
+            cache.delete(key)
+
+
+def performance_day(show_time):
+    return f"performances:day:{timezone.localdate(show_time).isoformat()}"
+
+
+def _count(key):
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, None)
+
+
+def _replica_window():
+    """Extra digest parts of a response read from a replica.
+
+    A replica may not have caught up with stamps already bumped on the
+    primary, so whatever is built from it is only trusted until the current
+    ``REPLICA_RESPONSE_CACHE_TIMEOUT`` window ends.
+    """
+    window = max(settings.REPLICA_RESPONSE_CACHE_TIMEOUT, 1)
+    return "replica", int(time.time()) // window
+
+
+def get_stats():
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    return {
+        "hits": counts.get(HITS_KEY, 0),
+        "misses": counts.get(MISSES_KEY, 0),
+    }
+
+
+class VersionedViewMixin:
+    """Views return the version stamp names a response depends on from
+    ``get_cache_versions``; the stamps are read once per request."""
+
+    def get_cache_versions(self):
+        raise NotImplementedError
+
+    def get_current_versions(self):
+        if getattr(self, "_current_versions", None) is None:
+            self._current_versions = get_versions(*self.get_cache_versions())
+        return self._current_versions
+
+    def get_request_digest(self, *extra):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in self.request.query_params.lists()
+        )
+        return hashlib.md5(
+            repr(
+                (
+                    self.request.path,
+                    params,
+                    sorted(self.get_current_versions().items()),
+                    *extra,
+                )
+            ).encode()
+        ).hexdigest()
+
+
+class ConditionalGetMixin(VersionedViewMixin):
+    """Answer ``If-None-Match`` and ``If-Modified-Since`` on ``list``.
+
+    The strong ETag is derived from the request and the version stamps, and
+    ``Last-Modified`` from the newest stamp, so an unchanged resource gets a
+    304 before any query or serializer runs. Views with a ``retrieve``
+    action wrap it with ``conditional_response`` themselves.
+
+    Requests read from a replica still get a 304 for the ETag of the
+    current stamps, but a response they build is given an ETag that also
+    depends on the replica window and no ``Last-Modified``, so a client
+    does not revalidate a page the replica built behind the primary for
+    longer than that window.
+    """
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        media_type = request.accepted_media_type
+        etag = '"%s"' % self.get_request_digest(media_type)
+        last_modified = max(self.get_current_versions().values()) // 10**9
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None and db_router.reading_from_replica():
+            etag = '"%s"' % self.get_request_digest(
+                media_type, *_replica_window()
+            )
+            last_modified = None
+            response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+
+class CachedResponseMixin(VersionedViewMixin):
+    """Serve ``list`` and ``retrieve`` from the cache.
+
+    The response data is cached under the request host, path, normalized
+    query parameters and the current version stamps. Requests read from a
+    replica are served a page built on the primary when there is one;
+    otherwise what they build is cached apart, for the current replica
+    window only, so a lagging replica cannot store a stale page under
+    stamps already bumped on the primary for longer than that.
+    """
+
+    cache_timeout = None
+
+    def get_response_cache_key(self, *extra):
+        digest = self.get_request_digest(self.request.get_host(), *extra)
+        return f"response:{self.basename}:{self.action}:{digest}"
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        keys = [self.get_response_cache_key()]
+        timeout = self.cache_timeout or settings.RESPONSE_CACHE_TIMEOUT
+        if db_router.reading_from_replica():
+            keys.append(self.get_response_cache_key(*_replica_window()))
+            timeout = min(timeout, settings.REPLICA_RESPONSE_CACHE_TIMEOUT)
+        cached = cache.get_many(keys)
+        data = next((cached[key] for key in keys if key in cached), None)
+        if data is not None:
+            _count(HITS_KEY)
+            metrics.RESPONSE_CACHE_HITS.labels(
+                metrics.route_of(request)
+            ).inc()
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+
+        _count(MISSES_KEY)
+        metrics.RESPONSE_CACHE_MISSES.labels(metrics.route_of(request)).inc()
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(keys[-1], response.data, timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
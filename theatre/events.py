@@ -0,0 +1,261 @@
+"""Publish/subscribe of live seat changes.
+
+Seat changes are published to a broker channel per performance once the
+transaction writing them commits. Each server process keeps one ``Hub`` per
+event loop, which holds a single broker subscription per channel and fans
+every message out to the queues of its local listeners, so any number of
+viewers of a performance cost one subscription.
+
+The broker is pluggable through ``settings.SEAT_EVENTS_BROKER``: Redis
+pub/sub in production, and an in-process broker when ``REDIS_URL`` is not
+set, e.g. in tests and development.
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Message put on the queue of a listener that fell too far behind; the
+# events it missed are dropped and it should reload the seat map.
+RESYNC = json.dumps({"type": "resync"})
+
+RESUBSCRIBE_DELAY = 1.0
+SUBSCRIBE_TIMEOUT = 5.0
+
+
+def channel_name(performance_id):
+    return f"theatre:seats:{performance_id}"
+
+
+class Broker:
+    """Transport between the processes publishing and streaming events."""
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    async def subscribe(self, channel, subscribed):
+        """Yield the messages published to ``channel`` until cancelled.
+
+        ``subscribed`` is called once every message published from then on
+        is certain to be received.
+        """
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def close(self):
+        pass
+
+
+class InMemoryBroker(Broker):
+    """Broker within a single process. ``publish`` may be called from any
+    thread; messages are handed to the subscribers' event loops."""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, message)
+            except RuntimeError:
+                # The loop of the subscriber has been closed.
+                pass
+
+    async def subscribe(self, channel, subscribed):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        subscribed()
+        try:
+            while True:
+                yield await subscriber[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+
+class RedisBroker(Broker):
+    """Redis pub/sub. Publishing uses a blocking client, since it runs in
+    ``on_commit`` callbacks of synchronous request handlers."""
+
+    def __init__(self, url=None, **options):
+        import redis
+
+        self.url = url or settings.REDIS_URL
+        self._client = redis.Redis.from_url(self.url)
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _async_client(self):
+        import redis.asyncio
+
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_clients:
+            self._async_clients[loop] = redis.asyncio.Redis.from_url(self.url)
+        return self._async_clients[loop]
+
+    def publish(self, channel, message):
+        self._client.publish(channel, message)
+
+    async def subscribe(self, channel, subscribed):
+        pubsub = self._async_client().pubsub()
+        # Only sends the command: messages published before Redis has
+        # processed it are not delivered.
+        await pubsub.subscribe(channel)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "subscribe":
+                    subscribed()
+                elif message["type"] == "message":
+                    yield message["data"].decode()
+        finally:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+
+    async def close(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.SEAT_EVENTS_BROKER)(
+        **settings.SEAT_EVENTS_BROKER_OPTIONS
+    )
+
+
+class Hub:
+    """Fan-out of broker channels to listeners within one event loop."""
+
+    def __init__(self, broker, queue_size=None):
+        self.broker = broker
+        self.queue_size = queue_size or settings.SEAT_EVENTS_QUEUE_SIZE
+        self._listeners = defaultdict(set)
+        self._pumps = {}
+        self._subscribed = {}
+
+    @asynccontextmanager
+    async def listen(self, channel):
+        """Yield a queue receiving every message of ``channel`` published
+        while the context is open, once the broker has confirmed the
+        subscription. Raise ``asyncio.TimeoutError`` if it does not within
+        ``SUBSCRIBE_TIMEOUT`` seconds."""
+        queue = asyncio.Queue(self.queue_size)
+        self._listeners[channel].add(queue)
+        if channel not in self._pumps:
+            self._subscribed[channel] = asyncio.Event()
+            self._pumps[channel] = asyncio.create_task(self._pump(channel))
+        try:
+            await asyncio.wait_for(
+                self._subscribed[channel].wait(), SUBSCRIBE_TIMEOUT
+            )
+            yield queue
+        finally:
+            self._listeners[channel].discard(queue)
+            if not self._listeners[channel]:
+                del self._listeners[channel]
+                del self._subscribed[channel]
+                self._pumps.pop(channel).cancel()
+
+    async def _pump(self, channel):
+        subscribed = self._subscribed[channel]
+        while True:
+            try:
+                async for message in self.broker.subscribe(
+                    channel, subscribed.set
+                ):
+                    self._fan_out(channel, message)
+            except Exception:
+                logger.exception("Subscription to %s failed", channel)
+            # Messages may have been lost while resubscribing.
+            subscribed.clear()
+            self._fan_out(channel, RESYNC)
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    def _fan_out(self, channel, message):
+        for queue in self._listeners.get(channel, ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    @property
+    def subscriptions(self):
+        return len(self._pumps)
+
+    async def close(self):
+        pumps = list(self._pumps.values())
+        for pump in pumps:
+            pump.cancel()
+        await asyncio.gather(*pumps, return_exceptions=True)
+        self._pumps.clear()
+        self._subscribed.clear()
+        self._listeners.clear()
+        await self.broker.close()
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """Return the hub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = Hub(get_broker())
+    return _hubs[loop]
+
+
+async def close_hub():
+    hub = _hubs.pop(asyncio.get_running_loop(), None)
+    if hub is not None:
+        await hub.close()
+
+
+def seats_event(performance_id, **seats):
+    return json.dumps(
+        {
+            "type": "seats",
+            "performance": performance_id,
+            **{
+                change: [{"row": row, "seat": seat} for row, seat in changed]
+                for change, changed in seats.items()
+            },
+        }
+    )
+
+
+def publish_seats(performance_id, taken=(), released=(), held=(), unheld=()):
+    """Publish the seats of a performance that changed state.
+
+    Live updates are best effort: a broker failure is logged rather than
+    failing the request that changed the seats.
+    """
+    message = seats_event(
+        performance_id,
+        taken=taken,
+        released=released,
+        held=held,
+        unheld=unheld,
+    )
+    try:
+        get_broker().publish(channel_name(performance_id), message)
+    except Exception:
+        logger.exception(
+            "Could not publish seat changes of performance %s", performance_id
+        )
@@ -0,0 +1,145 @@
+"""Streaming exports of tickets and reservations.
+
+Rows are read as values tuples through ``QuerySet.iterator``, which uses a
+server-side cursor where the database has one, and written out a chunk at a
+time into a ``StreamingHttpResponse``, so memory stays flat however many
+rows are exported.
+"""
+import csv
+from datetime import date as date_type, datetime, timedelta
+
+from django.db.models import Count, Exists, OuterRef
+from django.http import StreamingHttpResponse
+
+from theatre import filters
+from theatre.models import Reservation, Ticket
+from theatre.renderers import CSVRenderer, FastJSONRenderer, NDJSONRenderer
+
+CHUNK_SIZE = 2000
+
+# Exported column: lookup
+TICKET_COLUMNS = {
+    "id": "id",
+    "reservation": "reservation_id",
+    "reserved_at": "reservation__created_at",
+    "user": "reservation__user_id",
+    "user_email": "reservation__user__email",
+    "performance": "performance_id",
+    "show_time": "performance__show_time",
+    "play": "performance__play__title",
+    "theatre_hall": "performance__theatre_hall__name",
+    "row": "row",
+    "seat": "seat",
+}
+RESERVATION_COLUMNS = {
+    "id": "id",
+    "created_at": "created_at",
+    "user": "user_id",
+    "user_email": "user__email",
+    "tickets": "ticket_count",
+}
+
+
+def ticket_filters(params):
+    """Filters of tickets by ``performance`` and ``play`` ids and by the
+    inclusive ``date_from`` and ``date_to`` range of the show time."""
+    lookups = {}
+    performance_ids = filters.parse_ids(params, "performance")
+    if performance_ids is not None:
+        lookups["performance_id__in"] = performance_ids
+    play_ids = filters.parse_ids(params, "play")
+    if play_ids is not None:
+        lookups["performance__play_id__in"] = play_ids
+    date_from = filters.parse_date(params, "date_from")
+    if date_from:
+        lookups["performance__show_time__gte"] = filters.day_start(date_from)
+    date_to = filters.parse_date(params, "date_to")
+    if date_to:
+        lookups["performance__show_time__lt"] = filters.day_start(
+            date_to + timedelta(days=1)
+        )
+    return lookups
+
+
+def tickets(params):
+    return (
+        Ticket.objects.filter(**ticket_filters(params))
+        .order_by("id")
+        .values_list(*TICKET_COLUMNS.values())
+    )
+
+
+def reservations(params):
+    """Reservations with at least one ticket matching the filters, and the
+    number of all their tickets."""
+    queryset = Reservation.objects.all()
+    lookups = ticket_filters(params)
+    if lookups:
+        queryset = queryset.filter(
+            Exists(
+                Ticket.objects.filter(reservation=OuterRef("pk"), **lookups)
+            )
+        )
+    return (
+        queryset.annotate(ticket_count=Count("tickets"))
+        .order_by("id")
+        .values_list(*RESERVATION_COLUMNS.values())
+    )
+
+
+class _Echo:
+    """File-like object handing written lines back to ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date_type)):
+        # The representation the JSON API uses.
+        return FastJSONRenderer.encoder_class().default(value)
+    return value
+
+
+def _chunks(queryset, render_row):
+    lines = []
+    for row in queryset.iterator(chunk_size=CHUNK_SIZE):
+        lines.append(render_row(row))
+        if len(lines) == CHUNK_SIZE:
+            yield b"".join(lines)
+            lines = []
+    if lines:
+        yield b"".join(lines)
+
+
+def ndjson_lines(queryset, columns):
+    renderer = NDJSONRenderer()
+    names = list(columns)
+    return _chunks(
+        queryset, lambda row: renderer.render(dict(zip(names, row)))
+    )
+
+
+def csv_lines(queryset, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns).encode()
+    yield from _chunks(
+        queryset,
+        lambda row: writer.writerow(map(_csv_value, row)).encode(),
+    )
+
+
+def stream(queryset, columns, renderer, name):
+    """Stream ``queryset`` rows of ``columns`` in the format of the
+    accepted ``renderer`` as a file download called ``name``."""
+    if isinstance(renderer, CSVRenderer):
+        lines = csv_lines(queryset, columns)
+    else:
+        lines = ndjson_lines(queryset, columns)
+    response = StreamingHttpResponse(
+        lines, content_type=f"{renderer.media_type}; charset=utf-8"
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{name}.{renderer.format}"'
+    )
+    return response
@@ -0,0 +1,39 @@
+"""Parsing of the query parameters that filter performances and exports."""
+from datetime import date as date_type, datetime, time
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+def parse_ids(params, name):
+    """Ids of a comma separated ``name`` parameter, or None if it is
+    missing."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [int(pk) for pk in value.split(",")]
+    except ValueError:
+        raise ValidationError(
+            {
+                name: f"{name.capitalize()} must be a comma separated "
+                f"list of ids."
+            }
+        )
+
+
+def parse_date(params, name):
+    """Date of a YYYY-MM-DD ``name`` parameter, or None if it is missing."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValidationError({name: "Date must be in YYYY-MM-DD format."})
+
+
+def day_start(day: date_type) -> datetime:
+    """First instant of a day in the current time zone, so date filters
+    compare show_time with plain bounds instead of casting it."""
+    return timezone.make_aware(datetime.combine(day, time.min))
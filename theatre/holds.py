@@ -0,0 +1,422 @@
+"""Temporary seat holds kept in the cache backend.
+
+A hold claims each of its seats with an atomic ``cache.add`` on a per-seat
+key that expires together with the hold, so competing holds never overlap
+and abandoned holds disappear on their own. A ``HoldIndex`` lists the holds
+of each performance, for availability counts, which skip entries past their
+expiry, and schedules their expiry. Every hold is an entry of its own in
+it, written without reading the others, so concurrent holds cannot drop
+one another.
+
+Expired holds are reaped lazily, by ``reap_expired`` from the schedule:
+before responses showing held seats read their version stamps, and from
+live seat streams. Reaping drops the holds from the index and announces
+their seats as unheld through ``seats_changed``, as a released hold does,
+which bumps the stamps of the performance.
+
+The index is pluggable through ``settings.SEAT_HOLD_INDEX``: a Redis hash
+per performance and a sorted set for the schedule in production, and
+entries of the process-local cache otherwise, e.g. in tests and
+development.
+"""
+import json
+import threading
+import time
+import uuid
+from bisect import bisect_right, insort
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from theatre.models import Performance, seats_changed
+
+SCHEDULE_KEY = "seat-hold:schedule"
+
+
+class SeatsUnavailable(Exception):
+    def __init__(self, seats):
+        super().__init__(f"Seats are held by another customer: {seats}")
+        self.seats = seats
+
+
+def _hold_key(hold_id):
+    return f"seat-hold:{hold_id}"
+
+
+def _seat_key(performance_id, row, seat):
+    return f"seat-hold:seat:{performance_id}:{row}:{seat}"
+
+
+def _index_key(performance_id):
+    return f"seat-hold:performance:{performance_id}"
+
+
+def _active(index, now):
+    return {
+        hold_id: entry
+        for hold_id, entry in index.items()
+        if entry["expires_at"] > now
+    }
+
+
+class HoldIndex:
+    """Holds of each performance, as ``{hold id: {"expires_at": timestamp,
+    "seats": [(row, seat), ...]}}``, and the schedule of their expiry.
+
+    Expired entries stay until ``pop_due`` takes them out.
+    """
+
+    def add(self, performance_id, hold_id, entry):
+        raise NotImplementedError
+
+    def remove(self, performance_id, hold_id):
+        raise NotImplementedError
+
+    def entries(self, performance_ids):
+        """Map each of ``performance_ids`` with holds to its entries."""
+        raise NotImplementedError
+
+    def pop_due(self, now):
+        """Take the entries expired by ``now`` out of the index, returning
+        each, as ``(performance_id, entry)``, to a single caller."""
+        raise NotImplementedError
+
+    def pop_expired(self, performance_id, now):
+        """Take the entries of a performance expired by ``now`` out of the
+        index, whether the schedule lists them or not, returning each to a
+        single caller."""
+        raise NotImplementedError
+
+
+class CacheHoldIndex(HoldIndex):
+    """Index in the cache of a single process, such as ``LocMemCache``,
+    read and rewritten under a lock of the process."""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+
+    def add(self, performance_id, hold_id, entry):
+        with self._lock:
+            index = cache.get(_index_key(performance_id), {})
+            index[hold_id] = entry
+            cache.set(_index_key(performance_id), index, None)
+            schedule = cache.get(SCHEDULE_KEY, [])
+            insort(schedule, (entry["expires_at"], performance_id, hold_id))
+            cache.set(SCHEDULE_KEY, schedule, None)
+
+    def remove(self, performance_id, hold_id):
+        with self._lock:
+            index = cache.get(_index_key(performance_id), {})
+            index.pop(hold_id, None)
+            self._write(performance_id, index)
+
+    def entries(self, performance_ids):
+        keys = {_index_key(pk): pk for pk in performance_ids}
+        return {
+            keys[key]: index for key, index in cache.get_many(keys).items()
+        }
+
+    def pop_due(self, now):
+        schedule = cache.get(SCHEDULE_KEY)
+        if not schedule or schedule[0][0] > now:
+            return []
+        with self._lock:
+            schedule = cache.get(SCHEDULE_KEY, [])
+            due = bisect_right(schedule, (now, float("inf")))
+            cache.set(SCHEDULE_KEY, schedule[due:], None)
+            popped = []
+            for _, performance_id, hold_id in schedule[:due]:
+                index = cache.get(_index_key(performance_id), {})
+                entry = index.pop(hold_id, None)
+                if entry is not None:
+                    popped.append((performance_id, entry))
+                    self._write(performance_id, index)
+            return popped
+
+    def pop_expired(self, performance_id, now):
+        with self._lock:
+            index = cache.get(_index_key(performance_id), {})
+            active = _active(index, now)
+            if len(active) == len(index):
+                return []
+            self._write(performance_id, active)
+        # Left in the schedule, where pop_due no longer finds them.
+        return [
+            entry
+            for hold_id, entry in index.items()
+            if hold_id not in active
+        ]
+
+    @staticmethod
+    def _write(performance_id, index):
+        if index:
+            cache.set(_index_key(performance_id), index, None)
+        else:
+            cache.delete(_index_key(performance_id))
+
+
+class RedisHoldIndex(HoldIndex):
+    """A Redis hash per performance, with a field per hold, and a sorted
+    set of ``performance id:hold id`` scored by expiry time."""
+
+    # Claims the due entries of the schedule and their holds in one step.
+    # The hash keys are built in the script, so it needs a single Redis
+    # server rather than a cluster.
+    POP_DUE = """
+    local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+    local popped = {}
+    for _, member in ipairs(due) do
+        redis.call("ZREM", KEYS[1], member)
+        local performance_id, hold_id = string.match(member, "^(%d+):(.+)$")
+        local key = ARGV[2] .. performance_id
+        local entry = redis.call("HGET", key, hold_id)
+        if entry then
+            redis.call("HDEL", key, hold_id)
+            table.insert(popped, performance_id)
+            table.insert(popped, entry)
+        end
+    end
+    return popped
+    """
+
+    def __init__(self, url=None, prefix="theatre:", **options):
+        import redis
+
+        self._client = redis.Redis.from_url(url or settings.REDIS_URL)
+        self._prefix = prefix
+        self._pop_due = self._client.register_script(self.POP_DUE)
+
+    def _key(self, performance_id):
+        return f"{self._prefix}{_index_key(performance_id)}"
+
+    def add(self, performance_id, hold_id, entry):
+        pipeline = self._client.pipeline()
+        pipeline.hset(self._key(performance_id), hold_id, json.dumps(entry))
+        pipeline.zadd(
+            self._prefix + SCHEDULE_KEY,
+            {f"{performance_id}:{hold_id}": entry["expires_at"]},
+        )
+        pipeline.execute()
+
+    def remove(self, performance_id, hold_id):
+        pipeline = self._client.pipeline()
+        pipeline.hdel(self._key(performance_id), hold_id)
+        pipeline.zrem(
+            self._prefix + SCHEDULE_KEY, f"{performance_id}:{hold_id}"
+        )
+        pipeline.execute()
+
+    def entries(self, performance_ids):
+        performance_ids = list(performance_ids)
+        pipeline = self._client.pipeline(transaction=False)
+        for performance_id in performance_ids:
+            pipeline.hgetall(self._key(performance_id))
+        return {
+            performance_id: {
+                hold_id.decode(): json.loads(entry)
+                for hold_id, entry in index.items()
+            }
+            for performance_id, index in zip(
+                performance_ids, pipeline.execute()
+            )
+            if index
+        }
+
+    def pop_expired(self, performance_id, now):
+        key = self._key(performance_id)
+        expired = {
+            hold_id.decode(): json.loads(entry)
+            for hold_id, entry in self._client.hgetall(key).items()
+        }
+        expired = {
+            hold_id: entry
+            for hold_id, entry in expired.items()
+            if entry["expires_at"] <= now
+        }
+        if not expired:
+            return []
+        pipeline = self._client.pipeline()
+        for hold_id in expired:
+            pipeline.hdel(key, hold_id)
+        pipeline.zrem(
+            self._prefix + SCHEDULE_KEY,
+            *(f"{performance_id}:{hold_id}" for hold_id in expired),
+        )
+        deleted = pipeline.execute()[:-1]
+        # Whoever deleted an entry announces it.
+        return [
+            entry
+            for entry, removed in zip(expired.values(), deleted)
+            if removed
+        ]
+
+    def pop_due(self, now):
+        popped = self._pop_due(
+            keys=[self._prefix + SCHEDULE_KEY],
+            args=[now, self._key("")],
+        )
+        return [
+            (int(popped[i]), json.loads(popped[i + 1]))
+            for i in range(0, len(popped), 2)
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_index():
+    return import_string(settings.SEAT_HOLD_INDEX)(
+        **settings.SEAT_HOLD_INDEX_OPTIONS
+    )
+
+
+def reap_expired(performance_ids=()):
+    """Reap the holds past their expiry, sending ``seats_changed`` with the
+    seats they held. A single cache read when none is due.
+
+    The holds of ``performance_ids`` are looked for in their index too, so
+    that they are reaped even if the schedule lost them, e.g. to an
+    eviction from the cache.
+    """
+    now = time.time()
+    index = get_index()
+    popped = index.pop_due(now)
+    for performance_id in performance_ids:
+        popped.extend(
+            (performance_id, entry)
+            for entry in index.pop_expired(performance_id, now)
+        )
+    expired = {}
+    for performance_id, entry in popped:
+        expired.setdefault(performance_id, set()).update(
+            tuple(seat) for seat in entry["seats"]
+        )
+    if not expired:
+        return
+
+    indexes = index.entries(expired)
+    for performance_id in sorted(expired):
+        # Seats claimed again by an active hold since stay held.
+        held = {
+            tuple(seat)
+            for entry in _active(indexes.get(performance_id, {}), now).values()
+            for seat in entry["seats"]
+        }
+        unheld = sorted(expired[performance_id] - held)
+        if not unheld:
+            continue
+        performance = (
+            Performance.objects.only("id", "show_time")
+            .filter(pk=performance_id)
+            .first()
+        )
+        if performance is not None:
+            seats_changed.send(
+                sender=Performance, performance=performance, unheld=unheld
+            )
+
+
+def hold_seats(user_id, performance, seats, minutes=None):
+    """Hold ``(row, seat)`` seats of a performance for ``minutes`` minutes.
+
+    Either every seat is claimed or none is; raises ``SeatsUnavailable``
+    with the seats already held by somebody else.
+    """
+    performance_id = performance.id
+    minutes = minutes or settings.SEAT_HOLD_MINUTES
+    timeout = minutes * 60
+    hold_id = uuid.uuid4().hex
+    seats = sorted(tuple(seat) for seat in seats)
+
+    claimed = []
+    unavailable = []
+    for row, seat in seats:
+        if cache.add(_seat_key(performance_id, row, seat), hold_id, timeout):
+            claimed.append((row, seat))
+        else:
+            unavailable.append((row, seat))
+    if unavailable:
+        cache.delete_many(
+            [_seat_key(performance_id, row, seat) for row, seat in claimed]
+        )
+        raise SeatsUnavailable(unavailable)
+
+    expires_at = time.time() + timeout
+    hold = {
+        "id": hold_id,
+        "user": user_id,
+        "performance": performance_id,
+        "seats": seats,
+        "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc),
+    }
+    cache.set(_hold_key(hold_id), hold, timeout)
+    get_index().add(
+        performance_id, hold_id, {"expires_at": expires_at, "seats": seats}
+    )
+    seats_changed.send(sender=Performance, performance=performance, held=seats)
+    return hold
+
+
+def get_hold(hold_id):
+    return cache.get(_hold_key(hold_id))
+
+
+def release_hold(hold):
+    """Free the seats of a hold, leaving seats since re-held by others."""
+    performance_id = hold["performance"]
+    keys = {
+        _seat_key(performance_id, row, seat): (row, seat)
+        for row, seat in hold["seats"]
+    }
+    owned = [
+        key
+        for key, hold_id in cache.get_many(keys).items()
+        if hold_id == hold["id"]
+    ]
+    cache.delete_many(owned)
+    cache.delete(_hold_key(hold["id"]))
+    get_index().remove(performance_id, hold["id"])
+
+    performance = (
+        Performance.objects.only("id", "show_time")
+        .filter(pk=performance_id)
+        .first()
+    )
+    if performance is not None:
+        seats_changed.send(
+            sender=Performance,
+            performance=performance,
+            unheld=sorted(keys[key] for key in owned),
+        )
+
+
+def holders_of(seats):
+    """Map each held ``(performance_id, row, seat)`` to the id of its hold."""
+    keys = {_seat_key(*seat): seat for seat in seats}
+    return {
+        keys[key]: hold_id for key, hold_id in cache.get_many(keys).items()
+    }
+
+
+def held_seats(performance_id):
+    """Return the seats of a performance under active holds, sorted."""
+    index = get_index().entries([performance_id]).get(performance_id, {})
+    return sorted(
+        tuple(seat)
+        for entry in _active(index, time.time()).values()
+        for seat in entry["seats"]
+    )
+
+
+def held_seat_counts(performance_ids):
+    """Return the number of held seats per performance, in one call to the
+    index."""
+    now = time.time()
+    indexes = get_index().entries(performance_ids)
+    return {
+        performance_id: sum(
+            len(entry["seats"]) for entry in _active(index, now).values()
+        )
+        for performance_id, index in indexes.items()
+    }
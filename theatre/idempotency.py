@@ -0,0 +1,147 @@
+"""Idempotency keys for requests that must not run twice.
+
+A client sends the same ``Idempotency-Key`` header with every retry of a
+request. The first request claims the key with an atomic ``cache.add`` and
+stores its outcome, the status and body of its response, once it finishes;
+retries are answered with that outcome without running the request again.
+Retries arriving while the first request still runs wait for it, for at
+most ``IDEMPOTENCY_WAIT_SECONDS``. The claim itself lasts
+``REQUEST_TIMEOUT_SECONDS``, longer than any request may run, so a slow
+first request never loses its key to a retry. Keys are scoped to the user
+and kept for ``IDEMPOTENCY_KEY_HOURS``. Server errors are not stored, so the
+request can be retried with the same key.
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from theatre.renderers import FastJSONRenderer
+
+HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = (
+        "A request with this Idempotency-Key is still being processed."
+    )
+    default_code = "idempotency_key_in_use"
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = (
+        "This Idempotency-Key was already used for a different request."
+    )
+    default_code = "idempotency_key_reused"
+
+
+def _cache_key(user_id, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f"idempotency:{user_id}:{digest}"
+
+
+def fingerprint(request):
+    """Digest of what makes two requests the same request."""
+    payload = json.dumps(
+        [request.method, request.path, request.data],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def begin(cache_key, request_fingerprint):
+    """Claim ``cache_key`` for a request, or return the stored outcome of
+    the earlier request that used it, waiting while it still runs.
+
+    Returns None once the key is claimed.
+    """
+    pending = {"fingerprint": request_fingerprint, "status": None}
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        if cache.add(cache_key, pending, settings.REQUEST_TIMEOUT_SECONDS):
+            return None
+        outcome = cache.get(cache_key)
+        if outcome is None:
+            # Abandoned or expired in between, claim it again.
+            continue
+        if outcome["fingerprint"] != request_fingerprint:
+            raise IdempotencyKeyReused()
+        if outcome["status"] is not None:
+            return outcome
+        if time.monotonic() >= deadline:
+            raise IdempotencyKeyInUse()
+        time.sleep(POLL_INTERVAL)
+
+
+def finish(cache_key, request_fingerprint, response):
+    """Store the outcome of the request that claimed ``cache_key``."""
+    if response.status_code >= 500:
+        abandon(cache_key)
+        return
+    cache.set(
+        cache_key,
+        {
+            "fingerprint": request_fingerprint,
+            "status": response.status_code,
+            # Plain JSON types, rendered the way the response will be.
+            "data": json.loads(FastJSONRenderer().render(response.data)),
+        },
+        settings.IDEMPOTENCY_KEY_HOURS * 60 * 60,
+    )
+
+
+def abandon(cache_key):
+    cache.delete(cache_key)
+
+
+def replay(outcome):
+    return Response(
+        outcome["data"],
+        status=outcome["status"],
+        headers={REPLAYED_HEADER: "true"},
+    )
+
+
+class IdempotentCreateMixin:
+    """Honour the ``Idempotency-Key`` header on ``create``."""
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return super().create(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                {
+                    HEADER: f"Must be between 1 and {MAX_KEY_LENGTH} "
+                    f"characters long."
+                }
+            )
+
+        cache_key = _cache_key(request.user.id, key)
+        request_fingerprint = fingerprint(request)
+        outcome = begin(cache_key, request_fingerprint)
+        if outcome is not None:
+            return replay(outcome)
+
+        try:
+            try:
+                response = super().create(request, *args, **kwargs)
+            except APIException as exc:
+                # Rejections are outcomes to replay too.
+                response = self.handle_exception(exc)
+        except BaseException:
+            abandon(cache_key)
+            raise
+        finish(cache_key, request_fingerprint, response)
+        return response
@@ -0,0 +1,112 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import load_backend
+
+from theatre import benchmarking
+from theatre_service.db.checks import POOLED_ENGINE
+
+POSTGRESQL_ENGINES = ("django.db.backends.postgresql", POOLED_ENGINE)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the per-request cost of opening a database connection for "
+        "every request, compared with persistent connections "
+        "(CONN_MAX_AGE) and, on PostgreSQL, with the connection pool. Each "
+        "simulated request goes through Django's end-of-request connection "
+        "handling and runs SELECT 1."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--output", help="Write the results as JSON to this file."
+        )
+
+    def handle(self, *args, **options):
+        if options["database"] not in connections:
+            raise CommandError(f"Unknown database {options['database']}.")
+        if options["requests"] < 1:
+            raise CommandError("--requests must be positive.")
+        database = connections[options["database"]].settings_dict
+
+        modes = {
+            "new-connection": {**database, "CONN_MAX_AGE": 0},
+            "persistent": {**database, "CONN_MAX_AGE": None},
+        }
+        if database["ENGINE"] in POSTGRESQL_ENGINES:
+            modes["pooled"] = {
+                **database,
+                "ENGINE": POOLED_ENGINE,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": {
+                    **database["OPTIONS"],
+                    "pool": {"max_size": 1},
+                },
+            }
+        else:
+            self.stdout.write(
+                f"Pooling needs PostgreSQL, not {database['ENGINE']}; "
+                f"skipping it."
+            )
+
+        results = {
+            "benchmark": "connections",
+            "environment": {
+                **benchmarking.environment(),
+                "database": database["ENGINE"],
+            },
+            "options": {"requests": options["requests"]},
+            "scenarios": {},
+        }
+        for mode, settings_dict in modes.items():
+            results["scenarios"][mode] = self.measure(
+                mode, settings_dict, options["requests"]
+            )
+
+        baseline = results["scenarios"]["new-connection"]["mean_ms"]
+        for mode, summary in results["scenarios"].items():
+            summary["saved_ms"] = round(baseline - summary["mean_ms"], 3)
+            self.stdout.write(
+                f"{mode}: mean {summary['mean_ms']} ms, "
+                f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                f"saved {summary['saved_ms']} ms per request"
+            )
+
+        if options["output"]:
+            benchmarking.write_results(options["output"], results)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+    @staticmethod
+    def measure(mode, settings_dict, requests):
+        backend = load_backend(settings_dict["ENGINE"])
+        connection = backend.DatabaseWrapper(
+            settings_dict, alias=f"benchmark-{mode}"
+        )
+        latencies = []
+        try:
+            for _ in range(requests):
+                started = time.perf_counter()
+                # What the request_started and request_finished signals do.
+                connection.close_if_unusable_or_obsolete()
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection.close()
+            pool = getattr(connection, "pool", None)
+            if pool is not None:
+                pool.close()
+
+        return {
+            "requests": requests,
+            "mean_ms": round(statistics.fmean(latencies), 3),
+            "p50_ms": round(benchmarking.percentile(latencies, 50), 3),
+            "p95_ms": round(benchmarking.percentile(latencies, 95), 3),
+        }
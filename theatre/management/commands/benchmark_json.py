@@ -0,0 +1,147 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from theatre import benchmarking
+from theatre.parsers import FastJSONParser
+from theatre.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering and parsing API payloads with DRF's JSON renderer "
+        "and parser and with the fast ones, against a throwaway database "
+        "with a sold out hall."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=30)
+        parser.add_argument("--seats-in-row", type=int, default=40)
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=50,
+            help="Timed runs per payload; the median is reported.",
+        )
+        parser.add_argument(
+            "--output", help="Write the results as JSON to this file."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be positive.")
+        if orjson is None:
+            self.stdout.write(
+                self.style.WARNING(
+                    "orjson is not installed, the fast renderer and parser "
+                    "fall back to the standard library."
+                )
+            )
+
+        with benchmarking.benchmark_environment(keepdb=options["keepdb"]):
+            users, performances = benchmarking.seed(
+                halls=1,
+                rows=options["rows"],
+                seats_in_row=options["seats_in_row"],
+                performances=10,
+                users=1,
+                sold_rows=options["rows"],
+            )
+            payloads = self.payloads(users[0], performances[0])
+
+        results = {
+            "benchmark": "json",
+            "environment": {
+                **benchmarking.environment(),
+                "orjson": getattr(orjson, "__version__", None),
+            },
+            "options": {
+                name: options[name]
+                for name in ("rows", "seats_in_row", "repeat")
+            },
+            "scenarios": {},
+        }
+        for name, data in payloads.items():
+            results["scenarios"][name] = summary = self.measure(
+                data, options["repeat"]
+            )
+            self.report(name, summary)
+
+        if options["output"]:
+            benchmarking.write_results(options["output"], results)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+    @staticmethod
+    def payloads(user, performance):
+        client = APIClient()
+        client.force_authenticate(user)
+        return {
+            "performance-detail": client.get(
+                reverse("theatre:performance-detail", args=[performance.id])
+            ).data,
+            "performance-list": client.get(
+                reverse("theatre:performance-list"), {"page_size": 100}
+            ).data,
+            "reservation-list": client.get(
+                reverse("theatre:reservation-list"), {"page_size": 100}
+            ).data,
+        }
+
+    @staticmethod
+    def median_ms(function, repeat):
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - started)
+        return statistics.median(durations) * 1000
+
+    def measure(self, data, repeat):
+        body = JSONRenderer().render(data)
+        timings = {}
+        for kind, renderer, parser in (
+            ("regular", JSONRenderer(), JSONParser()),
+            ("fast", FastJSONRenderer(), FastJSONParser()),
+        ):
+            timings[f"{kind}_render_ms"] = self.median_ms(
+                lambda: renderer.render(data), repeat
+            )
+            timings[f"{kind}_parse_ms"] = self.median_ms(
+                lambda: parser.parse(io.BytesIO(body)), repeat
+            )
+
+        return {
+            "bytes": len(body),
+            **{name: round(value, 3) for name, value in timings.items()},
+            "render_speedup": round(
+                timings["regular_render_ms"] / timings["fast_render_ms"], 2
+            ),
+            "parse_speedup": round(
+                timings["regular_parse_ms"] / timings["fast_parse_ms"], 2
+            ),
+            "identical": FastJSONRenderer().render(data) == body,
+        }
+
+    def report(self, scenario, summary):
+        line = (
+            f"{scenario}: {summary['bytes']} bytes, render "
+            f"{summary['regular_render_ms']} -> {summary['fast_render_ms']} "
+            f"ms ({summary['render_speedup']}x), parse "
+            f"{summary['regular_parse_ms']} -> {summary['fast_parse_ms']} "
+            f"ms ({summary['parse_speedup']}x)"
+        )
+        if summary["identical"]:
+            self.stdout.write(line)
+        else:
+            self.stdout.write(self.style.ERROR(f"{line}, output differs"))
@@ -0,0 +1,290 @@
+import itertools
+import random
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from theatre import benchmarking
+
+SCENARIOS = (
+    "performance-list",
+    "performance-list-cached",
+    "performance-detail",
+    "performance-detail-cached",
+    "ticket-list",
+    "reservation-create",
+)
+
+
+class SeatPicker:
+    """Hands out blocks of adjacent seats to reserve, in order through the
+    unsold rows of every performance, or, with probability
+    ``collision_rate``, a block already handed out to another request."""
+
+    def __init__(self, performances, rows, seats_in_row, party_size, rate):
+        self.collision_rate = rate
+        self.issued = []
+        self.lock = threading.Lock()
+        self.blocks = iter(
+            [
+                (performance.id, row, first)
+                for row in range(1, rows + 1)
+                for first in range(
+                    1, seats_in_row - party_size + 2, party_size
+                )
+                for performance in performances
+            ]
+        )
+        self.party_size = party_size
+
+    def pick(self, rng):
+        with self.lock:
+            block = None
+            if not self.issued or rng.random() >= self.collision_rate:
+                block = next(self.blocks, None)
+            if block is None:
+                block = rng.choice(self.issued)
+            else:
+                self.issued.append(block)
+        performance_id, row, first = block
+        return [
+            {"row": row, "seat": seat, "performance": performance_id}
+            for seat in range(first, first + self.party_size)
+        ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark reservations and performance and ticket reads with "
+        "concurrent clients against a throwaway database, and report "
+        "latency percentiles, queries per request, throughput and the rate "
+        "of seat conflicts. Performance reads are run once missing the "
+        "response cache on every request and once, as the *-cached "
+        "scenarios, hitting it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--halls", type=int, default=2)
+        parser.add_argument("--rows", type=int, default=20)
+        parser.add_argument("--seats-in-row", type=int, default=30)
+        parser.add_argument(
+            "--performances",
+            type=int,
+            default=10,
+            help="Performances per hall.",
+        )
+        parser.add_argument("--users", type=int, default=20)
+        parser.add_argument(
+            "--sold-rows",
+            type=int,
+            default=5,
+            help="Rows sold out in every performance before the run.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per scenario.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--party-size",
+            type=int,
+            default=2,
+            help="Tickets per reservation.",
+        )
+        parser.add_argument(
+            "--collision-rate",
+            type=float,
+            default=0.2,
+            help="Share of reservations aimed at seats already requested.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            dest="scenarios",
+            help="Scenario to run; may be repeated (default: all).",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", help="Write the results as JSON to this file."
+        )
+        parser.add_argument(
+            "--compare",
+            help="JSON results of an earlier run to compare against; fails "
+            "if a metric got worse by more than --threshold percent.",
+        )
+        parser.add_argument("--threshold", type=float, default=10.0)
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        if options["sold_rows"] >= options["rows"]:
+            raise CommandError("--sold-rows must be lower than --rows.")
+        if not 1 <= options["party_size"] <= options["seats_in_row"]:
+            raise CommandError(
+                "--party-size must be between 1 and --seats-in-row."
+            )
+        baseline = (
+            benchmarking.read_results(options["compare"])
+            if options["compare"]
+            else None
+        )
+
+        with benchmarking.benchmark_environment(keepdb=options["keepdb"]):
+            users, performances = benchmarking.seed(
+                halls=options["halls"],
+                rows=options["rows"],
+                seats_in_row=options["seats_in_row"],
+                performances=options["performances"],
+                users=options["users"],
+                sold_rows=options["sold_rows"],
+            )
+            results = {
+                "benchmark": "reservations",
+                "environment": benchmarking.environment(),
+                "options": {
+                    name: options[name]
+                    for name in (
+                        "halls",
+                        "rows",
+                        "seats_in_row",
+                        "performances",
+                        "users",
+                        "sold_rows",
+                        "requests",
+                        "concurrency",
+                        "party_size",
+                        "collision_rate",
+                        "seed",
+                    )
+                },
+                "scenarios": {},
+            }
+            for scenario in options["scenarios"] or SCENARIOS:
+                request = self.make_request(
+                    scenario, users, performances, options
+                )
+                results["scenarios"][scenario] = summary = (
+                    benchmarking.run_concurrently(
+                        request, options["requests"], options["concurrency"]
+                    )
+                )
+                self.report(scenario, summary)
+
+        if options["output"]:
+            benchmarking.write_results(options["output"], results)
+            self.stdout.write(f"Results written to {options['output']}.")
+        if baseline is not None:
+            self.report_comparison(
+                benchmarking.compare(results, baseline, options["threshold"])
+            )
+
+    def make_request(self, scenario, users, performances, options):
+        rng = random.Random(options["seed"])
+        lock = threading.Lock()
+
+        def session(state):
+            """Return the client and random generator of a worker."""
+            if "client" not in state:
+                with lock:
+                    state["rng"] = random.Random(rng.random())
+                # Count server errors, e.g. lock timeouts, as responses.
+                state["client"] = APIClient(raise_request_exception=False)
+                state["client"].force_authenticate(state["rng"].choice(users))
+            return state["client"], state["rng"]
+
+        requests = itertools.count()
+
+        def cache_buster(scenario):
+            """Query parameters that make the response cache miss, unless
+            the scenario measures cache hits."""
+            if scenario.endswith("-cached"):
+                return {}
+            # The views ignore the parameter, but the response cache keys
+            # on every query parameter, so no earlier response matches.
+            with lock:
+                return {"benchmark": next(requests)}
+
+        if scenario.startswith("performance-list"):
+            url = reverse("theatre:performance-list")
+
+            def request(state):
+                client, _ = session(state)
+                response = client.get(
+                    url, {"page_size": 20, **cache_buster(scenario)}
+                )
+                return response.status_code, False
+
+        elif scenario.startswith("performance-detail"):
+
+            def request(state):
+                client, rng = session(state)
+                response = client.get(
+                    reverse(
+                        "theatre:performance-detail",
+                        args=[rng.choice(performances).id],
+                    ),
+                    cache_buster(scenario),
+                )
+                return response.status_code, False
+
+        elif scenario == "ticket-list":
+            url = reverse("theatre:ticket-list")
+
+            def request(state):
+                client, _ = session(state)
+                response = client.get(url, {"page_size": 50})
+                return response.status_code, False
+
+        else:
+            url = reverse("theatre:reservation-list")
+            picker = SeatPicker(
+                performances,
+                options["rows"] - options["sold_rows"],
+                options["seats_in_row"],
+                options["party_size"],
+                options["collision_rate"],
+            )
+
+            def request(state):
+                client, rng = session(state)
+                response = client.post(
+                    url, {"tickets": picker.pick(rng)}, format="json"
+                )
+                conflict = response.status_code == 409 or (
+                    response.status_code == 400
+                    and "tickets" in (response.data or {})
+                )
+                return response.status_code, conflict
+
+        return request
+
+    def report(self, scenario, summary):
+        self.stdout.write(
+            f"{scenario}: {summary['requests']} requests, "
+            f"{summary['throughput_rps']} req/s, "
+            f"p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+            f"p99 {summary['p99_ms']} ms, "
+            f"{summary['queries_per_request']} queries/request, "
+            f"conflict rate {summary['conflict_rate']}, "
+            f"statuses {summary['statuses']}"
+        )
+
+    def report_comparison(self, rows):
+        regressions = 0
+        for scenario, metric, before, after, change, regressed in rows:
+            line = f"{scenario} {metric}: {before} -> {after} ({change:+}%)"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f"{regressions} metric(s) regressed.")
@@ -0,0 +1,217 @@
+import functools
+import itertools
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from theatre import benchmarking, search
+from theatre.models import Play
+
+SYLLABLES = (
+    "ba be bi bo da de di do ka ke ki ko la le li lo ma me mi mo na ne ni "
+    "no ra re ri ro sa se si so ta te ti to va ve vi vo"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time play searches, exact, multi-word, prefix, misspelled and "
+        "right after a play is saved, against a throwaway database of "
+        "synthetic plays, compared with the title__icontains filter, and "
+        "the reading of the search vocabulary."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--plays", type=int, default=100000)
+        parser.add_argument(
+            "--words",
+            type=int,
+            default=20000,
+            help="Size of the vocabulary; word frequencies follow Zipf's law.",
+        )
+        parser.add_argument(
+            "--queries", type=int, default=200, help="Queries per scenario."
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=10.0,
+            help="Flag scenarios whose p95 is above this.",
+        )
+        parser.add_argument(
+            "--output", help="Write the results as JSON to this file."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["plays"], options["words"], options["queries"]) < 1:
+            raise CommandError(
+                "--plays, --words and --queries must be positive."
+            )
+        rng = random.Random(options["seed"])
+        words = self.vocabulary(rng, options["words"])
+
+        with benchmarking.benchmark_environment(keepdb=options["keepdb"]):
+            started = time.perf_counter()
+            titles = self.seed(rng, words, options["plays"])
+            self.stdout.write(
+                f"Indexed {options['plays']} plays in "
+                f"{time.perf_counter() - started:.1f} s."
+            )
+            # Paid by the first search of each process, and again when the
+            # journal of changes to the index is lost.
+            started = time.perf_counter()
+            tokens = len(search.vocabulary().tokens)
+            vocabulary_s = time.perf_counter() - started
+            self.stdout.write(
+                f"Read the vocabulary of {tokens} tokens in "
+                f"{vocabulary_s:.1f} s."
+            )
+
+            results = {
+                "benchmark": "search",
+                "environment": benchmarking.environment(),
+                "options": {
+                    name: options[name]
+                    for name in ("plays", "words", "queries", "seed")
+                },
+                "vocabulary": {
+                    "tokens": tokens,
+                    "read_s": round(vocabulary_s, 3),
+                },
+                "scenarios": {},
+            }
+            play_ids = list(Play.objects.values_list("id", flat=True))
+            for scenario, make_query in self.scenarios(rng).items():
+                queries = [
+                    make_query(rng.choice(titles).split())
+                    for _ in range(options["queries"])
+                ]
+                run, before = search.search, None
+                if scenario == "icontains":
+                    run = self.icontains
+                elif scenario == "after-save":
+                    # Each search first brings the vocabulary up to date.
+                    before = functools.partial(
+                        self.rename, rng, words, play_ids
+                    )
+                results["scenarios"][scenario] = summary = self.measure(
+                    run, queries, before
+                )
+                self.report(scenario, summary, options["target_ms"])
+
+        if options["output"]:
+            benchmarking.write_results(options["output"], results)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+    @staticmethod
+    def vocabulary(rng, size):
+        """``size`` made-up words of two to five syllables, sorted."""
+        words = set()
+        while len(words) < size:
+            syllables = rng.choices(SYLLABLES, k=rng.randint(2, 5))
+            words.add("".join(syllables))
+        return sorted(words)
+
+    @staticmethod
+    def seed(rng, words, plays, batch_size=5000):
+        """Create and index ``plays`` plays of three title words and twelve
+        description words, drawn with Zipf's law frequencies as in natural
+        text. Returns their titles."""
+        weights = list(
+            itertools.accumulate(
+                1 / rank for rank in range(1, len(words) + 1)
+            )
+        )
+        rng.shuffle(words)
+        titles = []
+        for start in range(0, plays, batch_size):
+            batch = []
+            for _ in range(min(batch_size, plays - start)):
+                title = " ".join(
+                    rng.choices(words, cum_weights=weights, k=3)
+                ).title()
+                description = " ".join(
+                    rng.choices(words, cum_weights=weights, k=12)
+                )
+                batch.append(Play(title=title, description=description))
+                titles.append(title)
+            search.index_plays(Play.objects.bulk_create(batch), replace=False)
+        return titles
+
+    @staticmethod
+    def scenarios(rng):
+        """Queries built from the words of a random title."""
+
+        def misspell(word):
+            if len(word) < 4:
+                return word
+            index = rng.randrange(len(word) - 1)
+            return (
+                word[:index]
+                + word[index + 1]
+                + word[index]
+                + word[index + 2:]
+            )
+
+        return {
+            "icontains": lambda title: title[0],
+            "exact": lambda title: title[0],
+            "two-words": lambda title: " ".join(title[:2]),
+            "prefix": lambda title: f"{title[0]} {title[1][:3]}",
+            "typo": lambda title: misspell(max(title, key=len)),
+            "after-save": lambda title: misspell(max(title, key=len)),
+        }
+
+    @staticmethod
+    def rename(rng, words, play_ids):
+        """Give a random play a new title, as an edit in the admin would."""
+        play = Play.objects.get(pk=rng.choice(play_ids))
+        play.title = " ".join(rng.choices(words, k=3)).title()
+        play.save()
+
+    @staticmethod
+    def icontains(query):
+        return list(
+            Play.objects.filter(title__icontains=query).values_list(
+                "id", flat=True
+            )[: search.MAX_RESULTS]
+        )
+
+    @staticmethod
+    def measure(run, queries, before=None):
+        latencies = []
+        results = []
+        for query in queries:
+            if before:
+                before()
+            started = time.perf_counter()
+            results.append(len(run(query)))
+            latencies.append((time.perf_counter() - started) * 1000)
+        return {
+            "queries": len(queries),
+            "p50_ms": round(benchmarking.percentile(latencies, 50), 3),
+            "p95_ms": round(benchmarking.percentile(latencies, 95), 3),
+            "max_ms": round(max(latencies), 3),
+            "mean_results": round(statistics.fmean(results), 1),
+        }
+
+    def report(self, scenario, summary, target_ms):
+        line = (
+            f"{scenario}: p50 {summary['p50_ms']} ms, "
+            f"p95 {summary['p95_ms']} ms, max {summary['max_ms']} ms, "
+            f"{summary['mean_results']} results per query"
+        )
+        if scenario == "icontains" or summary["p95_ms"] <= target_ms:
+            self.stdout.write(line)
+        else:
+            self.stdout.write(
+                self.style.WARNING(f"{line}, over {target_ms} ms")
+            )
@@ -0,0 +1,166 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from theatre import benchmarking
+from theatre.fast_lists import (
+    PerformanceValuesSerializer,
+    ReservationValuesSerializer,
+)
+from theatre.models import Reservation, Ticket
+from theatre.serializers import (
+    PerformanceListSerializer,
+    ReservationListSerializer,
+)
+from theatre.views import PerformanceViewSet, ReservationViewSet
+
+# name: (viewset, regular serializer, values serializer, ordering)
+LISTS = {
+    "performance-list": (
+        PerformanceViewSet,
+        PerformanceListSerializer,
+        PerformanceValuesSerializer,
+        ("-show_time", "-id"),
+    ),
+    "reservation-list": (
+        ReservationViewSet,
+        ReservationListSerializer,
+        ReservationValuesSerializer,
+        ("-created_at", "-id"),
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time building and rendering pages of performances and "
+        "reservations with the regular list serializers and with the "
+        "values serializers of the fast list mode, against a throwaway "
+        "database, and check that both render the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            action="append",
+            dest="page_sizes",
+            help="Rows per page; may be repeated (default: 1000 and 10000).",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Timed runs per page; the median is reported.",
+        )
+        parser.add_argument(
+            "--output", help="Write the results as JSON to this file."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Keep the benchmark database between runs.",
+        )
+
+    def handle(self, *args, **options):
+        page_sizes = sorted(options["page_sizes"] or [1000, 10000])
+        if page_sizes[0] < 1 or options["repeat"] < 1:
+            raise CommandError("--page-size and --repeat must be positive.")
+
+        with benchmarking.benchmark_environment(keepdb=options["keepdb"]):
+            self.seed(page_sizes[-1])
+            results = {
+                "benchmark": "serializers",
+                "environment": benchmarking.environment(),
+                "options": {
+                    "page_sizes": page_sizes,
+                    "repeat": options["repeat"],
+                },
+                "scenarios": {},
+            }
+            for name, (viewset, regular, fast, ordering) in LISTS.items():
+                queryset = viewset.queryset.order_by(*ordering)
+                if viewset is PerformanceViewSet:
+                    queryset = queryset.defer("seat_bitmap")
+                for page_size in page_sizes:
+                    scenario = f"{name}-{page_size}"
+                    results["scenarios"][scenario] = summary = self.measure(
+                        queryset[:page_size], regular, fast, options["repeat"]
+                    )
+                    self.report(scenario, summary)
+
+        if options["output"]:
+            benchmarking.write_results(options["output"], results)
+            self.stdout.write(f"Results written to {options['output']}.")
+
+    @staticmethod
+    def seed(rows):
+        """Create ``rows`` performances and ``rows`` reservations of two
+        tickets each, one reservation per performance."""
+        users, performances = benchmarking.seed(
+            halls=10,
+            rows=10,
+            seats_in_row=20,
+            performances=-(-rows // 10),
+            users=20,
+        )
+        reservations = Reservation.objects.bulk_create(
+            Reservation(user=users[index % len(users)]) for index in range(rows)
+        )
+        Ticket.objects.bulk_reserve(
+            Ticket(
+                row=1,
+                seat=seat,
+                performance=performance,
+                reservation=reservation,
+            )
+            for performance, reservation in zip(performances, reservations)
+            for seat in (1, 2)
+        )
+
+    def measure(self, queryset, regular, fast, repeat):
+        renderer = JSONRenderer()
+        context = {"held_seats": {}}
+
+        def render_regular():
+            return renderer.render(
+                regular(list(queryset), many=True, context=context).data
+            )
+
+        def render_fast():
+            rows = list(
+                queryset.prefetch_related(None).values(*fast.values)
+            )
+            return renderer.render(fast(rows, context=context).data)
+
+        timings = {}
+        output = {}
+        for kind, render in (("regular", render_regular), ("fast", render_fast)):
+            durations = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                output[kind] = render()
+                durations.append(time.perf_counter() - started)
+            timings[kind] = statistics.median(durations) * 1000
+
+        return {
+            "rows": queryset.count(),
+            "regular_ms": round(timings["regular"], 3),
+            "fast_ms": round(timings["fast"], 3),
+            "speedup": round(timings["regular"] / timings["fast"], 2),
+            "identical": output["regular"] == output["fast"],
+        }
+
+    def report(self, scenario, summary):
+        line = (
+            f"{scenario}: {summary['rows']} rows, "
+            f"regular {summary['regular_ms']} ms, "
+            f"fast {summary['fast_ms']} ms, "
+            f"{summary['speedup']}x"
+        )
+        if summary["identical"]:
+            self.stdout.write(line)
+        else:
+            self.stdout.write(self.style.ERROR(f"{line}, output differs"))
@@ -0,0 +1,518 @@
+import itertools
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from theatre import caching, scheduling, search
+from theatre.models import (
+    Actor,
+    Genre,
+    Performance,
+    Play,
+    Reservation,
+    ReservationSummary,
+    TheatreHall,
+    Ticket,
+)
+from theatre.seat_map import SeatMap
+
+EMAIL = "loadtest{}@example.com"
+FIRST_NAMES = (
+    "Anna Bohdan Daria Dmytro Iryna Ivan Kateryna Maria Mykola Oksana Olena "
+    "Oleksandr Petro Roman Sofia Taras Viktor Yulia Andriy Halyna Ihor "
+    "Larysa Marko Nadia Ostap Solomiia Stepan Vira Yaroslav Zoriana"
+).split()
+LAST_NAMES = (
+    "Bondarenko Boyko Hnatyuk Honchar Kovalenko Kovalchuk Kravchenko "
+    "Kuzik Lysenko Marchenko Melnyk Moroz Oliynyk Pavlenko Petrenko "
+    "Polishchuk Savchenko Shevchenko Shevchuk Tkachenko Tkachuk Vasylenko "
+    "Zinchenko Rudenko Klymenko Levchenko Ponomarenko Savchuk Kharchenko"
+).split()
+GENRES = (
+    "Drama Comedy Tragedy Musical Opera Ballet Farce Satire Melodrama "
+    "Mystery Thriller Romance Fantasy Historical Documentary Improv "
+    "Puppetry Cabaret Mime Monologue Absurdist Burlesque Operetta "
+    "Pantomime Vaudeville"
+).split()
+ADJECTIVES = (
+    "silent broken golden last crimson hidden forgotten winter little "
+    "distant wild lonely bright restless bitter secret endless quiet "
+    "burning frozen wandering ancient false midnight"
+).split()
+NOUNS = (
+    "garden orchard river house king queen letter mirror storm journey "
+    "summer island city bridge forest tower harbour dream wedding shadow "
+    "lantern stranger promise inheritance"
+).split()
+# Tickets per reservation and how often each count is booked.
+GROUP_SIZES = (1, 2, 3, 4, 5, 6)
+GROUP_WEIGHTS = (20, 40, 15, 15, 5, 5)
+# How long before the show time reservations are made.
+MAX_BOOKING_AHEAD = timedelta(days=60)
+LAST_SHOW = 21
+
+
+def zipf_weights(count):
+    """Cumulative weights of ``count`` items following Zipf's law, as a few
+    plays and customers account for most of the tickets sold."""
+    return list(
+        itertools.accumulate(1 / rank for rank in range(1, count + 1))
+    )
+
+
+def last_id(model):
+    return model.objects.aggregate(last=Max("pk"))["last"] or 0
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic, deterministic dataset of halls, "
+        "plays, actors, genres, users, performances over several months and "
+        "their reservations and tickets, at the scale of production."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--halls", type=int, default=10)
+        parser.add_argument("--plays", type=int, default=2000)
+        parser.add_argument("--actors", type=int, default=5000)
+        parser.add_argument("--genres", type=int, default=30)
+        parser.add_argument("--users", type=int, default=50000)
+        parser.add_argument(
+            "--months",
+            type=int,
+            default=12,
+            help="Months of performances, from --start.",
+        )
+        parser.add_argument("--tickets", type=int, default=1000000)
+        parser.add_argument(
+            "--start",
+            type=date.fromisoformat,
+            help=(
+                "First day of performances, YYYY-MM-DD (default: the first "
+                "of the month half of --months ago). Pass it to get the "
+                "same dataset on another day."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--password",
+            default="loadtest",
+            help=(
+                "Password of every generated user, to log in as "
+                f"{EMAIL.format('N')} in load tests."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows written per batch.",
+        )
+
+    def handle(self, *args, **options):
+        counts = ("halls", "plays", "actors", "genres", "users", "months")
+        if min(options[name] for name in counts) < 1:
+            raise CommandError(
+                "--halls, --plays, --actors, --genres, --users and --months "
+                "must be positive."
+            )
+        if options["tickets"] < 0 or options["batch_size"] < 1:
+            raise CommandError(
+                "--tickets must not be negative and --batch-size must be "
+                "positive."
+            )
+        if get_user_model().objects.filter(email=EMAIL.format(0)).exists():
+            raise CommandError(
+                "The database already has generated data; flush it first."
+            )
+        start = options["start"] or add_months(
+            timezone.localdate().replace(day=1), -(options["months"] // 2)
+        )
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+
+        started = time.perf_counter()
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                # 256 MB rather than 2 MB of page cache, which thrashes on
+                # the inserts all over the ticket and summary indexes.
+                cursor.execute("PRAGMA cache_size = -262144")
+        with transaction.atomic():
+            user_ids = self.create_users(
+                options["users"], options["password"]
+            )
+            halls = self.create_halls(options["halls"])
+            self.create_genres(options["genres"])
+            self.create_actors(options["actors"])
+            plays = self.create_plays(options["plays"])
+            performances = self.plan_performances(
+                halls, plays, start, add_months(start, options["months"])
+            )
+            sold = self.allocate(
+                options["tickets"], performances, plays
+            )
+            reservations = self.create_performances(
+                performances, sold, user_ids
+            )
+            with connection.cursor() as cursor:
+                # Users and reservations were numbered here rather than by
+                # the database.
+                for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [get_user_model(), Reservation]
+                ):
+                    cursor.execute(sql)
+            # bulk_create sends no post_save to bump the cached versions.
+            caching.bump_on_commit(
+                "theatre_halls",
+                "genres",
+                "actors",
+                "plays",
+                "performances",
+                "performances:tickets",
+                *{
+                    caching.performance_day(performance.show_time)
+                    for performance in performances
+                },
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(user_ids)} users, {len(halls)} halls, "
+                f"{len(plays)} plays, {len(performances)} performances, "
+                f"{reservations} reservations and {sum(sold)} tickets in "
+                f"{time.perf_counter() - started:.1f} s."
+            )
+        )
+
+    def create_users(self, count, password):
+        """Users ``loadtest<N>@example.com`` with ``password``, numbered
+        after the last user. Returns their ids."""
+        User = get_user_model()
+        first_id = last_id(User) + 1
+        # Hashing is slow on purpose; every user shares the one hash.
+        template = User(password=make_password(password))
+        values = {
+            field.name: field.get_db_prep_save(
+                field.pre_save(template, add=True), connection
+            )
+            for field in User._meta.concrete_fields
+            if not field.primary_key
+        }
+        user_ids = range(first_id, first_id + count)
+        self.insert(
+            User,
+            ["id", *values],
+            [
+                (user_id, *{**values, "email": EMAIL.format(index)}.values())
+                for index, user_id in enumerate(user_ids)
+            ],
+        )
+        return user_ids
+
+    def create_halls(self, count):
+        return TheatreHall.objects.bulk_create(
+            TheatreHall(
+                name=f"Hall {index + 1}",
+                rows=self.rng.randint(8, 30),
+                seats_in_row=self.rng.randint(12, 40),
+            )
+            for index in range(count)
+        )
+
+    def create_genres(self, count):
+        # Genre names are unique, and the catalogue may have some already.
+        Genre.objects.bulk_create(
+            (
+                Genre(name=GENRES[index])
+                if index < len(GENRES)
+                else Genre(
+                    name=f"{GENRES[index % len(GENRES)]} "
+                    f"{index // len(GENRES) + 1}"
+                )
+                for index in range(count)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def create_actors(self, count):
+        Actor.objects.bulk_create(
+            (
+                Actor(
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                )
+                for _ in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def create_plays(self, count):
+        plays = []
+        for _ in range(count):
+            title = " ".join(
+                (
+                    self.rng.choice(("The", "Our", "Their", "My")),
+                    self.rng.choice(ADJECTIVES),
+                    self.rng.choice(NOUNS),
+                )
+            )
+            description = " ".join(
+                self.rng.choice(ADJECTIVES + NOUNS) for _ in range(12)
+            )
+            plays.append(
+                Play(title=title.title(), description=description.capitalize())
+            )
+        plays = Play.objects.bulk_create(plays, batch_size=self.batch_size)
+        search.index_plays(plays, replace=False)
+        return plays
+
+    def plan_performances(self, halls, plays, start, end):
+        """Unsaved performances of every hall on every day from ``start`` to
+        ``end``: a full day of shows at weekends and one or two evening
+        shows otherwise, of plays picked by their popularity."""
+        slots = []
+        show_time = datetime.combine(start, datetime.min.time()).replace(
+            hour=12
+        )
+        while show_time.hour < LAST_SHOW and show_time.day == start.day:
+            slots.append(show_time.time())
+            show_time += scheduling.duration() + timedelta(minutes=30)
+        weights = zipf_weights(len(plays))
+        performances = []
+        for offset in range((end - start).days):
+            day = start + timedelta(days=offset)
+            for hall in halls:
+                if day.weekday() >= 5:
+                    count = len(slots)
+                else:
+                    count = self.rng.choice((1, 1, 2))
+                for slot in slots[-count:]:
+                    performances.append(
+                        Performance(
+                            show_time=timezone.make_aware(
+                                datetime.combine(day, slot)
+                            ),
+                            play=self.rng.choices(
+                                plays, cum_weights=weights
+                            )[0],
+                            theatre_hall=hall,
+                        )
+                    )
+        return performances
+
+    def allocate(self, tickets, performances, plays):
+        """Tickets sold for each performance, ``tickets`` in all, shared by
+        the popularity of the plays, so the popular ones sell out."""
+        capacities = [
+            performance.theatre_hall.capacity for performance in performances
+        ]
+        if tickets > sum(capacities):
+            raise CommandError(
+                f"{tickets} tickets do not fit in the {sum(capacities)} "
+                f"seats of the performances; add halls or months."
+            )
+        ranks = {play.pk: rank for rank, play in enumerate(plays, 1)}
+        weights = []
+        for performance in performances:
+            weights.append(
+                1
+                / ranks[performance.play.pk]
+                * performance.theatre_hall.capacity
+                * self.rng.uniform(0.5, 1.5)
+            )
+
+        sold = [0] * len(performances)
+        remaining = tickets
+        while remaining:
+            open_indexes = [
+                index
+                for index, capacity in enumerate(capacities)
+                if sold[index] < capacity
+            ]
+            total = sum(weights[index] for index in open_indexes)
+            given = 0
+            for index in open_indexes:
+                share = int(remaining * weights[index] / total) or 1
+                share = min(share, capacities[index] - sold[index])
+                share = min(share, remaining - given)
+                sold[index] += share
+                given += share
+                if given == remaining:
+                    break
+            remaining -= given
+        return sold
+
+    def create_performances(
+        self, performances, sold, user_ids, chunk_size=500
+    ):
+        """Write the performances, with the seat maps and counters their
+        tickets would have set one by one, and their reservations, tickets
+        and reservation summaries, a chunk of performances at a time.
+        Returns the number of reservations.
+
+        Reservations are numbered here, after the last one, so their
+        tickets and summaries can be written without reading ids back.
+        """
+        weights = zipf_weights(len(user_ids))
+        # Users are picked by rank, not in the order they were created.
+        user_ids = self.rng.sample(user_ids, len(user_ids))
+        reservation_id = last_id(Reservation)
+        summary_fields = {
+            name: ReservationSummary._meta.get_field(name)
+            for name in ("performance_ids", "show_times", "play_titles")
+        }
+        first_reservation_id = reservation_id
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        ahead = int(MAX_BOOKING_AHEAD.total_seconds()) - 3600
+        for chunk in range(0, len(performances), chunk_size):
+            chunk_performances = performances[chunk:chunk + chunk_size]
+            chunk_seats = []
+            for performance, count in zip(
+                chunk_performances, sold[chunk:chunk + chunk_size]
+            ):
+                hall = performance.theatre_hall
+                seat_map = SeatMap.for_hall(hall)
+                # Sorted, so that the seats of a reservation are together.
+                seats = []
+                for position in sorted(
+                    self.rng.sample(range(hall.capacity), count)
+                ):
+                    row, seat = divmod(position, hall.seats_in_row)
+                    seat_map.take(row + 1, seat + 1)
+                    seats.append((row + 1, seat + 1))
+                performance.seat_bitmap = seat_map.to_bytes()
+                performance.tickets_sold = count
+                chunk_seats.append(seats)
+            Performance.objects.bulk_create(
+                chunk_performances, batch_size=self.batch_size
+            )
+
+            reservations = []
+            tickets = []
+            summaries = []
+            for performance, seats in zip(chunk_performances, chunk_seats):
+                if not seats:
+                    continue
+                # Every reservation of a performance has the same summary
+                # but for its owner, date and ticket count.
+                summary = [
+                    field.get_db_prep_save(value, connection)
+                    for field, value in zip(
+                        summary_fields.values(),
+                        (
+                            [performance.pk],
+                            [performance.show_time],
+                            [performance.play.title],
+                        ),
+                    )
+                ]
+                show_time = performance.show_time
+                sizes = self.rng.choices(
+                    GROUP_SIZES, weights=GROUP_WEIGHTS, k=len(seats)
+                )
+                owners = self.rng.choices(
+                    user_ids, cum_weights=weights, k=len(seats)
+                )
+                taken = 0
+                for size, user_id in zip(sizes, owners):
+                    group = seats[taken:taken + size]
+                    if not group:
+                        break
+                    taken += len(group)
+                    reservation_id += 1
+                    booked_at = adapt_datetime(
+                        show_time
+                        - timedelta(seconds=3600 + self.rng.randrange(ahead))
+                    )
+                    reservations.append((reservation_id, booked_at, user_id))
+                    tickets.extend(
+                        (row, seat, performance.pk, reservation_id)
+                        for row, seat in group
+                    )
+                    summaries.append(
+                        (
+                            reservation_id,
+                            user_id,
+                            booked_at,
+                            len(group),
+                            *summary,
+                        )
+                    )
+
+            self.insert(
+                Reservation, ["id", "created_at", "user"], reservations
+            )
+            self.insert(
+                Ticket, ["row", "seat", "performance", "reservation"], tickets
+            )
+            self.insert(
+                ReservationSummary,
+                [
+                    "reservation",
+                    "user",
+                    "created_at",
+                    "ticket_count",
+                    *summary_fields,
+                ],
+                summaries,
+            )
+            if connection.vendor == "postgresql":
+                self.check_foreign_keys()
+        return reservation_id - first_reservation_id
+
+    def check_foreign_keys(self):
+        """Check the foreign keys PostgreSQL defers to the commit.
+
+        Its checks look rows up with plans made from the statistics of the
+        referenced tables, which know nothing of the rows inserted in this
+        transaction: without analyzing them first, every check scans the
+        whole table and a million tickets take hours to commit.
+        """
+        tables = ", ".join(
+            connection.ops.quote_name(model._meta.db_table)
+            for model in (get_user_model(), Performance, Reservation)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {tables}")
+        connection.check_constraints()
+
+    def insert(self, model, fields, rows):
+        """Insert ``rows`` of values of ``fields`` already prepared for the
+        database, as many rows per statement as bulk_create would send.
+
+        As bulk_create without the model instance and value preparation of
+        each row, which take several times as long as the insert itself at
+        a million rows.
+        """
+        fields = [model._meta.get_field(name) for name in fields]
+        batch_size = min(
+            self.batch_size, connection.ops.bulk_batch_size(fields, rows)
+        )
+        quote_name = connection.ops.quote_name
+        columns = ", ".join(quote_name(field.column) for field in fields)
+        sql = (
+            f"INSERT INTO {quote_name(model._meta.db_table)} ({columns}) "
+            f"VALUES "
+        )
+        placeholders = f"({', '.join(['%s'] * len(fields))})"
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                cursor.execute(
+                    sql + ", ".join([placeholders] * len(batch)),
+                    [value for row in batch for value in row],
+                )
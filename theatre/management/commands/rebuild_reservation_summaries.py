@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from theatre.models import Reservation, ReservationSummary
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the history summaries of reservations from their tickets, "
+        "e.g. after loading them from a fixture, which does not write them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "reservations",
+            nargs="*",
+            type=int,
+            help="Ids of the reservations to rebuild (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        reservation_ids = Reservation.objects.order_by("id").values_list(
+            "id", flat=True
+        )
+        if options["reservations"]:
+            reservation_ids = reservation_ids.filter(
+                pk__in=options["reservations"]
+            )
+
+        rebuilt = 0
+        batch = []
+        for reservation_id in reservation_ids.iterator(chunk_size=BATCH_SIZE):
+            batch.append(reservation_id)
+            if len(batch) == BATCH_SIZE:
+                ReservationSummary.objects.refresh(batch)
+                rebuilt += len(batch)
+                batch = []
+        if batch:
+            ReservationSummary.objects.refresh(batch)
+            rebuilt += len(batch)
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} reservation summaries.")
+        )
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from theatre.models import Performance, Ticket
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the sold tickets counters and seat maps of performances "
+        "against their tickets and rebuild the ones out of sync."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "performances",
+            nargs="*",
+            type=int,
+            help="Ids of the performances to check (default: all).",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report mismatches and fail if there are any.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Rebuild every checked performance, even if it looks in sync.",
+        )
+
+    def handle(self, *args, **options):
+        performances = (
+            Performance.objects.select_related("theatre_hall")
+            .only(
+                "id",
+                "tickets_sold",
+                "seat_bitmap",
+                "theatre_hall__rows",
+                "theatre_hall__seats_in_row",
+            )
+            .order_by("id")
+        )
+        tickets = Ticket.objects.order_by()
+        if options["performances"]:
+            performances = performances.filter(pk__in=options["performances"])
+            tickets = tickets.filter(performance_id__in=options["performances"])
+
+        tickets_sold = dict(
+            tickets.values("performance_id")
+            .annotate(tickets_sold=Count("id"))
+            .values_list("performance_id", "tickets_sold")
+        )
+
+        checked = 0
+        out_of_sync = []
+        for performance in performances.iterator(chunk_size=2000):
+            checked += 1
+            expected = tickets_sold.get(performance.id, 0)
+            seat_map_count = performance.seat_map.count()
+            if (
+                performance.tickets_sold != expected
+                or seat_map_count != expected
+            ):
+                out_of_sync.append(performance.id)
+                self.stdout.write(
+                    f"Performance {performance.id}: "
+                    f"counter {performance.tickets_sold}, "
+                    f"seat map {seat_map_count}, tickets {expected}"
+                )
+
+        if options["verify"]:
+            if out_of_sync:
+                raise CommandError(
+                    f"{len(out_of_sync)} of {checked} performance(s) "
+                    f"are out of sync."
+                )
+            self.stdout.write(
+                self.style.SUCCESS(f"{checked} performance(s) are in sync.")
+            )
+            return
+
+        to_rebuild = (
+            performances.values_list("id", flat=True)
+            if options["force"]
+            else out_of_sync
+        )
+        rebuilt = 0
+        for performance_id in to_rebuild:
+            Performance.rebuild_seat_map(performance_id)
+            rebuilt += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {rebuilt} of {checked} performance(s)."
+            )
+        )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from theatre import search
+from theatre.models import Play
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite the search index of plays, e.g. after loading them from a "
+        "fixture, which does not index them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "plays",
+            nargs="*",
+            type=int,
+            help="Ids of the plays to index (default: all).",
+        )
+
+    def handle(self, *args, **options):
+        plays = Play.objects.only("id", "title", "description").order_by("id")
+        if options["plays"]:
+            plays = plays.filter(pk__in=options["plays"])
+
+        indexed = 0
+        batch = []
+        for play in plays.iterator(chunk_size=search.BATCH_SIZE):
+            batch.append(play)
+            if len(batch) == search.BATCH_SIZE:
+                search.index_plays(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            search.index_plays(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} play(s)."))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+from theatre.seat_map import SeatMap
+
+
+def fill_seat_bitmaps(apps, schema_editor):
+    Performance = apps.get_model("theatre", "Performance")
+    Ticket = apps.get_model("theatre", "Ticket")
+
+    for performance in Performance.objects.select_related("theatre_hall"):
+        seat_map = SeatMap.for_hall(performance.theatre_hall)
+        for row, seat in Ticket.objects.filter(
+            performance=performance
+        ).values_list("row", "seat"):
+            seat_map.take(row, seat)
+        performance.seat_bitmap = seat_map.to_bytes()
+        performance.save(update_fields=["seat_bitmap"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("theatre", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="performance",
+            name="seat_bitmap",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(fill_seat_bitmaps, migrations.RunPython.noop),
+    ]
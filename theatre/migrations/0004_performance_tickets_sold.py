@@ -0,0 +1,35 @@
+# Generated by Django 4.2.9 on 2026-10-18 20:34
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_tickets_sold(apps, schema_editor):
+    Performance = apps.get_model("theatre", "Performance")
+    Ticket = apps.get_model("theatre", "Ticket")
+
+    for performance_id, tickets_sold in (
+        Ticket.objects.order_by()
+        .values("performance_id")
+        .annotate(tickets_sold=Count("id"))
+        .values_list("performance_id", "tickets_sold")
+    ):
+        Performance.objects.filter(pk=performance_id).update(
+            tickets_sold=tickets_sold
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("theatre", "0003_performance_seat_bitmap"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="performance",
+            name="tickets_sold",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_tickets_sold, migrations.RunPython.noop),
+    ]
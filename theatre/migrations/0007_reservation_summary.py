@@ -0,0 +1,110 @@
+# Generated by Django 4.2.9 on 2026-10-18 21:23
+
+from collections import defaultdict
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def fill_reservation_summaries(apps, schema_editor):
+    Reservation = apps.get_model("theatre", "Reservation")
+    ReservationSummary = apps.get_model("theatre", "ReservationSummary")
+    Ticket = apps.get_model("theatre", "Ticket")
+
+    reservations = Reservation.objects.order_by("id").values_list(
+        "id", "user_id", "created_at"
+    )
+    last_id = 0
+    while batch := list(reservations.filter(id__gt=last_id)[:BATCH_SIZE]):
+        last_id = batch[-1][0]
+        tickets = defaultdict(list)
+        for reservation_id, performance_id, show_time, title in (
+            Ticket.objects.filter(reservation_id__in=[row[0] for row in batch])
+            .order_by()
+            .values_list(
+                "reservation_id",
+                "performance_id",
+                "performance__show_time",
+                "performance__play__title",
+            )
+        ):
+            tickets[reservation_id].append((show_time, performance_id, title))
+
+        summaries = []
+        for reservation_id, user_id, created_at in batch:
+            if not tickets[reservation_id]:
+                continue
+            performances = sorted(set(tickets[reservation_id]))
+            summaries.append(
+                ReservationSummary(
+                    reservation_id=reservation_id,
+                    user_id=user_id,
+                    created_at=created_at,
+                    ticket_count=len(tickets[reservation_id]),
+                    performance_ids=[item[1] for item in performances],
+                    show_times=[item[0] for item in performances],
+                    play_titles=[item[2] for item in performances],
+                )
+            )
+        ReservationSummary.objects.bulk_create(summaries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("theatre", "0006_performance_play_show_time_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReservationSummary",
+            fields=[
+                (
+                    "reservation",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="summary",
+                        serialize=False,
+                        to="theatre.reservation",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("ticket_count", models.PositiveIntegerField()),
+                ("performance_ids", models.JSONField(default=list)),
+                (
+                    "show_times",
+                    models.JSONField(
+                        default=list,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("play_titles", models.JSONField(default=list)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "created_at", "reservation"],
+                        name="reservation_summary_user_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(
+            fill_reservation_summaries, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 4.2.9 on 2026-10-18 21:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from theatre.search import token_weights
+
+BATCH_SIZE = 1000
+
+
+def index_plays(apps, schema_editor):
+    Play = apps.get_model("theatre", "Play")
+    PlaySearchToken = apps.get_model("theatre", "PlaySearchToken")
+
+    PlaySearchToken.objects.bulk_create(
+        (
+            PlaySearchToken(play_id=play_id, token=token, weight=weight)
+            for play_id, title, description in Play.objects.values_list(
+                "id", "title", "description"
+            ).iterator(chunk_size=BATCH_SIZE)
+            for token, weight in token_weights(title, description).items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("theatre", "0007_reservation_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlaySearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=64)),
+                ("weight", models.PositiveIntegerField()),
+                (
+                    "play",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="theatre.play",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="playsearchtoken",
+            constraint=models.UniqueConstraint(
+                fields=("play", "token"), name="play_search_token_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="playsearchtoken",
+            index=models.Index(
+                fields=["token", "-weight", "play"],
+                name="play_search_token_weight_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="playsearchtoken",
+            index=models.Index(
+                fields=["play", "token", "weight"],
+                name="play_search_token_play_idx",
+            ),
+        ),
+        migrations.RunPython(index_plays, migrations.RunPython.noop),
+    ]
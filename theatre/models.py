@@ -1,6 +1,20 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, router, transaction
 from django.conf import settings
+from django.dispatch import Signal
+from django.utils.dateparse import parse_datetime
+
+from theatre.seat_map import SeatMap
+
+# Sent with the ``performance`` whose sold or held seats have changed, and
+# the ``(row, seat)`` seats that were ``taken`` or ``released`` by tickets
+# or ``held`` or ``unheld`` by seat holds.
+seats_changed = Signal()
 
 
 class TheatreHall(models.Model):
@@ -12,6 +26,22 @@ class TheatreHall(models.Model):
     def capacity(self) -> int:
         return self.rows * self.seats_in_row
 
+    def clean(self):
+        if self.pk is None:
+            return
+        if (
+            Ticket.objects.filter(performance__theatre_hall=self)
+            .filter(
+                models.Q(row__gt=self.rows)
+                | models.Q(seat__gt=self.seats_in_row)
+            )
+            .exists()
+        ):
+            raise ValidationError(
+                "Tickets were sold for seats outside of "
+                f"{self.rows} rows of {self.seats_in_row} seats."
+            )
+
     def __str__(self):
         return self.name
 
@@ -46,17 +76,143 @@ class Play(models.Model):
         return self.title
 
 
+class PlaySearchToken(models.Model):
+    """Posting of the inverted index searched by ``theatre.search``: a
+    normalized word of a play's title or description and its weight."""
+
+    token = models.CharField(max_length=64)
+    play = models.ForeignKey(
+        Play,
+        on_delete=models.CASCADE,
+        related_name="search_tokens",
+        db_index=False,
+    )
+    weight = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["play", "token"], name="play_search_token_unique"
+            ),
+        ]
+        indexes = [
+            # Postings of a token, best first.
+            models.Index(
+                fields=["token", "-weight", "play"],
+                name="play_search_token_weight_idx",
+            ),
+            # Postings of given plays, read from the index alone, which
+            # also keeps SQLite from scanning the postings of the tokens
+            # instead.
+            models.Index(
+                fields=["play", "token", "weight"],
+                name="play_search_token_play_idx",
+            ),
+        ]
+
+
 class Performance(models.Model):
     show_time = models.DateTimeField()
     play = models.ForeignKey(Play, on_delete=models.CASCADE)
     theatre_hall = models.ForeignKey(TheatreHall, on_delete=models.CASCADE)
+    seat_bitmap = models.BinaryField(default=bytes, editable=False)
+    tickets_sold = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-show_time"]
+        indexes = [
+            models.Index(
+                fields=["show_time", "id"], name="performance_show_time_idx"
+            ),
+            models.Index(
+                fields=["play", "show_time"], name="performance_play_time_idx"
+            ),
+        ]
 
     def __str__(self):
         return self.play.title + " " + str(self.show_time)
 
+    @property
+    def seat_map(self) -> SeatMap:
+        return SeatMap.for_hall(self.theatre_hall, self.seat_bitmap)
+
+    @property
+    def tickets_available(self) -> int:
+        return self.theatre_hall.capacity - self.tickets_sold
+
+    @classmethod
+    def mark_seats(cls, performance_id, taken=(), released=()):
+        """Flip seats in the stored bitmap and adjust the sold tickets counter
+        under a row lock on the performance.
+
+        Returns the updated performance, or None if it no longer exists
+        (e.g. tickets deleted by a cascade from their performance).
+        """
+        with transaction.atomic():
+            performance = (
+                cls.objects.select_for_update(of=("self",))
+                .select_related("theatre_hall")
+                .filter(pk=performance_id)
+                .first()
+            )
+            if performance is None:
+                return None
+            seat_map = performance.seat_map
+            released = [seat for seat in released if seat_map.release(*seat)]
+            taken = [seat for seat in taken if seat_map.take(*seat)]
+            performance.tickets_sold += len(taken) - len(released)
+            performance.seat_bitmap = seat_map.to_bytes()
+            performance.save_seat_stats(taken=taken, released=released)
+            return performance
+
+    @classmethod
+    def rebuild_seat_map(cls, performance_id, previous_size=None):
+        """Recompute the bitmap and the sold tickets counter of a performance
+        from its ticket rows.
+
+        ``previous_size``, the ``(rows, seats_in_row)`` of a hall just
+        resized, is what the stored bitmap was laid out for.
+        """
+        with transaction.atomic():
+            performance = (
+                cls.objects.select_for_update(of=("self",))
+                .select_related("theatre_hall")
+                .filter(pk=performance_id)
+                .first()
+            )
+            if performance is None:
+                return None
+            if previous_size is None:
+                previous = set(performance.seat_map.taken())
+            else:
+                previous = set(
+                    SeatMap(*previous_size, performance.seat_bitmap).taken()
+                )
+            seat_map = SeatMap.for_hall(performance.theatre_hall)
+            for row, seat in performance.tickets.values_list("row", "seat"):
+                seat_map.take(row, seat)
+            current = set(seat_map.taken())
+            performance.seat_bitmap = seat_map.to_bytes()
+            performance.tickets_sold = seat_map.count()
+            performance.save_seat_stats(
+                taken=sorted(current - previous),
+                released=sorted(previous - current),
+            )
+            return performance
+
+    def save_seat_stats(self, taken=(), released=()):
+        # A plain update keeps seat changes from looking like edits of the
+        # performance itself to post_save receivers.
+        Performance.objects.filter(pk=self.pk).update(
+            seat_bitmap=self.seat_bitmap, tickets_sold=self.tickets_sold
+        )
+        seats_changed.send(
+            sender=Performance,
+            performance=self,
+            taken=taken,
+            released=released,
+        )
+
 
 class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
@@ -69,6 +225,216 @@ class Reservation(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["created_at", "id"], name="reservation_created_at_idx"
+            ),
+        ]
+
+
+class ReservationSummaryManager(models.Manager):
+    def refresh(self, reservation_ids):
+        """Rebuild the summaries of the given reservations from their
+        tickets, dropping those of reservations left without tickets."""
+        reservation_ids = set(reservation_ids)
+        if not reservation_ids:
+            return
+        database = router.db_for_write(self.model)
+        tickets = (
+            Ticket.objects.using(database)
+            .filter(reservation_id__in=reservation_ids)
+            .select_related("reservation", "performance__play")
+            .only(
+                "reservation__user_id",
+                "reservation__created_at",
+                "performance__show_time",
+                "performance__play__title",
+            )
+        )
+        tickets_by_reservation = defaultdict(list)
+        for ticket in tickets:
+            tickets_by_reservation[ticket.reservation].append(ticket)
+
+        self.using(database).filter(
+            reservation_id__in=reservation_ids
+            - {reservation.id for reservation in tickets_by_reservation}
+        ).delete()
+        self.using(database).bulk_create(
+            [
+                self.model.summarize(reservation, tickets)
+                for reservation, tickets in tickets_by_reservation.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["reservation"],
+            update_fields=[
+                "ticket_count",
+                "performance_ids",
+                "show_times",
+                "play_titles",
+            ],
+        )
+
+    def update_performances(self, performances, batch_size=1000):
+        """Write the current show times and play titles of ``performances``,
+        a queryset or ids, into the summaries listing them.
+
+        Only the summaries are read and rewritten, a batch at a time, not
+        the tickets they were built from, so renaming a play costs one row
+        read and written per reservation of it.
+        """
+        database = router.db_for_write(self.model)
+        performances = (
+            Performance.objects.using(database)
+            .filter(pk__in=performances)
+            .values_list("id", "show_time", "play__title")
+        )
+        shows = {
+            performance_id: (show_time, title)
+            for performance_id, show_time, title in performances
+        }
+        reservation_ids = list(
+            Ticket.objects.using(database)
+            .filter(performance_id__in=list(shows))
+            .order_by()
+            .values_list("reservation_id", flat=True)
+            .distinct()
+        )
+        for start in range(0, len(reservation_ids), batch_size):
+            summaries = list(
+                self.using(database).filter(
+                    pk__in=reservation_ids[start:start + batch_size]
+                )
+            )
+            for summary in summaries:
+                entries = []
+                for performance_id, show_time, title in zip(
+                    summary.performance_ids,
+                    summary.show_times,
+                    summary.play_titles,
+                ):
+                    show_time, title = shows.get(
+                        performance_id, (parse_datetime(show_time), title)
+                    )
+                    entries.append((show_time, performance_id, title))
+                # Ordered as summarize orders them.
+                entries.sort()
+                (
+                    summary.show_times,
+                    summary.performance_ids,
+                    summary.play_titles,
+                ) = (list(values) for values in zip(*entries))
+            # Written as refresh writes them, which is several times faster
+            # than bulk_update and its CASE expressions.
+            self.using(database).bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=["reservation"],
+                update_fields=["performance_ids", "show_times", "play_titles"],
+            )
+
+
+class ReservationSummary(models.Model):
+    """Denormalized reservation for its owner's history.
+
+    Written together with the reservation's tickets and rebuilt when they,
+    their performances or plays change, so a page of a user's history is a
+    single query on ``(user, created_at)``. Fixtures do not write them; the
+    ``rebuild_reservation_summaries`` command does.
+    """
+
+    reservation = models.OneToOneField(
+        Reservation,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="summary",
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    created_at = models.DateTimeField()
+    ticket_count = models.PositiveIntegerField()
+    # One entry per performance, ordered by show time.
+    performance_ids = models.JSONField(default=list)
+    show_times = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    play_titles = models.JSONField(default=list)
+
+    objects = ReservationSummaryManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(
+                fields=["user", "created_at", "reservation"],
+                name="reservation_summary_user_idx",
+            ),
+        ]
+
+    @classmethod
+    def summarize(cls, reservation, tickets):
+        """Build the summary of ``reservation`` from its tickets, which must
+        have their performance and its play loaded."""
+        performances = sorted(
+            {ticket.performance for ticket in tickets},
+            key=lambda performance: (performance.show_time, performance.id),
+        )
+        return cls(
+            reservation=reservation,
+            user_id=reservation.user_id,
+            created_at=reservation.created_at,
+            ticket_count=len(tickets),
+            performance_ids=[performance.id for performance in performances],
+            show_times=[performance.show_time for performance in performances],
+            play_titles=[
+                performance.play.title for performance in performances
+            ],
+        )
+
+
+class TicketManager(models.Manager):
+    def taken_of(self, seats):
+        """Return which ``(performance_id, row, seat)`` seats already have
+        tickets, using a single query for the whole set.
+
+        The check runs on the database tickets are written to, never on a
+        replica that may lag behind it.
+        """
+        seats_by_performance = defaultdict(list)
+        for performance_id, row, seat in seats:
+            seats_by_performance[performance_id].append(
+                models.Q(row=row, seat=seat)
+            )
+        if not seats_by_performance:
+            return []
+
+        return sorted(
+            self.using(router.db_for_write(self.model))
+            .filter(
+                reduce(
+                    or_,
+                    (
+                        models.Q(performance_id=performance_id)
+                        & reduce(or_, seat_filters)
+                        for performance_id, seat_filters
+                        in seats_by_performance.items()
+                    ),
+                )
+            )
+            .order_by()
+            .values_list("performance_id", "row", "seat")
+        )
+
+    def bulk_reserve(self, tickets):
+        """Insert already validated tickets in one statement and mark their
+        seats on the performances' seat maps."""
+        tickets = self.bulk_create(tickets)
+        seats_by_performance = defaultdict(list)
+        for ticket in tickets:
+            seats_by_performance[ticket.performance_id].append(
+                (ticket.row, ticket.seat)
+            )
+        for performance_id, seats in seats_by_performance.items():
+            Performance.mark_seats(performance_id, taken=seats)
+        return tickets
 
 
 class Ticket(models.Model):
@@ -81,6 +447,8 @@ class Ticket(models.Model):
         Reservation, on_delete=models.CASCADE, related_name="tickets"
     )
 
+    objects = TicketManager()
+
     @staticmethod
     def validate_ticket(row, seat, theatre_hall, error_to_raise):
         for ticket_attr_value, ticket_attr_name, theatre_hall_attr_name in [
@@ -126,3 +494,8 @@ class Ticket(models.Model):
     class Meta:
         unique_together = ("performance", "row", "seat")
         ordering = ["row", "seat"]
+        indexes = [
+            models.Index(
+                fields=["row", "seat", "id"], name="ticket_row_seat_idx"
+            ),
+        ]
@@ -0,0 +1,91 @@
+"""JSON rendering with orjson when it is installed.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer``
+for compact output, which is what API clients get, several times faster on
+large payloads such as the ``taken_places`` of a full hall. Types orjson
+does not serialize the same way as DRF, such as datetimes and decimals, go
+through DRF's encoder. Without orjson, or when indented or ASCII-only
+output is asked for, the renderer falls back to ``JSONRenderer``.
+
+``NDJSONRenderer`` and ``CSVRenderer`` are the formats of the exports.
+"""
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# See JSONRenderer.render: both are escaped so the output is valid
+# JavaScript as well as JSON.
+LINE_SEPARATOR = "\u2028".encode()
+PARAGRAPH_SEPARATOR = "\u2029".encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    if orjson is not None:
+        options = (
+            orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.options
+        )
+        return ret.replace(LINE_SEPARATOR, b"\\u2028").replace(
+            PARAGRAPH_SEPARATOR, b"\\u2029"
+        )
+
+
+class NDJSONRenderer(FastJSONRenderer):
+    """Newline delimited JSON, one object per line.
+
+    Exports stream their rows themselves; this renders other responses,
+    such as errors, as a single line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return (
+            super().render(data, accepted_media_type, renderer_context)
+            + b"\n"
+        )
+
+
+class CSVRenderer(BaseRenderer):
+    """CSV with a header line.
+
+    Exports stream their rows themselves; this renders other responses,
+    such as errors, as a header and a single row of the object's values.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, dict):
+            data = {"detail": data}
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(data)
+        writer.writerow(data.values())
+        return buffer.getvalue().encode(self.charset)
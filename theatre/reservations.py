@@ -0,0 +1,77 @@
+"""Reservation engine.
+
+Seats are validated before a reservation is written, but another customer
+can still reserve one of them in between. Claims are therefore serialized
+per performance: the rows of the performances involved are locked, in id
+order so that claims spanning several performances cannot deadlock, before
+the tickets are written. A claim that finds its seats gone trips the unique
+constraint on tickets, and the seats it lost are reported with ``SeatsLost``
+rather than as a generic failure.
+"""
+from django.db import IntegrityError, connections, router, transaction
+
+from theatre import holds
+from theatre.models import (
+    Performance,
+    Reservation,
+    ReservationSummary,
+    Ticket,
+)
+
+
+class SeatsLost(Exception):
+    def __init__(self, seats):
+        super().__init__(f"Seats were reserved by another customer: {seats}")
+        self.seats = seats
+
+
+def lock_performances(performance_ids):
+    """Lock the given performances until the end of the transaction.
+
+    Backends without row locks, i.e. SQLite, already let a single writing
+    transaction at a time through, and the claim starts with a write.
+    """
+    database = router.db_for_write(Performance)
+    if connections[database].features.has_select_for_update:
+        list(
+            Performance.objects.using(database)
+            .filter(pk__in=set(performance_ids))
+            .order_by("pk")
+            .select_for_update()
+            .values_list("pk")
+        )
+
+
+def reserve(user, tickets, hold=None):
+    """Reserve ``tickets``, dicts of ``performance``, ``row`` and ``seat``,
+    for ``user`` and release the seat ``hold`` they came from, if any.
+    Performances need their play loaded for the reservation's summary.
+
+    Raises ``SeatsLost`` with the ``(performance_id, row, seat)`` seats that
+    were reserved by someone else since they were validated.
+    """
+    seats = [
+        (ticket["performance"].id, ticket["row"], ticket["seat"])
+        for ticket in tickets
+    ]
+    try:
+        with transaction.atomic(using=router.db_for_write(Reservation)):
+            lock_performances(performance_id for performance_id, _, _ in seats)
+            reservation = Reservation.objects.create(user=user)
+            created = Ticket.objects.bulk_reserve(
+                Ticket(reservation=reservation, **ticket) for ticket in tickets
+            )
+            ReservationSummary.summarize(reservation, created).save(
+                force_insert=True
+            )
+            if hold:
+                transaction.on_commit(lambda: holds.release_hold(hold))
+    except IntegrityError:
+        # Everything is rolled back by now. With the locks held the unique
+        # constraint on tickets only trips on seats that were reserved
+        # after validation, which are committed and can be looked up.
+        lost = Ticket.objects.taken_of(seats)
+        if not lost:
+            raise
+        raise SeatsLost(lost) from None
+    return reservation
@@ -0,0 +1,150 @@
+"""Scheduling of performances in bulk.
+
+A performance occupies its hall for ``PERFORMANCE_DURATION_MINUTES`` from
+its show time, so two performances in a hall overlap when their show times
+are less than that apart. As every performance lasts as long, the show
+times of a hall sorted are enough of an interval index: the only scheduled
+performance that can overlap a new one is the first starting after the new
+one's start minus the duration. A batch is checked in a single pass over
+such an index, loaded with one query for the halls and dates of the batch,
+to which the performances of the batch are added as they are checked, and
+then written with one ``bulk_create`` in the same transaction.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from theatre import caching
+from theatre.models import Performance, TheatreHall
+
+MAX_PERFORMANCES = 1000
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class DoubleBooked(Exception):
+    def __init__(self, conflicts):
+        super().__init__(f"Halls are already booked: {conflicts}")
+        self.conflicts = conflicts
+
+
+def duration():
+    return timedelta(minutes=settings.PERFORMANCE_DURATION_MINUTES)
+
+
+def occurrences(weekdays, time, date_from, date_to):
+    """Show times at ``time``, in the current time zone, on the
+    ``weekdays`` from ``date_from`` to ``date_to`` inclusive."""
+    days = {WEEKDAYS.index(weekday) for weekday in weekdays}
+    return [
+        timezone.make_aware(datetime.combine(day, time))
+        for day in (
+            date_from + timedelta(days=offset)
+            for offset in range((date_to - date_from).days + 1)
+        )
+        if day.weekday() in days
+    ]
+
+
+class HallSchedule:
+    """Show times of the performances of each hall, sorted."""
+
+    def __init__(self, length):
+        self.length = length
+        # Hall id: ([show times], [performance ids]), in show time order
+        self.halls = defaultdict(lambda: ([], []))
+
+    def add(self, hall_id, show_time, performance_id=None):
+        show_times, performance_ids = self.halls[hall_id]
+        index = bisect_right(show_times, show_time)
+        show_times.insert(index, show_time)
+        performance_ids.insert(index, performance_id)
+
+    def overlapping(self, hall_id, show_time):
+        """Show time and id of a performance in the hall overlapping one at
+        ``show_time``, or None. Ids of unsaved performances are None."""
+        show_times, performance_ids = self.halls[hall_id]
+        index = bisect_right(show_times, show_time - self.length)
+        if index < len(show_times) and (
+            show_times[index] < show_time + self.length
+        ):
+            return show_times[index], performance_ids[index]
+        return None
+
+
+def lock_halls(hall_ids, using):
+    """Lock the given halls until the end of the transaction, so that
+    batches for the same hall are checked one after the other.
+
+    Backends without row locks, i.e. SQLite, let a single writing
+    transaction at a time through anyway.
+    """
+    if connections[using].features.has_select_for_update:
+        list(
+            TheatreHall.objects.using(using)
+            .filter(pk__in=set(hall_ids))
+            .order_by("pk")
+            .select_for_update()
+            .values_list("pk")
+        )
+
+
+def find_conflicts(performances, using=None):
+    """Performances of the batch overlapping a scheduled performance or an
+    earlier one of the batch, as ``(performance, show time, id)`` of each
+    and of the performance it overlaps."""
+    if not performances:
+        return []
+    length = duration()
+    schedule = HallSchedule(length)
+    show_times = [performance.show_time for performance in performances]
+    for hall_id, show_time, performance_id in (
+        Performance.objects.using(using)
+        .filter(
+            theatre_hall_id__in={
+                performance.theatre_hall_id for performance in performances
+            },
+            show_time__gt=min(show_times) - length,
+            show_time__lt=max(show_times) + length,
+        )
+        .order_by()
+        .values_list("theatre_hall_id", "show_time", "id")
+    ):
+        schedule.add(hall_id, show_time, performance_id)
+
+    conflicts = []
+    for performance in performances:
+        overlapping = schedule.overlapping(
+            performance.theatre_hall_id, performance.show_time
+        )
+        if overlapping:
+            conflicts.append((performance, *overlapping))
+        else:
+            schedule.add(performance.theatre_hall_id, performance.show_time)
+    return conflicts
+
+
+def schedule(performances):
+    """Create ``performances``, unsaved, unless any of them overlaps
+    another performance in its hall.
+
+    Raises ``DoubleBooked`` with the conflicts of ``find_conflicts``.
+    """
+    database = router.db_for_write(Performance)
+    with transaction.atomic(using=database):
+        lock_halls(
+            (performance.theatre_hall_id for performance in performances),
+            database,
+        )
+        conflicts = find_conflicts(performances, using=database)
+        if conflicts:
+            raise DoubleBooked(conflicts)
+        performances = Performance.objects.using(database).bulk_create(
+            performances
+        )
+        # bulk_create sends no post_save for the catalogue version.
+        caching.bump_on_commit("performances")
+    return performances
@@ -0,0 +1,452 @@
+"""Search over play titles and descriptions.
+
+Words of both are normalized into tokens and kept in an inverted index,
+``PlaySearchToken``, rewritten whenever a play is saved; plays loaded from
+fixtures are indexed by the ``reindex_plays`` command. A query matches
+the plays that have every one of its words: exactly, by prefix for the last
+word, which may still be being typed, or within a small edit distance for
+words that are not in the index at all. Words are resolved to index tokens
+in memory, against the vocabulary of the index: a sorted list for prefixes
+and a SymSpell-style table of deletes for typos. It is read once per
+process, which takes seconds for a large catalogue, when the server starts,
+and then kept up to date from a journal in the cache of the token counts
+each write to the index changes. Plays are ranked by the weight of their
+matches: title words weigh more than description words, and exact matches
+more than prefixes and corrections.
+
+The index lives in ordinary tables, so it works the same on every database.
+"""
+import heapq
+import logging
+import re
+import threading
+import unicodedata
+import uuid
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, defaultdict
+from functools import reduce
+from itertools import combinations
+from operator import or_
+
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Case, Count, Q, When
+
+from theatre import caching
+from theatre.models import PlaySearchToken
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+MAX_TOKEN_LENGTH = 64
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+PREFIX_FACTOR = 0.5
+TYPO_FACTOR = 0.3
+MIN_PREFIX_LENGTH = 2
+MAX_EXPANSIONS = 50
+MAX_CANDIDATES = 300
+MAX_RESULTS = 100
+BATCH_SIZE = 1000
+VERSION_KEY = "search:vocabulary:version"
+JOURNAL_LENGTH = 1000
+JOURNAL_TIMEOUT = 24 * 60 * 60
+
+
+def tokenize(text):
+    """Lowercase words of ``text`` without accents, in order."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [token[:MAX_TOKEN_LENGTH] for token in TOKEN_PATTERN.findall(text)]
+
+
+def token_weights(title, description):
+    weights = Counter()
+    for token in tokenize(title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(description):
+        weights[token] += DESCRIPTION_WEIGHT
+    return weights
+
+
+def index_plays(plays, replace=True):
+    """Write the postings of ``plays``, replacing their previous ones unless
+    the plays are new."""
+    plays = list(plays)
+    database = router.db_for_write(PlaySearchToken)
+    postings = PlaySearchToken.objects.using(database)
+    new_postings = [
+        PlaySearchToken(play=play, token=token, weight=weight)
+        for play in plays
+        for token, weight in token_weights(
+            play.title, play.description
+        ).items()
+    ]
+    changes = Counter(posting.token for posting in new_postings)
+    if not replace:
+        postings.bulk_create(new_postings, batch_size=BATCH_SIZE)
+        _publish_changes(changes, database)
+        return
+    with transaction.atomic(using=database):
+        old_postings = postings.filter(play__in=[play.pk for play in plays])
+        changes.subtract(old_postings.values_list("token", flat=True))
+        old_postings.delete()
+        postings.bulk_create(new_postings, batch_size=BATCH_SIZE)
+        _publish_changes(changes, database)
+
+
+def unindex_plays(plays):
+    """Take the postings of ``plays``, about to be deleted with them, out of
+    the vocabulary."""
+    database = router.db_for_write(PlaySearchToken)
+    changes = Counter()
+    changes.subtract(
+        PlaySearchToken.objects.using(database)
+        .filter(play__in=[play.pk for play in plays])
+        .values_list("token", flat=True)
+    )
+    _publish_changes(changes, database)
+
+
+def max_edits(word):
+    """Typos tolerated in a word; short words must be spelled right."""
+    if len(word) < 4:
+        return 0
+    if len(word) < 8:
+        return 1
+    return 2
+
+
+def _deletes(word, edits):
+    """``word`` and every string made by deleting up to ``edits`` of its
+    characters."""
+    return {
+        "".join(
+            char for index, char in enumerate(word) if index not in removed
+        )
+        for count in range(edits + 1)
+        for removed in combinations(range(len(word)), count)
+    }
+
+
+def edit_distance(a, b):
+    """Optimal string alignment distance: insertions, deletions,
+    substitutions and transpositions of adjacent characters."""
+    previous_row = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        previous_row, last_row = row, previous_row
+        row = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            row[j] = min(
+                previous_row[j] + 1,
+                row[j - 1] + 1,
+                previous_row[j - 1] + cost,
+            )
+            if (
+                i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                row[j] = min(row[j], last_row[j - 2] + 1)
+    return row[-1]
+
+
+class Vocabulary:
+    """Distinct index tokens and the number of postings of each, looked up
+    exactly, by prefix and by their deletes."""
+
+    def __init__(self, frequencies):
+        self.frequencies = dict(frequencies)
+        self.tokens = sorted(self.frequencies)
+        self.deletes = defaultdict(list)
+        for token in self.tokens:
+            self._add_deletes(token)
+
+    def _add_deletes(self, token):
+        for delete in _deletes(token, max_edits(token)):
+            self.deletes[delete].append(token)
+
+    def update(self, changes):
+        """Add ``changes`` to the posting counts of tokens.
+
+        Tokens left without postings stay, counted as none, rather than be
+        looked for in the lists of their deletes. Counts are set before the
+        token is listed, so that concurrent lookups always find them.
+        """
+        for token, change in changes.items():
+            count = self.frequencies.get(token)
+            self.frequencies[token] = max((count or 0) + change, 0)
+            if count is None:
+                insort(self.tokens, token)
+                self._add_deletes(token)
+
+    def completions(self, prefix):
+        """The ``MAX_EXPANSIONS`` most frequent tokens longer than
+        ``prefix`` that start with it."""
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        tokens = self.tokens[
+            bisect_right(self.tokens, prefix) : bisect_left(
+                self.tokens, upper
+            )
+        ]
+        return [
+            token
+            for token in heapq.nlargest(
+                MAX_EXPANSIONS, tokens, key=self.frequencies.__getitem__
+            )
+            if self.frequencies[token]
+        ]
+
+    def corrections(self, word):
+        """Tokens within ``max_edits(word)`` of ``word``, closest first."""
+        edits = max_edits(word)
+        candidates = {
+            token
+            for delete in _deletes(word, edits)
+            for token in self.deletes.get(delete, ())
+        }
+        distances = {
+            token: edit_distance(word, token)
+            for token in candidates
+            if self.frequencies[token]
+        }
+        return sorted(
+            (
+                token
+                for token, distance in distances.items()
+                if distance <= edits
+            ),
+            key=lambda token: (distances[token], token),
+        )
+
+    def matches(self, words):
+        """Tokens matching each of ``words`` with the factor of their
+        weight: the word itself, completions of the last word, and
+        corrections of words matching nothing else."""
+        matches = {}
+        for word in words:
+            tokens = {}
+            if self.frequencies.get(word):
+                tokens[word] = 1.0
+            if word == words[-1] and len(word) >= MIN_PREFIX_LENGTH:
+                for token in self.completions(word):
+                    tokens[token] = PREFIX_FACTOR
+            if not tokens:
+                for token in self.corrections(word):
+                    tokens[token] = TYPO_FACTOR
+            matches[word] = tokens
+        return matches
+
+
+_vocabulary = (None, None)
+_vocabulary_lock = threading.Lock()
+_read_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _journal_version():
+    """Id of the journal and number of its last change, starting a new
+    journal if the cache has none, so that processes which read an older
+    one tell it apart."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, (uuid.uuid4().hex, 0), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _change_key(version):
+    return f"search:vocabulary:change:{version[0]}:{version[1]}"
+
+
+def _journal(changes):
+    with caching.lock(VERSION_KEY):
+        journal_id, number = _journal_version()
+        version = (journal_id, number + 1)
+        cache.set(_change_key(version), changes, JOURNAL_TIMEOUT)
+        cache.set(VERSION_KEY, version, None)
+
+
+def _publish_changes(changes, database):
+    """Journal ``changes`` to the posting counts of tokens for the
+    vocabulary of every process.
+
+    Added postings are journaled at once and removed ones once the write
+    commits, so a rolled-back write may leave counts too high, but never a
+    token with postings out of the vocabulary.
+    """
+    added = {token: change for token, change in changes.items() if change > 0}
+    removed = {
+        token: change for token, change in changes.items() if change < 0
+    }
+    if added:
+        _journal(added)
+    if removed:
+        transaction.on_commit(lambda: _journal(removed), using=database)
+
+
+def _changes_since(read_at, version):
+    """Journaled changes after version ``read_at`` up to ``version``, or
+    None if the journal no longer has all of them."""
+    if read_at[0] != version[0] or version[1] - read_at[1] > JOURNAL_LENGTH:
+        return None
+    keys = [
+        _change_key((version[0], number))
+        for number in range(read_at[1] + 1, version[1] + 1)
+    ]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return None
+    return [changes[key] for key in keys]
+
+
+def _read(seen):
+    """Read the vocabulary of the whole index and swap it in, unless it was
+    read again since ``seen``.
+
+    This takes seconds for a large catalogue, so it runs outside
+    ``_vocabulary_lock`` and one read at a time.
+    """
+    global _vocabulary
+    with _read_lock:
+        if _vocabulary is not seen:
+            return _vocabulary[1]
+        # Read before the index, so no change is missed; one that is
+        # counted twice only puts a count off.
+        version = _journal_version()
+        index = Vocabulary(
+            PlaySearchToken.objects.order_by()
+            .values_list("token")
+            .annotate(Count("id"))
+        )
+        with _vocabulary_lock:
+            _vocabulary = (version, index)
+        return index
+
+
+def vocabulary():
+    """Vocabulary of the index, brought up to date with the journal.
+
+    The index is read again only when the journal no longer has every
+    change since it was last read: when the cache lost some of them, or
+    after more than ``JOURNAL_LENGTH`` writes to the index, or a day,
+    between two searches of this process. Searches running meanwhile keep
+    the vocabulary they have.
+    """
+    global _vocabulary
+    with _vocabulary_lock:
+        seen = _vocabulary
+        read_at, index = seen
+        if index is not None:
+            version = _journal_version()
+            if version == read_at:
+                return index
+            changes = _changes_since(read_at, version)
+            if changes is not None:
+                for change in changes:
+                    index.update(change)
+                _vocabulary = (version, index)
+                return index
+    if index is not None and _read_lock.locked():
+        return index
+    return _read(seen)
+
+
+def read_vocabulary_in_background():
+    """Read the vocabulary in a thread, so that the first search of a new
+    process does not wait for it."""
+
+    def read():
+        try:
+            vocabulary()
+        except Exception:
+            logger.exception("Reading the search vocabulary failed")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    return thread
+
+
+def _prefix_range(prefix):
+    """Filter of the tokens starting with ``prefix`` as a range of the
+    token index, which ``LIKE 'prefix%'`` does not use everywhere."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(token__gte=prefix, token__lt=upper)
+
+
+def _lookup(word, tokens):
+    """Filter of the postings of the ``tokens`` matching ``word``. A word
+    and its completions are looked up as one range, a single run of the
+    postings of each play, though the range may hold tokens beyond
+    ``MAX_EXPANSIONS``."""
+    if len(tokens) > 1 and all(token.startswith(word) for token in tokens):
+        return _prefix_range(word)
+    return Q(token__in=tokens)
+
+
+def search(query, limit=MAX_RESULTS):
+    """Ids of the plays best matching ``query``, best first.
+
+    Candidates are the plays of the ``MAX_CANDIDATES`` heaviest postings of
+    the rarest word, and only they are looked up for the other words, so a
+    query reads few rows however common its words are. Results are exact
+    unless the rarest word matches more plays than that.
+    """
+    words = list(dict.fromkeys(tokenize(query)))
+    if not words:
+        return []
+    index = vocabulary()
+    matches = index.matches(words)
+    if not all(matches.values()):
+        return []
+    rarest = min(
+        words,
+        key=lambda word: sum(
+            index.frequencies[token] for token in matches[word]
+        ),
+    )
+
+    # Heaviest first, read from the token index.
+    postings = list(
+        PlaySearchToken.objects.filter(token__in=matches[rarest])
+        .order_by("-weight", "play_id")
+        .values_list("play_id", "token", "weight")[:MAX_CANDIDATES]
+    )
+    others = [word for word in words if word != rarest]
+    if others:
+        postings += PlaySearchToken.objects.filter(
+            reduce(or_, (_lookup(word, matches[word]) for word in others)),
+            play_id__in={play_id for play_id, _, _ in postings},
+        ).values_list("play_id", "token", "weight")
+
+    scores = defaultdict(dict)
+    for play_id, token, weight in postings:
+        for word in words:
+            factor = matches[word].get(token)
+            if factor:
+                score = scores[play_id]
+                score[word] = max(score.get(word, 0), weight * factor)
+    ranked = sorted(
+        (
+            (-sum(score.values()), play_id)
+            for play_id, score in scores.items()
+            if len(score) == len(words)
+        ),
+    )
+    return [play_id for _, play_id in ranked[:limit]]
+
+
+def search_plays(queryset, query):
+    """Plays of ``queryset`` matching ``query``, best first."""
+    play_ids = search(query)
+    return queryset.filter(pk__in=play_ids).order_by(
+        Case(
+            *(When(pk=pk, then=rank) for rank, pk in enumerate(play_ids)),
+            default=len(play_ids),
+        ),
+        "pk",
+    )
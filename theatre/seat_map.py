@@ -0,0 +1,83 @@
+import base64
+
+
+class SeatMap:
+    """Bit-per-seat occupancy grid of a theatre hall.
+
+    Seats are numbered row-major starting from (1, 1); seat ``(row, seat)``
+    lives at bit ``(row - 1) * seats_in_row + (seat - 1)``, most significant
+    bit of each byte first, so clients can decode the packed form directly.
+    """
+
+    def __init__(self, rows: int, seats_in_row: int, data=b""):
+        self.rows = rows
+        self.seats_in_row = seats_in_row
+        size = (rows * seats_in_row + 7) // 8
+        self.bits = bytearray(bytes(data or b"")[:size]).ljust(size, b"\0")
+
+    @classmethod
+    def for_hall(cls, theatre_hall, data=b""):
+        return cls(theatre_hall.rows, theatre_hall.seats_in_row, data)
+
+    def _position(self, row: int, seat: int) -> int:
+        if not (1 <= row <= self.rows and 1 <= seat <= self.seats_in_row):
+            raise ValueError(f"Seat (row: {row}, seat: {seat}) is outside the hall")
+        return (row - 1) * self.seats_in_row + (seat - 1)
+
+    def is_taken(self, row: int, seat: int) -> bool:
+        position = self._position(row, seat)
+        return bool(self.bits[position >> 3] & (0x80 >> (position & 7)))
+
+    def take(self, row: int, seat: int) -> bool:
+        """Mark a seat as taken, returning False if it already was."""
+        position = self._position(row, seat)
+        mask = 0x80 >> (position & 7)
+        if self.bits[position >> 3] & mask:
+            return False
+        self.bits[position >> 3] |= mask
+        return True
+
+    def release(self, row: int, seat: int) -> bool:
+        """Mark a seat as free, returning False if it already was."""
+        position = self._position(row, seat)
+        mask = 0x80 >> (position & 7)
+        if not self.bits[position >> 3] & mask:
+            return False
+        self.bits[position >> 3] &= ~mask & 0xFF
+        return True
+
+    def count(self) -> int:
+        return int.from_bytes(self.bits, "big").bit_count()
+
+    def taken(self):
+        """Yield taken seats as ``(row, seat)`` tuples in row, seat order."""
+        for byte_index, byte in enumerate(self.bits):
+            if not byte:
+                continue
+            for bit in range(8):
+                if byte & (0x80 >> bit):
+                    position = (byte_index << 3) + bit
+                    yield (
+                        position // self.seats_in_row + 1,
+                        position % self.seats_in_row + 1,
+                    )
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.bits)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.bits).decode("ascii")
+
+    def row_ranges(self) -> list:
+        """Group taken seats into inclusive ``[first, last]`` runs per row."""
+        ranges = []
+        for row, seat in self.taken():
+            if ranges and ranges[-1]["row"] == row:
+                runs = ranges[-1]["seats"]
+                if runs[-1][1] == seat - 1:
+                    runs[-1][1] = seat
+                    continue
+                runs.append([seat, seat])
+            else:
+                ranges.append({"row": row, "seats": [[seat, seat]]})
+        return ranges
@@ -1,8 +1,14 @@
-from rest_framework import serializers
-from rest_framework.exceptions import ValidationError
+from rest_framework import serializers, status
+from rest_framework.exceptions import (
+    APIException,
+    ErrorDetail,
+    ValidationError,
+)
 
-from django.db import transaction
+from django.conf import settings
 
+from theatre import allocation, holds, reservations, scheduling
+from theatre_service.metrics import count_seat_conflicts
 from theatre.models import (
     TheatreHall,
     Genre,
@@ -10,6 +16,7 @@ from theatre.models import (
     Play,
     Performance,
     Reservation,
+    ReservationSummary,
     Ticket,
 )
 
@@ -44,6 +51,167 @@ class PerformanceSerializer(serializers.ModelSerializer):
         fields = ["id", "show_time", "play", "theatre_hall"]
 
 
+class ScheduledPerformanceSerializer(PerformanceSerializer):
+    """Performance of a schedule; its play and hall are looked up by the
+    schedule, together with the rest, rather than one query at a time."""
+
+    play = serializers.IntegerField(source="play_id")
+    theatre_hall = serializers.IntegerField(source="theatre_hall_id")
+
+
+class RecurrenceSerializer(serializers.Serializer):
+    play = serializers.PrimaryKeyRelatedField(queryset=Play.objects.all())
+    theatre_hall = serializers.PrimaryKeyRelatedField(
+        queryset=TheatreHall.objects.all()
+    )
+    weekdays = serializers.ListField(
+        child=serializers.ChoiceField(choices=scheduling.WEEKDAYS),
+        allow_empty=False,
+    )
+    time = serializers.TimeField()
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+
+    def validate(self, attrs):
+        data = super(RecurrenceSerializer, self).validate(attrs=attrs)
+        if data["date_to"] < data["date_from"]:
+            raise ValidationError(
+                {"date_to": "date_to must not be before date_from."}
+            )
+        return data
+
+
+class PerformanceScheduleSerializer(serializers.Serializer):
+    """Performances scheduled at once, given as a list or as a weekly
+    recurrence of a play in a hall."""
+
+    performances = ScheduledPerformanceSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=scheduling.MAX_PERFORMANCES,
+        required=False,
+    )
+    recurrence = RecurrenceSerializer(required=False, write_only=True)
+
+    def validate(self, attrs):
+        data = super(PerformanceScheduleSerializer, self).validate(
+            attrs=attrs
+        )
+        if ("performances" in data) == ("recurrence" in data):
+            raise ValidationError(
+                "Either performances or a recurrence is required."
+            )
+        if "recurrence" in data:
+            data["performances"] = self.recur(data.pop("recurrence"))
+        else:
+            data["performances"] = self.resolve(data["performances"])
+        return data
+
+    @staticmethod
+    def recur(recurrence):
+        show_times = scheduling.occurrences(
+            recurrence["weekdays"],
+            recurrence["time"],
+            recurrence["date_from"],
+            recurrence["date_to"],
+        )
+        if not show_times:
+            raise ValidationError(
+                {"recurrence": "The recurrence has no performances."}
+            )
+        if len(show_times) > scheduling.MAX_PERFORMANCES:
+            raise ValidationError(
+                {
+                    "recurrence": (
+                        f"The recurrence has {len(show_times)} "
+                        f"performances, more than "
+                        f"{scheduling.MAX_PERFORMANCES}."
+                    )
+                }
+            )
+        return [
+            Performance(
+                show_time=show_time,
+                play=recurrence["play"],
+                theatre_hall=recurrence["theatre_hall"],
+            )
+            for show_time in show_times
+        ]
+
+    @staticmethod
+    def resolve(performances_data):
+        plays = Play.objects.in_bulk(
+            {performance["play_id"] for performance in performances_data}
+        )
+        halls = TheatreHall.objects.in_bulk(
+            {
+                performance["theatre_hall_id"]
+                for performance in performances_data
+            }
+        )
+        errors = [
+            f"Play {pk} does not exist."
+            for pk in sorted(
+                {performance["play_id"] for performance in performances_data}
+                - set(plays)
+            )
+        ] + [
+            f"Theatre hall {pk} does not exist."
+            for pk in sorted(
+                {
+                    performance["theatre_hall_id"]
+                    for performance in performances_data
+                }
+                - set(halls)
+            )
+        ]
+        if errors:
+            raise ValidationError({"performances": errors})
+        return [
+            Performance(
+                show_time=performance["show_time"],
+                play=plays[performance["play_id"]],
+                theatre_hall=halls[performance["theatre_hall_id"]],
+            )
+            for performance in performances_data
+        ]
+
+    def conflict_error(self, performance, show_time, performance_id):
+        as_text = self.fields["performances"].child.fields[
+            "show_time"
+        ].to_representation
+        other = (
+            f"performance {performance_id}"
+            if performance_id
+            else "another performance of the schedule"
+        )
+        return (
+            f"Performance at {as_text(performance.show_time)} in "
+            f"{performance.theatre_hall.name} overlaps {other} at "
+            f"{as_text(show_time)}."
+        )
+
+    def create(self, validated_data):
+        try:
+            return scheduling.schedule(validated_data["performances"])
+        except scheduling.DoubleBooked as e:
+            raise ValidationError(
+                {
+                    "performances": [
+                        self.conflict_error(*conflict)
+                        for conflict in e.conflicts
+                    ]
+                }
+            )
+
+    def to_representation(self, performances):
+        return {
+            "performances": PerformanceSerializer(
+                performances, many=True
+            ).data
+        }
+
+
 class PerformanceListSerializer(PerformanceSerializer):
     play_title = serializers.CharField(source="play.title", read_only=True)
     theatre_hall_name = serializers.CharField(
@@ -52,7 +220,7 @@ class PerformanceListSerializer(PerformanceSerializer):
     theatre_hall_capacity = serializers.IntegerField(
         source="theatre_hall.capacity", read_only=True
     )
-    tickets_available = serializers.IntegerField(read_only=True)
+    tickets_available = serializers.SerializerMethodField()
 
     class Meta:
         model = Performance
@@ -65,8 +233,18 @@ class PerformanceListSerializer(PerformanceSerializer):
             "tickets_available",
         ]
 
+    def get_tickets_available(self, performance) -> int:
+        held_seats = self.context.get("held_seats", {})
+        return performance.tickets_available - held_seats.get(performance.id, 0)
+
 
 class TicketSerializer(serializers.ModelSerializer):
+    # Choices of the browsable API form are labelled with Performance.__str__,
+    # which reads the play.
+    performance = serializers.PrimaryKeyRelatedField(
+        queryset=Performance.objects.select_related("play")
+    )
+
     def validate(self, attrs):
         data = super(TicketSerializer, self).validate(attrs=attrs)
         Ticket.validate_ticket(
@@ -93,35 +271,404 @@ class TicketSeatsSerializer(TicketSerializer):
 
 
 class PerformanceDetailSerializer(PerformanceSerializer):
+    SEAT_MAP_FORMATS = ("base64", "ranges")
+
     play = PlaySerializer(many=False, read_only=True)
     theatre_hall = TheatreHallSerializer(many=False, read_only=True)
-    taken_places = TicketSeatsSerializer(
-        source="tickets", many=True, read_only=True
-    )
+    taken_places = serializers.SerializerMethodField()
+    held_places = serializers.SerializerMethodField()
+    seat_map = serializers.SerializerMethodField()
 
     class Meta:
         model = Performance
-        fields = ["id", "show_time", "play", "theatre_hall", "taken_places"]
+        fields = [
+            "id",
+            "show_time",
+            "play",
+            "theatre_hall",
+            "taken_places",
+            "held_places",
+            "seat_map",
+        ]
+
+    def get_taken_places(self, performance):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in performance.seat_map.taken()
+        ]
+
+    def get_held_places(self, performance):
+        return [
+            {"row": row, "seat": seat}
+            for row, seat in holds.held_seats(performance.id)
+        ]
+
+    def get_seat_map(self, performance):
+        request = self.context.get("request")
+        encoding = request.query_params.get("seat_map") if request else None
+        if encoding not in self.SEAT_MAP_FORMATS:
+            encoding = "base64"
+
+        seat_map = performance.seat_map
+        return {
+            "rows": seat_map.rows,
+            "seats_in_row": seat_map.seats_in_row,
+            "encoding": encoding,
+            "data": (
+                seat_map.to_base64()
+                if encoding == "base64"
+                else seat_map.row_ranges()
+            ),
+        }
+
+
+class ReservationTicketSerializer(TicketSerializer):
+    """Ticket of a reservation; its seat is validated by the reservation,
+    together with the rest of the seats, rather than one query at a time."""
+
+    performance = serializers.IntegerField(source="performance_id")
+
+    def validate(self, attrs):
+        return attrs
+
+    class Meta:
+        model = Ticket
+        fields = ("id", "row", "seat", "performance")
+        validators = []
+
+
+class SeatSerializer(serializers.Serializer):
+    row = serializers.IntegerField()
+    seat = serializers.IntegerField()
+
+
+class SeatHoldSerializer(serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    performance = serializers.PrimaryKeyRelatedField(
+        queryset=Performance.objects.select_related("theatre_hall")
+    )
+    seats = SeatSerializer(many=True, allow_empty=False)
+    minutes = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        required=False,
+        write_only=True,
+    )
+    expires_at = serializers.DateTimeField(read_only=True)
+
+    def validate(self, attrs):
+        data = super(SeatHoldSerializer, self).validate(attrs=attrs)
+        seat_map = data["performance"].seat_map
+
+        seats = set()
+        errors = []
+        for seat_data in data["seats"]:
+            Ticket.validate_ticket(
+                seat_data["row"],
+                seat_data["seat"],
+                data["performance"].theatre_hall,
+                ValidationError,
+            )
+            seat = (seat_data["row"], seat_data["seat"])
+            if seat in seats:
+                errors.append(
+                    f"Seat (row: {seat[0]}, seat: {seat[1]}) "
+                    f"is requested more than once."
+                )
+            elif seat_map.is_taken(*seat):
+                errors.append(
+                    f"Seat (row: {seat[0]}, seat: {seat[1]}) is already taken."
+                )
+            seats.add(seat)
+        if errors:
+            count_seat_conflicts(
+                taken=sum(seat_map.is_taken(*seat) for seat in seats)
+            )
+            raise ValidationError({"seats": errors})
+        return data
+
+    def create(self, validated_data):
+        try:
+            return holds.hold_seats(
+                self.context["request"].user.id,
+                validated_data["performance"],
+                [(seat["row"], seat["seat"]) for seat in validated_data["seats"]],
+                validated_data.get("minutes"),
+            )
+        except holds.SeatsUnavailable as e:
+            count_seat_conflicts(held=len(e.seats))
+            raise ValidationError(
+                {
+                    "seats": [
+                        f"Seat (row: {row}, seat: {seat}) "
+                        f"is held by another customer."
+                        for row, seat in e.seats
+                    ]
+                }
+            )
+
+    def to_representation(self, hold):
+        return {
+            "id": hold["id"],
+            "performance": hold["performance"],
+            "seats": [{"row": row, "seat": seat} for row, seat in hold["seats"]],
+            "expires_at": self.fields["expires_at"].to_representation(
+                hold["expires_at"]
+            ),
+        }
+
+
+class SeatAllocationSerializer(serializers.Serializer):
+    """Best block of adjacent free seats of ``context["performance"]``."""
+
+    party_size = serializers.IntegerField(min_value=1, write_only=True)
+    rows = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        required=False,
+        write_only=True,
+    )
+    hold = serializers.BooleanField(default=False, write_only=True)
+    minutes = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.SEAT_HOLD_MAX_MINUTES,
+        required=False,
+        write_only=True,
+    )
+
+    def validate(self, attrs):
+        data = super(SeatAllocationSerializer, self).validate(attrs=attrs)
+        theatre_hall = self.context["performance"].theatre_hall
+
+        errors = {}
+        if data["party_size"] > theatre_hall.seats_in_row:
+            errors["party_size"] = (
+                f"party_size must be at most {theatre_hall.seats_in_row}."
+            )
+        outside = sorted(
+            row for row in set(data.get("rows", ())) if row > theatre_hall.rows
+        )
+        if outside:
+            errors["rows"] = (
+                f"Rows {outside} are outside of the hall "
+                f"(1, {theatre_hall.rows})."
+            )
+        if errors:
+            raise ValidationError(errors)
+        return data
+
+    def create(self, validated_data):
+        performance = self.context["performance"]
+        try:
+            score, seats, hold = allocation.allocate(
+                performance,
+                validated_data["party_size"],
+                rows=validated_data.get("rows"),
+                hold_for=(
+                    self.context["request"].user.id
+                    if validated_data["hold"]
+                    else None
+                ),
+                minutes=validated_data.get("minutes"),
+            )
+        except allocation.NoSeatsAvailable:
+            raise ValidationError(
+                {
+                    "party_size": (
+                        f"No block of {validated_data['party_size']} "
+                        f"adjacent free seats is available."
+                    )
+                }
+            )
+        return {
+            "performance": performance.id,
+            "seats": seats,
+            "score": score,
+            "hold": hold,
+        }
+
+    def to_representation(self, allocated):
+        hold = allocated["hold"]
+        return {
+            "performance": allocated["performance"],
+            "seats": [
+                {"row": row, "seat": seat} for row, seat in allocated["seats"]
+            ],
+            "score": allocated["score"],
+            "hold": (
+                SeatHoldSerializer(hold, context=self.context).data
+                if hold
+                else None
+            ),
+        }
+
+
+class SeatConflict(APIException):
+    """Seats are taken or held by another customer.
+
+    Unlike a validation error the request may succeed with other seats, so
+    the response lists the unavailable seats for the client to replace,
+    whether they were found when the request was validated or lost to a
+    concurrent reservation afterwards.
+    """
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Some seats were reserved by another customer."
+    default_code = "seat_conflict"
+
+    def __init__(self, errors, seats, detail=None):
+        super().__init__(detail)
+        self.detail = {
+            "detail": self.detail,
+            "tickets": [
+                ErrorDetail(error, code=self.default_code) for error in errors
+            ],
+            "seats": [
+                {"performance": performance_id, "row": row, "seat": seat}
+                for performance_id, row, seat in seats
+            ],
+        }
 
 
 class ReservationSerializer(serializers.ModelSerializer):
-    tickets = TicketSerializer(many=True, read_only=False, allow_empty=False)
+    tickets = ReservationTicketSerializer(
+        many=True, read_only=False, allow_empty=False, required=False
+    )
+    hold = serializers.CharField(write_only=True, required=False)
 
     class Meta:
         model = Reservation
-        fields = ["id", "tickets", "created_at"]
+        fields = ["id", "tickets", "hold", "created_at"]
 
-    def create(self, validated_data):
-        with transaction.atomic():
+    def validate(self, attrs):
+        data = super(ReservationSerializer, self).validate(attrs=attrs)
+
+        hold = None
+        if "hold" in data:
+            hold = holds.get_hold(data["hold"])
+            if hold is None or hold["user"] != self.context["request"].user.id:
+                raise ValidationError(
+                    {"hold": "Seat hold does not exist or has expired."}
+                )
+            data["hold"] = hold
+            data.setdefault(
+                "tickets",
+                [
+                    {"row": row, "seat": seat, "performance_id": hold["performance"]}
+                    for row, seat in hold["seats"]
+                ],
+            )
+        if "tickets" not in data:
+            raise ValidationError(
+                {"tickets": [self.fields["tickets"].error_messages["required"]]}
+            )
+        tickets_data = data["tickets"]
+
+        performances = Performance.objects.select_related(
+            "theatre_hall", "play"
+        ).in_bulk({ticket["performance_id"] for ticket in tickets_data})
+        missing = sorted(
+            {ticket["performance_id"] for ticket in tickets_data}
+            - set(performances)
+        )
+        if missing:
+            raise ValidationError(
+                {"tickets": [f"Performance {pk} does not exist." for pk in missing]}
+            )
+
+        seats = set()
+        errors = []
+        for ticket_data in tickets_data:
+            performance = performances[ticket_data.pop("performance_id")]
+            ticket_data["performance"] = performance
+            seat = (performance.id, ticket_data["row"], ticket_data["seat"])
             try:
-                tickets_data = validated_data.pop("tickets")
-                reservation = Reservation.objects.create(**validated_data)
-                for ticket_data in tickets_data:
-                    Ticket.objects.create(reservation=reservation, **ticket_data)
-                return reservation
-            except Exception as e:
-                raise serializers.ValidationError(f"Error creating reservation: {str(e)}")
+                Ticket.validate_ticket(
+                    ticket_data["row"],
+                    ticket_data["seat"],
+                    performance.theatre_hall,
+                    ValidationError,
+                )
+            except ValidationError as error:
+                errors.extend(
+                    self.seat_error(*seat, f"is outside the hall: {message}")
+                    for message in error.detail.values()
+                )
+                continue
+            if seat in seats:
+                errors.append(
+                    self.seat_error(*seat, "is requested more than once")
+                )
+            elif hold and (
+                performance.id != hold["performance"]
+                or seat[1:] not in hold["seats"]
+            ):
+                errors.append(self.seat_error(*seat, "is not part of the hold"))
+            seats.add(seat)
+        if errors:
+            raise ValidationError({"tickets": errors})
+
+        taken = Ticket.objects.taken_of(seats)
+        held = [
+            seat
+            for seat, hold_id in sorted(holds.holders_of(seats).items())
+            if hold is None or hold_id != hold["id"]
+        ]
+        count_seat_conflicts(taken=len(taken), held=len(held))
+        if taken or held:
+            raise SeatConflict(
+                [self.seat_error(*seat, "is already taken") for seat in taken]
+                + [
+                    self.seat_error(*seat, "is held by another customer")
+                    for seat in held
+                ],
+                [*taken, *held],
+                "Some seats are taken or held by another customer.",
+            )
+        return data
+
+    @staticmethod
+    def seat_error(performance_id, row, seat, reason):
+        return (
+            f"Seat (row: {row}, seat: {seat}) of performance "
+            f"{performance_id} {reason}."
+        )
+
+    def create(self, validated_data):
+        try:
+            return reservations.reserve(
+                validated_data["user"],
+                validated_data["tickets"],
+                validated_data.get("hold"),
+            )
+        except reservations.SeatsLost as e:
+            count_seat_conflicts(lost=len(e.seats))
+            raise SeatConflict(
+                [
+                    self.seat_error(*seat, "was reserved by another customer")
+                    for seat in e.seats
+                ],
+                e.seats,
+            )
 
 
 class ReservationListSerializer(ReservationSerializer):
     tickets = TicketListSerializer(many=True, read_only=True)
+
+
+class ReservationSummarySerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source="reservation_id", read_only=True)
+    show_times = serializers.ListField(
+        child=serializers.DateTimeField(), read_only=True
+    )
+
+    class Meta:
+        model = ReservationSummary
+        fields = [
+            "id",
+            "created_at",
+            "ticket_count",
+            "performance_ids",
+            "show_times",
+            "play_titles",
+        ]
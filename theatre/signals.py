@@ -0,0 +1,229 @@
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+
+from theatre import caching, events, search
+from theatre.models import (
+    Actor,
+    Genre,
+    Performance,
+    Play,
+    Reservation,
+    ReservationSummary,
+    TheatreHall,
+    Ticket,
+    seats_changed,
+)
+from theatre_service import metrics
+
+
+@receiver(pre_save, sender=Ticket)
+def remember_ticket_performance(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_performance_id, instance._previous_reservation_id = (
+        Ticket.objects.filter(pk=instance.pk)
+        .values_list("performance_id", "reservation_id")
+        .first()
+    ) or (None, None)
+
+
+@receiver(post_save, sender=Ticket)
+def mark_ticket_seat(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        Performance.mark_seats(
+            instance.performance_id, taken=[(instance.row, instance.seat)]
+        )
+        return
+
+    # Fixture loads and edits of existing tickets may move seats around,
+    # so recompute the affected bitmaps from the ticket table instead.
+    Performance.rebuild_seat_map(instance.performance_id)
+    previous_performance_id = getattr(
+        instance, "_previous_performance_id", None
+    )
+    if previous_performance_id not in (None, instance.performance_id):
+        Performance.rebuild_seat_map(previous_performance_id)
+
+
+@receiver(post_delete, sender=Ticket)
+def release_ticket_seat(sender, instance, **kwargs):
+    Performance.mark_seats(
+        instance.performance_id, released=[(instance.row, instance.seat)]
+    )
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def refresh_ticket_reservation_summary(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ReservationSummary.objects.refresh(
+            {
+                instance.reservation_id,
+                getattr(instance, "_previous_reservation_id", None),
+            }
+            - {None}
+        )
+
+
+@receiver(pre_save, sender=Performance)
+def remember_performance_show(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_show = (
+        Performance.objects.filter(pk=instance.pk)
+        .values_list("show_time", "play_id")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Performance)
+def refresh_performance_reservation_summaries(
+    sender, instance, created, raw, **kwargs
+):
+    # Summaries show the show time and play of each performance only.
+    if not created and not raw and getattr(
+        instance, "_previous_show", None
+    ) != (instance.show_time, instance.play_id):
+        performance_id = instance.pk
+        transaction.on_commit(
+            lambda: ReservationSummary.objects.update_performances(
+                [performance_id]
+            )
+        )
+
+
+@receiver(post_save, sender=Play)
+def index_play(sender, instance, created, raw, **kwargs):
+    if not raw:
+        search.index_plays([instance], replace=not created)
+
+
+@receiver(pre_delete, sender=Play)
+def unindex_play(sender, instance, **kwargs):
+    search.unindex_plays([instance])
+
+
+@receiver(pre_save, sender=Play)
+def remember_play_title(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_title = (
+        Play.objects.filter(pk=instance.pk)
+        .values_list("title", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Play)
+def refresh_play_reservation_summaries(
+    sender, instance, created, raw, **kwargs
+):
+    # Rewriting every summary of a popular play takes seconds, so it is
+    # left out of the transaction saving the play.
+    if not created and not raw and getattr(
+        instance, "_previous_title", None
+    ) != instance.title:
+        play_id = instance.pk
+        transaction.on_commit(
+            lambda: ReservationSummary.objects.update_performances(
+                Performance.objects.filter(play_id=play_id)
+            )
+        )
+
+
+@receiver(pre_save, sender=TheatreHall)
+def remember_hall_size(sender, instance, raw, **kwargs):
+    if raw or instance._state.adding:
+        return
+    instance._previous_size = (
+        TheatreHall.objects.filter(pk=instance.pk)
+        .values_list("rows", "seats_in_row")
+        .first()
+    )
+
+
+@receiver(post_save, sender=TheatreHall)
+def rebuild_hall_seat_maps(sender, instance, created, raw, **kwargs):
+    # Seats are found in the bitmaps by their position in the hall.
+    previous_size = getattr(instance, "_previous_size", None)
+    if created or raw or previous_size in (
+        None,
+        (instance.rows, instance.seats_in_row),
+    ):
+        return
+    for performance_id in Performance.objects.filter(
+        theatre_hall=instance
+    ).values_list("id", flat=True):
+        Performance.rebuild_seat_map(
+            performance_id, previous_size=previous_size
+        )
+
+
+@receiver(seats_changed, sender=Performance)
+def bump_seat_versions(sender, performance, **kwargs):
+    caching.bump_on_commit(
+        f"performances:{performance.id}",
+        caching.performance_day(performance.show_time),
+        "performances:tickets",
+    )
+
+
+@receiver(seats_changed, sender=Performance)
+def publish_seat_changes(sender, performance, **seats):
+    seats = {
+        change: list(seats.get(change, ()))
+        for change in ("taken", "released", "held", "unheld")
+    }
+    if any(seats.values()):
+        transaction.on_commit(
+            lambda: events.publish_seats(performance.id, **seats)
+        )
+
+
+@receiver(seats_changed, sender=Performance)
+def count_sold_tickets(sender, taken=(), **kwargs):
+    if taken:
+        sold = len(taken)
+        transaction.on_commit(lambda: metrics.TICKETS_SOLD.inc(sold))
+
+
+@receiver(post_save, sender=Reservation)
+def count_reservation(sender, created, raw, **kwargs):
+    if created and not raw:
+        transaction.on_commit(metrics.RESERVATIONS_CREATED.inc)
+
+
+@receiver(post_save, sender=Performance)
+@receiver(post_delete, sender=Performance)
+def bump_performance_catalogue_version(sender, **kwargs):
+    caching.bump_on_commit("performances")
+
+
+@receiver(post_save, sender=Play)
+@receiver(post_delete, sender=Play)
+def bump_play_versions(sender, instance, **kwargs):
+    caching.bump_on_commit("plays", f"plays:{instance.pk}", "performances")
+
+
+@receiver(post_save, sender=TheatreHall)
+@receiver(post_delete, sender=TheatreHall)
+def bump_theatre_hall_versions(sender, **kwargs):
+    caching.bump_on_commit("theatre_halls", "performances")
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def bump_genre_version(sender, **kwargs):
+    caching.bump_on_commit("genres")
+
+
+@receiver(post_save, sender=Actor)
+@receiver(post_delete, sender=Actor)
+def bump_actor_version(sender, **kwargs):
+    caching.bump_on_commit("actors")
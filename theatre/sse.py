@@ -0,0 +1,218 @@
+"""Server-sent events stream of the seat changes of a performance.
+
+``GET /api/theatre/performances/{id}/events/`` is answered by an ASGI
+middleware in front of Django instead of a view: Django 4.2 does not notice
+when the client of a streaming response goes away, while a stream has to
+stop as soon as ``http.disconnect`` arrives to free its hub listener.
+
+The stream starts with a ``snapshot`` event holding the taken and held seats
+and continues with ``seats`` events holding the seats ``taken``,
+``released``, ``held`` and ``unheld`` since; holds that expire are reaped
+and announced as ``unheld`` by the streams, whenever
+``SEAT_EVENTS_KEEPALIVE`` seconds pass without an event. A ``resync`` event
+means that events were dropped and the snapshot should be reloaded.
+Browsers cannot set headers on an ``EventSource``, so the access token may
+also be passed as ``?token=``.
+"""
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signals
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from theatre import events, holds
+from theatre.models import Performance
+from theatre_service.db.pool import close_pools
+
+EVENTS_PATH = re.compile(r"^/api/theatre/performances/(?P<pk>[0-9]+)/events/$")
+
+
+def _authenticate(scope):
+    authentication = JWTAuthentication()
+    headers = dict(scope["headers"])
+    token = parse_qs(scope["query_string"].decode()).get("token")
+    try:
+        if b"authorization" in headers:
+            raw_token = authentication.get_raw_token(headers[b"authorization"])
+        elif token:
+            raw_token = token[0].encode()
+        else:
+            return None
+        if raw_token is None:
+            return None
+        user = authentication.get_user(
+            authentication.get_validated_token(raw_token)
+        )
+    except AuthenticationFailed:
+        return None
+    return user if user.is_active else None
+
+
+def _seats(seats):
+    return [{"row": row, "seat": seat} for row, seat in seats]
+
+
+@sync_to_async
+def _open_stream(scope, performance_id):
+    """Authenticate the request and build the snapshot event, or return
+    the status and message of an error response."""
+    # Treated as a request of its own, so database connections are handled
+    # as they are for any other request.
+    signals.request_started.send(sender=SeatEventsMiddleware, scope=scope)
+    try:
+        if _authenticate(scope) is None:
+            return 401, "Authentication credentials were not provided."
+        performance = (
+            Performance.objects.select_related("theatre_hall")
+            .filter(pk=performance_id)
+            .first()
+        )
+        if performance is None:
+            return 404, "No Performance matches the given query."
+        return 200, json.dumps(
+            {
+                "type": "snapshot",
+                "performance": performance.id,
+                "taken": _seats(performance.seat_map.taken()),
+                "held": _seats(holds.held_seats(performance.id)),
+            }
+        )
+    finally:
+        signals.request_finished.send(sender=SeatEventsMiddleware)
+
+
+@sync_to_async
+def _reap_expired_holds(scope, performance_id):
+    """Announce the seats of holds that have expired, which nothing else
+    does while the seats are only being watched."""
+    signals.request_started.send(sender=SeatEventsMiddleware, scope=scope)
+    try:
+        holds.reap_expired([performance_id])
+    finally:
+        signals.request_finished.send(sender=SeatEventsMiddleware)
+
+
+def _event(message):
+    return f"event: {json.loads(message)['type']}\ndata: {message}\n\n"
+
+
+class SeatEventsMiddleware:
+    """ASGI middleware serving seat event streams and the lifespan protocol,
+    and passing everything else on to ``app``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["method"] == "GET":
+            match = EVENTS_PATH.match(scope["path"])
+            if match:
+                return await self.stream(
+                    scope, receive, send, int(match.group("pk"))
+                )
+        return await self.app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await events.close_hub()
+                await sync_to_async(close_pools)()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def stream(self, scope, receive, send, performance_id):
+        channel = events.channel_name(performance_id)
+        try:
+            async with events.get_hub().listen(channel) as queue:
+                # Subscribed before the snapshot is read, so no change made
+                # in between can be missed.
+                status, body = await _open_stream(scope, performance_id)
+                if status != 200:
+                    return await self.error(send, status, body)
+                await self.send_events(
+                    scope, receive, send, performance_id, body, queue
+                )
+        except asyncio.TimeoutError:
+            # The broker did not confirm the subscription; only listen
+            # raises it, before anything has been sent.
+            return await self.error(
+                send, 503, "Live seat updates are unavailable."
+            )
+
+    async def send_events(
+        self, scope, receive, send, performance_id, snapshot, queue
+    ):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        await self.send_chunk(send, _event(snapshot))
+
+        disconnected = asyncio.ensure_future(self.disconnect(receive))
+        try:
+            while True:
+                message = asyncio.ensure_future(queue.get())
+                await asyncio.wait(
+                    {message, disconnected},
+                    timeout=settings.SEAT_EVENTS_KEEPALIVE,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnected.done():
+                    message.cancel()
+                    return
+                if message.done():
+                    await self.send_chunk(send, _event(message.result()))
+                else:
+                    message.cancel()
+                    await _reap_expired_holds(scope, performance_id)
+                    await self.send_chunk(send, ": keepalive\n\n")
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def send_chunk(send, chunk):
+        await send(
+            {
+                "type": "http.response.body",
+                "body": chunk.encode(),
+                "more_body": True,
+            }
+        )
+
+    @staticmethod
+    async def error(send, status, detail):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(b"content-type", b"application/json")],
+            }
+        )
+        await send(
+            {
+                "type": "http.response.body",
+                "body": json.dumps({"detail": detail}).encode(),
+            }
+        )
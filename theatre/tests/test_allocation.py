@@ -0,0 +1,186 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import allocation, holds
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+from theatre.seat_map import SeatMap
+
+User = get_user_model()
+
+
+def allocate_url(performance_id):
+    return reverse("theatre:performance-allocate", args=[performance_id])
+
+
+class CandidateBlocksTest(TestCase):
+    def test_centre_of_middle_row_first(self):
+        seat_map = SeatMap(5, 9)
+
+        score, row, start = allocation.candidate_blocks(seat_map, 3)[0]
+
+        self.assertEqual((score, row, start), (0, 3, 4))
+
+    def test_taken_and_held_seats_split_runs(self):
+        seat_map = SeatMap(1, 9)
+        seat_map.take(1, 5)
+
+        candidates = allocation.candidate_blocks(seat_map, 3, [(1, 3)])
+
+        self.assertEqual(
+            [(row, start) for _, row, start in candidates], [(1, 6)]
+        )
+
+    def test_rows_limit_the_search(self):
+        seat_map = SeatMap(5, 9)
+
+        candidates = allocation.candidate_blocks(seat_map, 3, rows=[1, 5])
+
+        self.assertEqual(
+            [(row, start) for _, row, start in candidates], [(1, 4), (5, 4)]
+        )
+
+    def test_no_block_fits(self):
+        seat_map = SeatMap(2, 4)
+        seat_map.take(1, 2)
+        seat_map.take(2, 3)
+
+        self.assertEqual(allocation.candidate_blocks(seat_map, 3), [])
+
+
+class SeatAllocationApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+
+    def allocate(self, performance=None, **payload):
+        performance = performance or self.performance
+        return self.client.post(
+            allocate_url(performance.id), payload, format="json"
+        )
+
+    @staticmethod
+    def seats(res):
+        return [(seat["row"], seat["seat"]) for seat in res.data["seats"]]
+
+    def test_allocate_best_block(self):
+        res = self.allocate(party_size=4)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.seats(res), [(5, 9), (5, 10), (5, 11), (5, 12)])
+        self.assertIsNone(res.data["hold"])
+        self.assertEqual(holds.held_seats(self.performance.id), [])
+
+    def test_sold_seats_are_skipped(self):
+        Ticket.objects.create(
+            row=5,
+            seat=10,
+            performance=self.performance,
+            reservation=Reservation.objects.create(user=self.user),
+        )
+
+        res = self.allocate(party_size=4)
+
+        self.assertEqual(self.seats(res), [(6, 9), (6, 10), (6, 11), (6, 12)])
+
+    def test_row_preference(self):
+        res = self.allocate(party_size=2, rows=[1, 2])
+
+        self.assertEqual(self.seats(res), [(2, 10), (2, 11)])
+
+    def test_allocate_and_hold(self):
+        res = self.allocate(party_size=3, hold=True, minutes=5)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        hold = holds.get_hold(res.data["hold"]["id"])
+        self.assertEqual(hold["user"], self.user.id)
+        self.assertEqual(hold["seats"], self.seats(res))
+
+        res = self.allocate(party_size=3, hold=True)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.seats(res), [(6, 9), (6, 10), (6, 11)])
+
+    def test_lost_race_falls_back_to_next_block(self):
+        cache.add(
+            holds._seat_key(self.performance.id, 5, 10), "concurrent", 60
+        )
+
+        res = self.allocate(party_size=4, hold=True)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.seats(res), [(6, 9), (6, 10), (6, 11), (6, 12)])
+
+    def test_no_block_available(self):
+        reservation = Reservation.objects.create(user=self.user)
+        Ticket.objects.bulk_reserve(
+            Ticket(
+                row=1,
+                seat=seat,
+                performance=self.performance,
+                reservation=reservation,
+            )
+            for seat in range(2, 21, 2)
+        )
+
+        res = self.allocate(party_size=2, rows=[1])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("party_size", res.data)
+
+    def test_invalid_request(self):
+        for payload in (
+            {},
+            {"party_size": 0},
+            {"party_size": 21},
+            {"party_size": 2, "rows": [11]},
+        ):
+            with self.subTest(payload=payload):
+                res = self.allocate(**payload)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_authentication_required(self):
+        self.client.force_authenticate(None)
+
+        res = self.allocate(party_size=2)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_single_query_on_large_hall(self):
+        hall = TheatreHall.objects.create(
+            name="Arena", rows=100, seats_in_row=100
+        )
+        performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=hall,
+        )
+
+        with self.assertNumQueries(1):
+            res = self.allocate(performance, party_size=6)
+
+        self.assertEqual(res.data["seats"][0], {"row": 50, "seat": 48})
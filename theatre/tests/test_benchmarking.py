@@ -0,0 +1,106 @@
+import random
+
+from django.test import SimpleTestCase, TestCase
+
+from theatre import benchmarking
+from theatre.management.commands.benchmark_reservations import SeatPicker
+
+
+class Stub:
+    def __init__(self, id):
+        self.id = id
+
+
+class BenchmarkingHelpersTest(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(benchmarking.percentile(values, 50), 50)
+        self.assertEqual(benchmarking.percentile(values, 99), 99)
+        self.assertEqual(benchmarking.percentile([5], 95), 5)
+        self.assertIsNone(benchmarking.percentile([], 50))
+
+    def test_summarize(self):
+        samples = [
+            benchmarking.Sample(0.010, 2, 201),
+            benchmarking.Sample(0.020, 3, 201),
+            benchmarking.Sample(0.030, 4, 400, conflict=True),
+            benchmarking.Sample(0.040, 5, 400, conflict=True),
+        ]
+
+        summary = benchmarking.summarize(samples, elapsed=2)
+
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["throughput_rps"], 2)
+        self.assertEqual(summary["p50_ms"], 20)
+        self.assertEqual(summary["p99_ms"], 40)
+        self.assertEqual(summary["queries_per_request"], 3.5)
+        self.assertEqual(summary["max_queries"], 5)
+        self.assertEqual(summary["conflict_rate"], 0.5)
+        self.assertEqual(summary["statuses"], {"201": 2, "400": 2})
+
+    def test_run_concurrently(self):
+        def request(state):
+            state["calls"] = state.get("calls", 0) + 1
+            return 200, state["calls"] % 2 == 0
+
+        summary = benchmarking.run_concurrently(
+            request, requests=20, concurrency=1
+        )
+
+        self.assertEqual(summary["requests"], 20)
+        self.assertEqual(summary["statuses"], {"200": 20})
+        self.assertEqual(summary["conflict_rate"], 0.5)
+        self.assertEqual(summary["queries_per_request"], 0)
+
+    def test_compare_flags_regressions_beyond_threshold(self):
+        baseline = {
+            "scenarios": {
+                "list": {"p95_ms": 100, "throughput_rps": 50},
+                "gone": {"p95_ms": 100},
+            }
+        }
+        results = {
+            "scenarios": {
+                "list": {"p95_ms": 105, "throughput_rps": 40},
+                "new": {"p95_ms": 10},
+            }
+        }
+
+        rows = benchmarking.compare(results, baseline, threshold=10)
+
+        self.assertEqual(
+            rows,
+            [
+                ("list", "p95_ms", 100, 105, 5.0, False),
+                ("list", "throughput_rps", 50, 40, -20.0, True),
+            ],
+        )
+
+
+class SeatPickerTest(SimpleTestCase):
+    def test_blocks_are_unique_without_collisions(self):
+        picker = SeatPicker(
+            [Stub(1), Stub(2)], rows=2, seats_in_row=5, party_size=2, rate=0
+        )
+        rng = random.Random(0)
+
+        blocks = [
+            [(t["performance"], t["row"], t["seat"]) for t in picker.pick(rng)]
+            for _ in range(8)
+        ]
+
+        self.assertEqual(blocks[0], [(1, 1, 1), (1, 1, 2)])
+        self.assertEqual(blocks[1], [(2, 1, 1), (2, 1, 2)])
+        seats = [seat for block in blocks for seat in block]
+        self.assertEqual(len(seats), len(set(seats)))
+
+    def test_collisions_reuse_issued_blocks(self):
+        picker = SeatPicker(
+            [Stub(1)], rows=10, seats_in_row=10, party_size=2, rate=1
+        )
+        rng = random.Random(0)
+
+        first = picker.pick(rng)
+
+        self.assertEqual(picker.pick(rng), first)
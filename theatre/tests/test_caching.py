@@ -0,0 +1,330 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import caching, holds
+from theatre.models import (
+    Actor,
+    Genre,
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+
+PERFORMANCE_URL = reverse("theatre:performance-list")
+CACHE_STATS_URL = reverse("theatre:performance-cache-stats")
+
+User = get_user_model()
+
+
+def detail_url(performance_id):
+    return reverse("theatre:performance-detail", args=[performance_id])
+
+
+class VersionStampTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_get_versions_creates_missing_stamps(self):
+        first = caching.get_versions("a", "b")
+        self.assertEqual(set(first), {"a", "b"})
+        self.assertEqual(caching.get_versions("a", "b"), first)
+
+    def test_bump_changes_stamp(self):
+        before = caching.get_versions("a", "b")
+        caching.bump("a")
+        after = caching.get_versions("a", "b")
+        self.assertNotEqual(before["a"], after["a"])
+        self.assertEqual(before["b"], after["b"])
+
+
+class PerformanceResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+        self.other_day_performance = Performance.objects.create(
+            show_time="2024-08-02T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+        self.reservation = Reservation.objects.create(user=self.user)
+
+    def sell(self, performance, row, seat):
+        return Ticket.objects.create(
+            row=row,
+            seat=seat,
+            performance=performance,
+            reservation=self.reservation,
+        )
+
+    def test_list_is_served_from_cache(self):
+        res = self.client.get(PERFORMANCE_URL, {"play": self.play.id})
+        self.assertEqual(res["X-Cache"], "MISS")
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(PERFORMANCE_URL, {"play": self.play.id})
+
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(cached.json(), res.json())
+
+    def test_query_params_are_normalized(self):
+        self.client.get(PERFORMANCE_URL + "?play=1&date=2024-08-01")
+        res = self.client.get(PERFORMANCE_URL + "?date=2024-08-01&play=1")
+        self.assertEqual(res["X-Cache"], "HIT")
+
+        res = self.client.get(PERFORMANCE_URL + "?date=2024-08-02&play=1")
+        self.assertEqual(res["X-Cache"], "MISS")
+
+    def test_ticket_write_invalidates_list_and_detail(self):
+        self.client.get(PERFORMANCE_URL, {"page_size": 10})
+        self.client.get(detail_url(self.performance.id))
+
+        self.sell(self.performance, 1, 1)
+
+        res = self.client.get(PERFORMANCE_URL, {"page_size": 10})
+        self.assertEqual(res["X-Cache"], "MISS")
+        tickets_available = {
+            performance["id"]: performance["tickets_available"]
+            for performance in res.data["results"]
+        }
+        self.assertEqual(tickets_available[self.performance.id], 199)
+
+        res = self.client.get(detail_url(self.performance.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["taken_places"], [{"row": 1, "seat": 1}])
+
+    def test_ticket_write_keeps_other_days_and_performances(self):
+        self.client.get(PERFORMANCE_URL, {"date": "2024-08-02"})
+        self.client.get(detail_url(self.other_day_performance.id))
+
+        self.sell(self.performance, 1, 1)
+
+        res = self.client.get(PERFORMANCE_URL, {"date": "2024-08-02"})
+        self.assertEqual(res["X-Cache"], "HIT")
+        res = self.client.get(detail_url(self.other_day_performance.id))
+        self.assertEqual(res["X-Cache"], "HIT")
+
+        res = self.client.get(PERFORMANCE_URL, {"date": "2024-08-01"})
+        self.assertEqual(res["X-Cache"], "MISS")
+
+    def test_ticket_delete_invalidates(self):
+        ticket = self.sell(self.performance, 1, 1)
+        self.client.get(detail_url(self.performance.id))
+
+        ticket.delete()
+
+        res = self.client.get(detail_url(self.performance.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["taken_places"], [])
+
+    def test_catalogue_writes_invalidate(self):
+        for change in (
+            lambda: Play.objects.get(pk=self.play.pk).save(),
+            lambda: TheatreHall.objects.get(pk=self.hall.pk).save(),
+            lambda: self.other_day_performance.save(),
+        ):
+            self.client.get(detail_url(self.performance.id))
+            change()
+            res = self.client.get(detail_url(self.performance.id))
+            self.assertEqual(res["X-Cache"], "MISS")
+
+    def test_seat_hold_invalidates(self):
+        self.client.get(detail_url(self.performance.id))
+
+        self.client.post(
+            reverse("theatre:hold-list"),
+            {
+                "performance": self.performance.id,
+                "seats": [{"row": 1, "seat": 1}],
+            },
+            format="json",
+        )
+
+        res = self.client.get(detail_url(self.performance.id))
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(res.data["held_places"], [{"row": 1, "seat": 1}])
+
+    def test_seat_hold_expiry_invalidates(self):
+        self.client.post(
+            reverse("theatre:hold-list"),
+            {
+                "performance": self.performance.id,
+                "seats": [{"row": 1, "seat": 1}],
+                "minutes": 1,
+            },
+            format="json",
+        )
+        detail = self.client.get(detail_url(self.performance.id))
+        self.assertEqual(detail.data["held_places"], [{"row": 1, "seat": 1}])
+        self.client.get(PERFORMANCE_URL)
+
+        with mock.patch("time.time", return_value=time.time() + 61):
+            res = self.client.get(
+                detail_url(self.performance.id),
+                HTTP_IF_NONE_MATCH=detail["ETag"],
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res["X-Cache"], "MISS")
+            self.assertEqual(res.data["held_places"], [])
+            self.assertNotEqual(res["ETag"], detail["ETag"])
+
+            res = self.client.get(PERFORMANCE_URL)
+            self.assertEqual(res["X-Cache"], "MISS")
+            self.assertEqual(res.data["results"][1]["tickets_available"], 200)
+
+    def test_seat_hold_expiry_invalidates_without_schedule(self):
+        self.client.post(
+            reverse("theatre:hold-list"),
+            {
+                "performance": self.performance.id,
+                "seats": [{"row": 1, "seat": 1}],
+                "minutes": 1,
+            },
+            format="json",
+        )
+        detail = self.client.get(detail_url(self.performance.id))
+        # As if the cache had evicted it.
+        cache.delete(holds.SCHEDULE_KEY)
+
+        with mock.patch("time.time", return_value=time.time() + 61):
+            res = self.client.get(
+                detail_url(self.performance.id),
+                HTTP_IF_NONE_MATCH=detail["ETag"],
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["held_places"], [])
+
+    def test_cache_stats(self):
+        self.client.get(PERFORMANCE_URL)
+        self.client.get(PERFORMANCE_URL)
+        self.client.get(PERFORMANCE_URL)
+
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        res = self.client.get(CACHE_STATS_URL)
+        self.assertEqual(res.data, {"hits": 2, "misses": 1})
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.genre = Genre.objects.create(name="Drama")
+        self.actor = Actor.objects.create(first_name="John", last_name="Doe")
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+
+    def assert_not_modified(self, url):
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", res)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(cached["ETag"], res["ETag"])
+        self.assertEqual(cached.content, b"")
+
+        cached = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=res["Last-Modified"]
+        )
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+        return res["ETag"]
+
+    def test_catalogue_endpoints_support_conditional_get(self):
+        for url in (
+            reverse("theatre:genre-list"),
+            reverse("theatre:actor-list"),
+            reverse("theatre:theatrehall-list"),
+            reverse("theatre:play-list"),
+            reverse("theatre:play-detail", args=[self.play.id]),
+            PERFORMANCE_URL,
+            detail_url(self.performance.id),
+        ):
+            with self.subTest(url=url):
+                self.assert_not_modified(url)
+
+    def test_etag_changes_with_resource(self):
+        for url, change in (
+            (reverse("theatre:genre-list"), lambda: self.genre.save()),
+            (reverse("theatre:actor-list"), lambda: self.actor.save()),
+            (reverse("theatre:theatrehall-list"), lambda: self.hall.save()),
+            (
+                reverse("theatre:play-detail", args=[self.play.id]),
+                lambda: self.play.save(),
+            ),
+            (
+                detail_url(self.performance.id),
+                lambda: Ticket.objects.create(
+                    row=1,
+                    seat=1,
+                    performance=self.performance,
+                    reservation=Reservation.objects.create(user=self.user),
+                ),
+            ),
+        ):
+            with self.subTest(url=url):
+                etag = self.client.get(url)["ETag"]
+                change()
+                res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertNotEqual(res["ETag"], etag)
+
+    def test_etag_depends_on_query_params(self):
+        etag = self.client.get(reverse("theatre:play-list"))["ETag"]
+
+        res = self.client.get(
+            reverse("theatre:play-list"),
+            {"title": "Ham"},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_missing_object_has_no_etag(self):
+        res = self.client.get(detail_url(999))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn("ETag", res)
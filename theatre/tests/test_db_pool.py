@@ -0,0 +1,195 @@
+import threading
+
+from django.db import connections
+from django.test import SimpleTestCase
+
+from theatre_service.db import checks, pool
+from theatre_service.db.postgresql.base import DatabaseWrapper
+
+
+class FakeConnection:
+    def __init__(self, broken=False):
+        self.closed = False
+        self.broken = broken
+        self.rollbacks = 0
+        self.queries = 0
+
+    def rollback(self):
+        if self.broken:
+            raise RuntimeError("server closed the connection")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def execute(self, sql):
+                if connection.broken:
+                    raise RuntimeError("server closed the connection")
+                connection.queries += 1
+
+        return Cursor()
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def test_connections_are_reused(self):
+        connection_pool = pool.ConnectionPool(max_size=2)
+        made = []
+
+        def connect():
+            made.append(FakeConnection())
+            return made[-1]
+
+        first = connection_pool.acquire(connect)
+        connection_pool.release(first)
+        second = connection_pool.acquire(connect)
+
+        self.assertIs(second, first)
+        self.assertEqual(len(made), 1)
+        self.assertEqual(first.rollbacks, 1)
+        self.assertEqual(
+            connection_pool.stats(),
+            {"max_size": 2, "size": 1, "idle": 0, "in_use": 1},
+        )
+
+    def test_waits_for_a_free_connection(self):
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=5)
+        first = connection_pool.acquire(FakeConnection)
+        acquired = []
+
+        waiter = threading.Thread(
+            target=lambda: acquired.append(
+                connection_pool.acquire(FakeConnection)
+            )
+        )
+        waiter.start()
+        connection_pool.release(first)
+        waiter.join(5)
+
+        self.assertEqual(acquired, [first])
+
+    def test_times_out_when_exhausted(self):
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=0.01)
+        connection_pool.acquire(FakeConnection)
+
+        with self.assertRaises(pool.PoolTimeout):
+            connection_pool.acquire(FakeConnection)
+
+    def test_broken_connections_are_discarded(self):
+        connection_pool = pool.ConnectionPool(max_size=1)
+        broken = connection_pool.acquire(lambda: FakeConnection(broken=True))
+
+        connection_pool.release(broken)
+
+        self.assertTrue(broken.closed)
+        self.assertIsNot(connection_pool.acquire(FakeConnection), broken)
+
+    def test_idle_connections_are_checked(self):
+        connection_pool = pool.ConnectionPool(max_size=2, check_after=0)
+        stale = connection_pool.acquire(FakeConnection)
+        connection_pool.release(stale)
+        stale.broken = True
+
+        fresh = connection_pool.acquire(FakeConnection)
+
+        self.assertIsNot(fresh, stale)
+        self.assertTrue(stale.closed)
+        self.assertEqual(connection_pool.stats()["size"], 1)
+
+    def test_failed_connect_frees_its_slot(self):
+        connection_pool = pool.ConnectionPool(max_size=1, timeout=0.01)
+
+        def connect():
+            raise RuntimeError("could not connect")
+
+        with self.assertRaises(RuntimeError):
+            connection_pool.acquire(connect)
+        self.assertIsInstance(
+            connection_pool.acquire(FakeConnection), FakeConnection
+        )
+
+    def test_close(self):
+        connection_pool = pool.ConnectionPool(max_size=2)
+        idle = connection_pool.acquire(FakeConnection)
+        connection_pool.release(idle)
+
+        connection_pool.close()
+
+        self.assertTrue(idle.closed)
+        self.assertEqual(connection_pool.stats()["size"], 0)
+
+
+class PooledBackendTest(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(pool.close_pools)
+        self.connection = DatabaseWrapper(
+            {
+                **connections["default"].settings_dict,
+                "ENGINE": checks.POOLED_ENGINE,
+                "NAME": "theatre",
+                "OPTIONS": {"pool": {"max_size": 2}},
+            },
+            alias="pooled",
+        )
+
+    def test_pool_options_are_not_connection_parameters(self):
+        params = self.connection.get_connection_params()
+
+        self.assertEqual(params["dbname"], "theatre")
+        self.assertNotIn("pool", params)
+
+    def test_connections_come_from_and_return_to_the_pool(self):
+        pooled = FakeConnection()
+        self.connection.pool.release(pooled)
+
+        self.connection.connection = self.connection.get_new_connection({})
+        self.assertIs(self.connection.connection, pooled)
+
+        self.connection._close()
+        self.assertFalse(pooled.closed)
+        self.assertEqual(self.connection.pool.stats()["idle"], 1)
+
+
+class ConnectionPoolCheckTest(SimpleTestCase):
+    def database(self, **settings):
+        return {
+            "default": {
+                "ENGINE": checks.POOLED_ENGINE,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": {"pool": {"max_size": 5}},
+                **settings,
+            }
+        }
+
+    def check_ids(self, databases):
+        return [message.id for message in checks.pool_messages(databases)]
+
+    def test_reports_pool(self):
+        [message] = checks.pool_messages(self.database())
+
+        self.assertEqual(message.id, "theatre_service.I001")
+        self.assertIn("up to 5 connections", message.msg)
+
+    def test_warns_about_misconfiguration(self):
+        self.assertEqual(
+            self.check_ids(self.database(CONN_MAX_AGE=60)),
+            ["theatre_service.W002", "theatre_service.I001"],
+        )
+        self.assertEqual(
+            self.check_ids(
+                self.database(ENGINE="django.db.backends.postgresql")
+            ),
+            ["theatre_service.W001"],
+        )
+
+    def test_silent_without_pools(self):
+        self.assertEqual(checks.check_connection_pools(None), [])
@@ -0,0 +1,196 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre.models import (
+    Genre,
+    Performance,
+    Play,
+    TheatreHall,
+    Ticket,
+)
+from theatre_service import db_router
+
+GENRE_URL = reverse("theatre:genre-list")
+PERFORMANCE_URL = reverse("theatre:performance-list")
+RESERVATION_URL = reverse("theatre:reservation-list")
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTest(TestCase):
+    """The replica is a separate, empty database, so whatever a response
+    contains tells which database it was read from."""
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        Genre.objects.create(name="Primary")
+        Genre.objects.using("replica").create(name="Replica")
+
+    def genre_names(self):
+        res = self.client.get(GENRE_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [genre["name"] for genre in res.data["results"]]
+
+    def test_catalogue_reads_go_to_replica(self):
+        self.assertEqual(self.genre_names(), ["Replica"])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(self.genre_names(), ["Primary"])
+
+    def test_writes_go_to_primary(self):
+        self.client.force_authenticate(
+            User.objects.create_user(
+                email="admin@test.com", password="testpass", is_staff=True
+            )
+        )
+
+        res = self.client.post(GENRE_URL, {"name": "Drama"})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Genre.objects.filter(name="Drama").exists())
+        self.assertFalse(
+            Genre.objects.using("replica").filter(name="Drama").exists()
+        )
+
+    def test_routing_ends_with_the_request(self):
+        self.genre_names()
+
+        self.assertEqual(db_router.read_database(), db_router.PRIMARY)
+        self.assertEqual(
+            sorted(Genre.objects.values_list("name", flat=True)),
+            ["Primary"],
+        )
+
+    def test_writer_is_pinned_to_primary(self):
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        play = Play.objects.create(title="Hamlet", description="Tragedy")
+        performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z", play=play, theatre_hall=hall
+        )
+        other = APIClient()
+        other.force_authenticate(
+            User.objects.create_user(email="other@test.com", password="pass")
+        )
+
+        self.assertEqual(self.client.get(PERFORMANCE_URL).data["results"], [])
+        res = self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {"row": 1, "seat": 1, "performance": performance.id}
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        [listed] = self.client.get(PERFORMANCE_URL).data["results"]
+        self.assertEqual(listed["tickets_available"], 199)
+        self.assertEqual(self.genre_names(), ["Primary"])
+        other_genres = other.get(GENRE_URL).data["results"]
+        self.assertEqual(
+            [genre["name"] for genre in other_genres], ["Replica"]
+        )
+
+    def test_replica_responses_are_cached_and_validated(self):
+        for url in (GENRE_URL, PERFORMANCE_URL):
+            with self.subTest(url=url):
+                res = self.client.get(url)
+                self.assertIn("ETag", res)
+                self.assertNotIn("Last-Modified", res)
+
+                with CaptureQueriesContext(connections["replica"]) as replica:
+                    revalidated = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=res["ETag"]
+                    )
+                self.assertEqual(
+                    revalidated.status_code, status.HTTP_304_NOT_MODIFIED
+                )
+                self.assertEqual(len(replica), 0)
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            res = self.client.get(PERFORMANCE_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(len(replica), 0)
+
+    def test_replica_responses_expire_with_the_replica_window(self):
+        with mock.patch(
+            "theatre.caching._replica_window", return_value=("replica", 1)
+        ):
+            res = self.client.get(PERFORMANCE_URL)
+        with mock.patch(
+            "theatre.caching._replica_window", return_value=("replica", 2)
+        ):
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                revalidated = self.client.get(
+                    PERFORMANCE_URL, HTTP_IF_NONE_MATCH=res["ETag"]
+                )
+
+        self.assertEqual(revalidated.status_code, status.HTTP_200_OK)
+        self.assertEqual(revalidated["X-Cache"], "MISS")
+        self.assertNotEqual(revalidated["ETag"], res["ETag"])
+        self.assertGreater(len(replica), 0)
+
+    def test_primary_pages_are_served_to_replica_readers(self):
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        play = Play.objects.create(title="Hamlet", description="Tragedy")
+        Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z", play=play, theatre_hall=hall
+        )
+        other = APIClient()
+        other.force_authenticate(
+            User.objects.create_user(email="other@test.com", password="pass")
+        )
+        db_router.pin_to_primary(self.user)
+
+        self.assertEqual(other.get(PERFORMANCE_URL).data["results"], [])
+        res = self.client.get(PERFORMANCE_URL)
+        self.assertEqual(res["X-Cache"], "MISS")
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertIn("Last-Modified", res)
+
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            res = other.get(PERFORMANCE_URL)
+        self.assertEqual(res["X-Cache"], "HIT")
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(len(replica), 0)
+
+    @override_settings(DATABASE_PRIMARY_PIN_SECONDS=0)
+    def test_pin_expires(self):
+        db_router.pin_to_primary(self.user)
+
+        self.assertFalse(db_router.is_pinned(self.user))
+        self.assertEqual(self.genre_names(), ["Replica"])
+
+    def test_seat_conflicts_are_checked_on_primary(self):
+        with db_router.reading_from("replica"):
+            with CaptureQueriesContext(
+                connections["default"]
+            ) as primary, CaptureQueriesContext(
+                connections["replica"]
+            ) as replica:
+                Ticket.objects.taken_of([(1, 1, 1)])
+
+        self.assertEqual(len(primary), 1)
+        self.assertEqual(len(replica), 0)
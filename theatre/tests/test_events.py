@@ -0,0 +1,382 @@
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core import signals
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from theatre import events, holds
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+from theatre.sse import SeatEventsMiddleware
+
+User = get_user_model()
+
+
+class SlowBroker(events.InMemoryBroker):
+    """Confirms subscriptions a while after they are asked for, as a remote
+    broker does."""
+
+    def __init__(self, delay):
+        super().__init__()
+        self.delay = delay
+
+    async def subscribe(self, channel, subscribed):
+        await asyncio.sleep(self.delay)
+        async for message in super().subscribe(channel, subscribed):
+            yield message
+
+
+class HubTest(TestCase):
+    async def test_listeners_share_one_subscription(self):
+        broker = events.InMemoryBroker()
+        hub = events.Hub(broker)
+
+        async with hub.listen("a") as first, hub.listen("a") as second:
+            async with hub.listen("b"):
+                self.assertEqual(hub.subscriptions, 2)
+            self.assertEqual(hub.subscriptions, 1)
+
+            broker.publish("a", "message")
+
+            self.assertEqual(await asyncio.wait_for(first.get(), 1), "message")
+            self.assertEqual(await asyncio.wait_for(second.get(), 1), "message")
+
+        self.assertEqual(hub.subscriptions, 0)
+        await hub.close()
+
+    async def test_listen_waits_for_the_subscription(self):
+        broker = SlowBroker(0.05)
+        hub = events.Hub(broker)
+
+        async with hub.listen("a") as queue:
+            broker.publish("a", "message")
+
+            self.assertEqual(await asyncio.wait_for(queue.get(), 1), "message")
+
+        await hub.close()
+
+    async def test_unconfirmed_subscription_times_out(self):
+        hub = events.Hub(SlowBroker(1))
+
+        with patch.object(events, "SUBSCRIBE_TIMEOUT", 0.01):
+            with self.assertRaises(asyncio.TimeoutError):
+                async with hub.listen("a"):
+                    pass
+
+        self.assertEqual(hub.subscriptions, 0)
+        await hub.close()
+
+    async def test_slow_listener_is_told_to_resync(self):
+        broker = events.InMemoryBroker()
+        hub = events.Hub(broker, queue_size=2)
+
+        async with hub.listen("a") as queue:
+            for message in ("1", "2", "3"):
+                broker.publish("a", message)
+            await asyncio.sleep(0.01)
+
+            self.assertEqual(queue.get_nowait(), events.RESYNC)
+            self.assertTrue(queue.empty())
+
+        await hub.close()
+
+
+class SeatEventsTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+        self.reservation = Reservation.objects.create(user=self.user)
+
+    def sell(self, row, seat):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Ticket.objects.create(
+                row=row,
+                seat=seat,
+                performance=self.performance,
+                reservation=self.reservation,
+            )
+
+
+class SeatChangePublishingTest(SeatEventsTestMixin, TestCase):
+    def test_ticket_changes_are_published_on_commit(self):
+        with patch("theatre.events.publish_seats") as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                ticket = Ticket.objects.create(
+                    row=1,
+                    seat=2,
+                    performance=self.performance,
+                    reservation=self.reservation,
+                )
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+            publish.assert_called_once_with(
+                self.performance.id,
+                taken=[(1, 2)],
+                released=[],
+                held=[],
+                unheld=[],
+            )
+
+            publish.reset_mock()
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket.delete()
+            publish.assert_called_once_with(
+                self.performance.id,
+                taken=[],
+                released=[(1, 2)],
+                held=[],
+                unheld=[],
+            )
+
+    def test_unchanged_seats_are_not_published(self):
+        self.sell(1, 2)
+
+        with patch("theatre.events.publish_seats") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                Performance.mark_seats(self.performance.id, taken=[(1, 2)])
+
+        publish.assert_not_called()
+
+    def test_hold_changes_are_published(self):
+        with patch("theatre.events.publish_seats") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                hold = holds.hold_seats(
+                    self.user.id,
+                    Performance.objects.get(pk=self.performance.pk),
+                    [(2, 1), (2, 2)],
+                )
+                holds.release_hold(hold)
+
+        self.assertEqual(
+            [call.kwargs["held"] for call in publish.call_args_list],
+            [[(2, 1), (2, 2)], []],
+        )
+        self.assertEqual(
+            [call.kwargs["unheld"] for call in publish.call_args_list],
+            [[], [(2, 1), (2, 2)]],
+        )
+
+    def test_expired_holds_are_published(self):
+        holds.hold_seats(
+            self.user.id,
+            Performance.objects.get(pk=self.performance.pk),
+            [(2, 1), (2, 2)],
+            minutes=1,
+        )
+
+        with patch("theatre.events.publish_seats") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                holds.reap_expired()
+            publish.assert_not_called()
+
+            with patch("time.time", return_value=time.time() + 61):
+                with self.captureOnCommitCallbacks(execute=True):
+                    holds.reap_expired()
+
+        publish.assert_called_once_with(
+            self.performance.id,
+            taken=[],
+            released=[],
+            held=[],
+            unheld=[(2, 1), (2, 2)],
+        )
+
+
+class StreamClient:
+    """Drives an ASGI application the way a server would for one request."""
+
+    def __init__(self, app, path, query_string=b"", headers=()):
+        self.app = app
+        self.scope = {
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": query_string,
+            "headers": list(headers),
+        }
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+
+    async def start(self):
+        self.task = asyncio.ensure_future(
+            self.app(self.scope, self.incoming.get, self.outgoing.put)
+        )
+        return await asyncio.wait_for(self.outgoing.get(), 1)
+
+    async def receive_body(self):
+        message = await asyncio.wait_for(self.outgoing.get(), 1)
+        return message["body"].decode()
+
+    async def receive_event(self):
+        body = await self.receive_body()
+        event, data = body.strip().split("\n")
+        return event.removeprefix("event: "), json.loads(
+            data.removeprefix("data: ")
+        )
+
+    async def disconnect(self):
+        await self.incoming.put({"type": "http.disconnect"})
+        await asyncio.wait_for(self.task, 1)
+
+
+class SeatEventsStreamTest(SeatEventsTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # As the test client does, keep the stream from closing the
+        # connection that holds the test transaction.
+        for signal in (signals.request_started, signals.request_finished):
+            signal.disconnect(close_old_connections)
+            self.addCleanup(signal.connect, close_old_connections)
+
+        self.passed_on = []
+        self.app = SeatEventsMiddleware(self.fallback)
+        self.path = f"/api/theatre/performances/{self.performance.id}/events/"
+        token = AccessToken.for_user(self.user)
+        self.headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    async def fallback(self, scope, receive, send):
+        self.passed_on.append(scope["path"])
+
+    async def test_stream_seat_changes(self):
+        await sync_to_async(self.sell)(1, 1)
+        client = StreamClient(self.app, self.path, headers=self.headers)
+
+        start = await client.start()
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), start["headers"])
+        self.assertEqual(
+            await client.receive_event(),
+            (
+                "snapshot",
+                {
+                    "type": "snapshot",
+                    "performance": self.performance.id,
+                    "taken": [{"row": 1, "seat": 1}],
+                    "held": [],
+                },
+            ),
+        )
+
+        await sync_to_async(self.sell)(3, 4)
+        event, data = await client.receive_event()
+        self.assertEqual(event, "seats")
+        self.assertEqual(data["taken"], [{"row": 3, "seat": 4}])
+        self.assertEqual(data["released"], [])
+
+        await client.disconnect()
+        self.assertEqual(events.get_hub().subscriptions, 0)
+
+    async def test_viewers_share_one_subscription(self):
+        clients = [
+            StreamClient(self.app, self.path, headers=self.headers)
+            for _ in range(3)
+        ]
+        for client in clients:
+            await client.start()
+            await client.receive_event()
+        self.assertEqual(events.get_hub().subscriptions, 1)
+
+        await sync_to_async(self.sell)(1, 1)
+
+        for client in clients:
+            event, data = await client.receive_event()
+            self.assertEqual(data["taken"], [{"row": 1, "seat": 1}])
+            await client.disconnect()
+        self.assertEqual(events.get_hub().subscriptions, 0)
+
+    async def test_token_in_query_string(self):
+        client = StreamClient(
+            self.app,
+            self.path,
+            query_string=f"token={AccessToken.for_user(self.user)}".encode(),
+        )
+
+        start = await client.start()
+
+        self.assertEqual(start["status"], 200)
+        await client.disconnect()
+
+    @override_settings(SEAT_EVENTS_KEEPALIVE=0.01)
+    async def test_keepalive(self):
+        client = StreamClient(self.app, self.path, headers=self.headers)
+        await client.start()
+        await client.receive_event()
+
+        self.assertEqual(await client.receive_body(), ": keepalive\n\n")
+        await client.disconnect()
+
+    @override_settings(SEAT_EVENTS_KEEPALIVE=0.01)
+    async def test_expired_holds_are_reaped(self):
+        client = StreamClient(self.app, self.path, headers=self.headers)
+
+        with patch.object(holds, "reap_expired") as reap_expired:
+            await client.start()
+            await client.receive_event()
+            self.assertEqual(await client.receive_body(), ": keepalive\n\n")
+            reap_expired.assert_called_with([self.performance.id])
+            await client.disconnect()
+
+    async def test_broker_unavailable(self):
+        client = StreamClient(self.app, self.path, headers=self.headers)
+
+        with patch.object(events.get_hub(), "broker", SlowBroker(1)):
+            with patch.object(events, "SUBSCRIBE_TIMEOUT", 0.01):
+                start = await client.start()
+
+        self.assertEqual(start["status"], 503)
+        await client.task
+        self.assertEqual(events.get_hub().subscriptions, 0)
+
+    async def test_authentication_required(self):
+        for headers in ([], [(b"authorization", b"Bearer invalid")]):
+            with self.subTest(headers=headers):
+                client = StreamClient(self.app, self.path, headers=headers)
+                start = await client.start()
+                self.assertEqual(start["status"], 401)
+                await client.task
+
+    async def test_unknown_performance(self):
+        client = StreamClient(
+            self.app,
+            "/api/theatre/performances/999/events/",
+            headers=self.headers,
+        )
+
+        start = await client.start()
+
+        self.assertEqual(start["status"], 404)
+        await client.task
+        self.assertEqual(events.get_hub().subscriptions, 0)
+
+    async def test_other_requests_are_passed_on(self):
+        client = StreamClient(self.app, "/api/theatre/performances/")
+
+        await client.app(client.scope, client.incoming.get, client.outgoing.put)
+
+        self.assertEqual(self.passed_on, ["/api/theatre/performances/"])
@@ -0,0 +1,242 @@
+import csv
+import io
+import json
+import tracemalloc
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre.models import (
+    Performance,
+    Play,
+    Reservation,
+    TheatreHall,
+    Ticket,
+)
+
+TICKETS_URL = reverse("theatre:export-tickets")
+RESERVATIONS_URL = reverse("theatre:export-reservations")
+
+User = get_user_model()
+
+
+class ExportTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            email="admin@test.com", password="testpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=100, seats_in_row=100
+        )
+
+    def add_performance(self, title, show_time):
+        return Performance.objects.create(
+            show_time=show_time,
+            play=Play.objects.get_or_create(
+                title=title, defaults={"description": "A play"}
+            )[0],
+            theatre_hall=self.hall,
+        )
+
+    def add_tickets(self, performance, seats, tickets_per_reservation=1):
+        user = User.objects.create_user(email=f"{performance.id}@test.com")
+        reservations = Reservation.objects.bulk_create(
+            Reservation(user=user)
+            for _ in range(-(-len(seats) // tickets_per_reservation))
+        )
+        return Ticket.objects.bulk_create(
+            Ticket(
+                row=row,
+                seat=seat,
+                performance=performance,
+                reservation=reservations[index // tickets_per_reservation],
+            )
+            for index, (row, seat) in enumerate(seats)
+        )
+
+    def export(self, url, **params):
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, b"".join(res.streaming_content).decode()
+
+
+class ExportTest(ExportTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.hamlet = self.add_performance(
+            "Hamlet", datetime(2024, 8, 1, 19, tzinfo=timezone.utc)
+        )
+        self.macbeth = self.add_performance(
+            "Macbeth", datetime(2024, 8, 3, 19, tzinfo=timezone.utc)
+        )
+        self.add_tickets(
+            self.hamlet, [(1, 1), (1, 2), (1, 3)], tickets_per_reservation=2
+        )
+        self.add_tickets(self.macbeth, [(2, 1)])
+
+    def test_tickets_as_ndjson(self):
+        res, content = self.export(TICKETS_URL)
+
+        self.assertEqual(
+            res["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        self.assertEqual(
+            res["Content-Disposition"],
+            'attachment; filename="tickets.ndjson"',
+        )
+        rows = [json.loads(line) for line in content.splitlines()]
+        ticket = Ticket.objects.select_related("reservation__user").first()
+        reserved_at = ticket.reservation.created_at.isoformat()
+        self.assertEqual(
+            rows[0],
+            {
+                "id": ticket.id,
+                "reservation": ticket.reservation_id,
+                "reserved_at": reserved_at.replace("+00:00", "Z"),
+                "user": ticket.reservation.user_id,
+                "user_email": ticket.reservation.user.email,
+                "performance": self.hamlet.id,
+                "show_time": "2024-08-01T19:00:00Z",
+                "play": "Hamlet",
+                "theatre_hall": "Main Hall",
+                "row": 1,
+                "seat": 1,
+            },
+        )
+        self.assertEqual(
+            [row["id"] for row in rows],
+            list(Ticket.objects.order_by("id").values_list("id", flat=True)),
+        )
+
+    def test_tickets_as_csv(self):
+        res, content = self.export(TICKETS_URL, format="csv")
+
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]["show_time"], "2024-08-01T19:00:00Z")
+        self.assertEqual(rows[-1]["play"], "Macbeth")
+        self.assertEqual((rows[-1]["row"], rows[-1]["seat"]), ("2", "1"))
+
+    def test_csv_through_accept_header(self):
+        res = self.client.get(TICKETS_URL, HTTP_ACCEPT="text/csv")
+
+        self.assertEqual(res["Content-Type"], "text/csv; charset=utf-8")
+
+    def test_reservations(self):
+        _, content = self.export(RESERVATIONS_URL)
+
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["tickets"] for row in rows], [2, 1, 1])
+        self.assertEqual(
+            [row["id"] for row in rows],
+            list(
+                Reservation.objects.order_by("id").values_list("id", flat=True)
+            ),
+        )
+
+    def test_filters(self):
+        for params, expected in (
+            ({"performance": str(self.macbeth.id)}, [self.macbeth.id]),
+            ({"play": str(self.hamlet.play_id)}, [self.hamlet.id] * 3),
+            ({"date_from": "2024-08-02"}, [self.macbeth.id]),
+            ({"date_to": "2024-08-01"}, [self.hamlet.id] * 3),
+            (
+                {"date_from": "2024-08-02", "play": str(self.hamlet.play_id)},
+                [],
+            ),
+        ):
+            with self.subTest(params=params):
+                _, content = self.export(TICKETS_URL, **params)
+
+                self.assertEqual(
+                    [
+                        json.loads(line)["performance"]
+                        for line in content.splitlines()
+                    ],
+                    expected,
+                )
+
+        _, content = self.export(RESERVATIONS_URL, date_to="2024-08-01")
+        self.assertEqual(
+            [json.loads(line)["tickets"] for line in content.splitlines()],
+            [2, 1],
+        )
+
+    def test_invalid_filters(self):
+        for params in ({"play": "one"}, {"date_from": "01.08.2024"}):
+            with self.subTest(params=params):
+                res = self.client.get(TICKETS_URL, params)
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST
+                )
+                self.assertIn(next(iter(params)), json.loads(res.content))
+
+    def test_staff_only(self):
+        self.client.force_authenticate(
+            User.objects.create_user(email="user@test.com")
+        )
+
+        for url in (TICKETS_URL, RESERVATIONS_URL):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code,
+                    status.HTTP_403_FORBIDDEN,
+                )
+
+
+class ExportMemoryTest(ExportTestMixin, TestCase):
+    def peak_memory(self, url, **params):
+        """Peak memory allocated while streaming an export, and its rows."""
+        response = self.client.get(url, params)
+        rows = 0
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                rows += chunk.count(b"\n")
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, rows
+
+    def test_memory_does_not_grow_with_rows(self):
+        seats = [
+            (row, seat) for row in range(1, 101) for seat in range(1, 101)
+        ]
+        small = self.add_performance(
+            "Small", datetime(2024, 8, 1, 19, tzinfo=timezone.utc)
+        )
+        # At least a full chunk of rows for every export.
+        self.add_tickets(small, seats[:2000])
+        for index in range(4):
+            performance = self.add_performance(
+                "Large", datetime(2024, 8, 2 + index, 19, tzinfo=timezone.utc)
+            )
+            self.add_tickets(performance, seats, tickets_per_reservation=4)
+
+        for url, params, small_rows, large_rows in (
+            (TICKETS_URL, {"format": "ndjson"}, 2000, 40000),
+            (TICKETS_URL, {"format": "csv"}, 2001, 40001),
+            (RESERVATIONS_URL, {"format": "ndjson"}, 2000, 10000),
+        ):
+            with self.subTest(url=url, **params):
+                small_peak, rows = self.peak_memory(
+                    url, play=str(small.play_id), **params
+                )
+                self.assertEqual(rows, small_rows)
+                large_peak, rows = self.peak_memory(
+                    url, date_from="2024-08-02", **params
+                )
+                self.assertEqual(rows, large_rows)
+
+                # Five to twenty times the rows, about the same memory.
+                self.assertLess(large_peak, small_peak * 1.5)
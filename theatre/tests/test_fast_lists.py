@@ -0,0 +1,135 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import caching, holds
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+from theatre.views import PerformanceViewSet, ReservationViewSet
+
+PERFORMANCE_URL = reverse("theatre:performance-list")
+RESERVATION_URL = reverse("theatre:reservation-list")
+
+User = get_user_model()
+
+
+class FastListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        halls = [
+            TheatreHall.objects.create(name="Main Hall", rows=10, seats_in_row=20),
+            TheatreHall.objects.create(name="Studio «Б»", rows=3, seats_in_row=7),
+        ]
+        plays = [
+            Play.objects.create(title="Hamlet", description="Tragedy"),
+            Play.objects.create(title='"Oedipus" \\ Rex', description="Tragedy"),
+        ]
+        performances = [
+            Performance.objects.create(
+                show_time=show_time,
+                play=plays[index % 2],
+                theatre_hall=halls[index % 2],
+            )
+            for index, show_time in enumerate(
+                [
+                    "2024-08-01T19:00:00Z",
+                    "2024-08-02T19:30:15.250000Z",
+                    "2024-08-02T19:30:15.250000Z",
+                    "2024-08-03T09:00:00+02:00",
+                ]
+            )
+        ]
+        self.performances = list(
+            Performance.objects.filter(
+                pk__in=[performance.pk for performance in performances]
+            ).order_by("pk")
+        )
+        for index in range(3):
+            reservation = Reservation.objects.create(user=self.user)
+            Ticket.objects.bulk_reserve(
+                Ticket(
+                    row=row,
+                    seat=seat,
+                    performance=performance,
+                    reservation=reservation,
+                )
+                for performance in self.performances[index:index + 2]
+                for row, seat in [(2, index + 2), (1, index + 1)]
+            )
+        holds.hold_seats(self.user.id, self.performances[0], [(5, 5), (5, 6)])
+        holds.hold_seats(self.user.id, self.performances[1], [(3, 1)])
+
+    def get(self, viewset, url, **params):
+        """Return the bodies of a fast and a regular response."""
+        bodies = []
+        for values_serializer_class in (
+            viewset.values_serializer_class,
+            None,
+        ):
+            # Keep the second request from hitting the response cache.
+            caching.bump("performances")
+            with mock.patch.object(
+                viewset, "values_serializer_class", values_serializer_class
+            ):
+                res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            bodies.append(res.content)
+        return bodies
+
+    def test_performance_list_is_byte_identical(self):
+        fast, regular = self.get(PerformanceViewSet, PERFORMANCE_URL)
+
+        self.assertEqual(fast, regular)
+        self.assertIn(b'"tickets_available":196}]', fast)
+
+    @override_settings(TIME_ZONE="Europe/Kyiv")
+    def test_performance_list_in_other_time_zone(self):
+        fast, regular = self.get(
+            PerformanceViewSet, PERFORMANCE_URL, play=self.performances[1].play_id
+        )
+
+        self.assertEqual(fast, regular)
+        self.assertIn(b"+03:00", fast)
+
+    def test_performance_pages_are_byte_identical(self):
+        fast, regular = self.get(
+            PerformanceViewSet, PERFORMANCE_URL, page_size=2
+        )
+        self.assertEqual(fast, regular)
+
+        next_url = self.client.get(PERFORMANCE_URL, {"page_size": 2}).data[
+            "next"
+        ]
+        fast, regular = self.get(PerformanceViewSet, next_url)
+        self.assertEqual(fast, regular)
+
+    def test_reservation_list_is_byte_identical(self):
+        fast, regular = self.get(ReservationViewSet, RESERVATION_URL)
+
+        self.assertEqual(fast, regular)
+        self.assertIn(b'"play_title":"Hamlet"', fast)
+
+    def test_empty_lists(self):
+        Performance.objects.all().delete()
+
+        for viewset, url in [
+            (PerformanceViewSet, PERFORMANCE_URL),
+            (ReservationViewSet, RESERVATION_URL),
+        ]:
+            fast, regular = self.get(viewset, url)
+            self.assertEqual(fast, regular)
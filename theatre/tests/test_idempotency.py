@@ -0,0 +1,150 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import idempotency
+from theatre.models import Reservation, Ticket
+from theatre.tests.test_reservations import (
+    RESERVATION_URL,
+    ReservationApiTestMixin,
+)
+
+User = get_user_model()
+
+
+class IdempotentReservationTest(ReservationApiTestMixin, TestCase):
+    def reserve(self, seats, key="retry-1", client=None):
+        return (client or self.client).post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {
+                        "row": row,
+                        "seat": seat,
+                        "performance": self.performance.id,
+                    }
+                    for row, seat in seats
+                ]
+            },
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_first_response(self):
+        first = self.reserve([(1, 1), (1, 2)])
+
+        with self.assertNumQueries(0):
+            retry = self.reserve([(1, 1), (1, 2)])
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[idempotency.REPLAYED_HEADER], "true")
+        self.assertFalse(first.has_header(idempotency.REPLAYED_HEADER))
+        self.assertEqual(Reservation.objects.count(), 1)
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_rejections_are_replayed(self):
+        self.reserve([(1, 1)], key="other")
+
+        first = self.reserve([(1, 1)])
+        Ticket.objects.all().delete()
+        retry = self.reserve([(1, 1)])
+
+        self.assertEqual(first.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(retry.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(retry.json(), first.json())
+
+    def test_key_reused_for_different_request(self):
+        self.reserve([(1, 1)])
+
+        res = self.reserve([(1, 2)])
+
+        self.assertEqual(
+            res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_keys_are_scoped_to_user(self):
+        self.reserve([(1, 1)])
+        self.client.force_authenticate(
+            User.objects.create_user(email="other@test.com")
+        )
+
+        res = self.reserve([(1, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_requests_without_key_run_every_time(self):
+        ReservationApiTestMixin.reserve(self, [(1, 1)])
+        ReservationApiTestMixin.reserve(self, [(1, 2)])
+
+        self.assertEqual(Reservation.objects.count(), 2)
+
+    def test_key_too_long(self):
+        res = self.reserve([(1, 1)], key="k" * 256)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(idempotency.HEADER, res.data)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_server_error_frees_key(self):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(self.user)
+        with patch(
+            "theatre.reservations.reserve", side_effect=RuntimeError("down")
+        ):
+            res = self.reserve([(1, 1)], client=client)
+
+        self.assertEqual(
+            res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+        res = self.reserve([(1, 1)])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_waits_for_first_request(self):
+        payload = [(1, 1)]
+        first = self.reserve(payload, key="concurrent")
+        cache_key = idempotency._cache_key(self.user.id, "concurrent")
+        outcome = cache.get(cache_key)
+        # Put the key back in the state of a request still running.
+        cache.set(cache_key, {**outcome, "status": None})
+        finished = threading.Timer(0.2, cache.set, [cache_key, outcome])
+        finished.start()
+        self.addCleanup(finished.cancel)
+
+        retry = self.reserve(payload, key="concurrent")
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_gives_up_waiting(self):
+        self.reserve([(1, 1)])
+        cache_key = idempotency._cache_key(self.user.id, "retry-1")
+        cache.set(cache_key, {**cache.get(cache_key), "status": None})
+
+        res = self.reserve([(1, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0, REQUEST_TIMEOUT_SECONDS=60)
+    def test_claim_outlives_the_wait(self):
+        cache_key = idempotency._cache_key(self.user.id, "slow")
+        self.assertIsNone(idempotency.begin(cache_key, "first"))
+
+        with patch("time.time", return_value=time.time() + 30):
+            with self.assertRaises(idempotency.IdempotencyKeyInUse):
+                idempotency.begin(cache_key, "first")
+
+        with patch("time.time", return_value=time.time() + 61):
+            self.assertIsNone(idempotency.begin(cache_key, "first"))
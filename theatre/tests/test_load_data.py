@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.test import TestCase
+
+from theatre import search
+from theatre.models import (
+    Actor,
+    Genre,
+    Performance,
+    Play,
+    Reservation,
+    ReservationSummary,
+    TheatreHall,
+    Ticket,
+)
+
+User = get_user_model()
+
+
+class GenerateLoadDataCommandTest(TestCase):
+    def generate(self, *args):
+        out = StringIO()
+        call_command(
+            "generate_load_data",
+            "--halls=2",
+            "--plays=5",
+            "--actors=10",
+            "--genres=3",
+            "--users=20",
+            "--months=1",
+            "--tickets=500",
+            "--start=2024-03-01",
+            *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_generate(self):
+        out = self.generate()
+
+        self.assertIn("500 tickets", out)
+        self.assertEqual(TheatreHall.objects.count(), 2)
+        self.assertEqual(Play.objects.count(), 5)
+        self.assertEqual(Actor.objects.count(), 10)
+        self.assertEqual(Genre.objects.count(), 3)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertTrue(
+            User.objects.get(email="loadtest19@example.com").check_password(
+                "loadtest"
+            )
+        )
+        show_times = Performance.objects.values_list("show_time", flat=True)
+        self.assertGreaterEqual(
+            min(show_times), datetime(2024, 3, 1, tzinfo=timezone.utc)
+        )
+        self.assertLess(
+            max(show_times), datetime(2024, 4, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(Ticket.objects.count(), 500)
+        self.assertFalse(
+            Ticket.objects.filter(
+                reservation__created_at__gte=F("performance__show_time")
+            ).exists()
+        )
+        play = Play.objects.first()
+        self.assertIn(play.id, search.search(play.title))
+
+    def test_seat_stats_and_summaries_match_tickets(self):
+        self.generate()
+
+        self.assertEqual(
+            Performance.objects.aggregate(sold=Sum("tickets_sold"))["sold"],
+            500,
+        )
+        call_command("rebuild_seat_stats", "--verify", stdout=StringIO())
+        summaries = list(
+            ReservationSummary.objects.order_by("pk").values()
+        )
+        self.assertEqual(len(summaries), Reservation.objects.count())
+        ReservationSummary.objects.refresh(
+            Reservation.objects.values_list("id", flat=True)
+        )
+        self.assertEqual(
+            list(ReservationSummary.objects.order_by("pk").values()),
+            summaries,
+        )
+
+    def test_deterministic(self):
+        def dataset():
+            return list(
+                Ticket.objects.order_by(
+                    "performance__show_time",
+                    "performance__theatre_hall__name",
+                    "row",
+                    "seat",
+                ).values_list(
+                    "performance__show_time",
+                    "performance__play__title",
+                    "row",
+                    "seat",
+                    "reservation__created_at",
+                    "reservation__user__email",
+                )
+            )
+
+        with transaction.atomic():
+            self.generate("--seed=1")
+            first = dataset()
+            transaction.set_rollback(True)
+        self.generate("--seed=1")
+
+        self.assertEqual(dataset(), first)
+
+    def test_invalid(self):
+        with self.assertRaisesMessage(CommandError, "do not fit"):
+            self.generate("--tickets=1000000")
+        self.generate()
+        with self.assertRaisesMessage(CommandError, "flush it first"):
+            self.generate()
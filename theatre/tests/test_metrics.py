@@ -0,0 +1,199 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+from user.tasks import send_email_task
+
+RESERVATION_URL = reverse("theatre:reservation-list")
+PERFORMANCE_ROUTE = {"route": "theatre:performance-list"}
+
+User = get_user_model()
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+
+    def reserve(self, *seats):
+        return self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {
+                        "row": row,
+                        "seat": seat,
+                        "performance": self.performance.id,
+                    }
+                    for row, seat in seats
+                ]
+            },
+            format="json",
+        )
+
+    def test_request_metrics_are_labelled_by_route(self):
+        labels = {**PERFORMANCE_ROUTE, "method": "GET", "status": "2xx"}
+        requests = sample("http_request_duration_seconds_count", **labels)
+        queries = sample("http_request_db_queries_sum", **PERFORMANCE_ROUTE)
+        renders = sample(
+            "http_response_render_duration_seconds_count", **PERFORMANCE_ROUTE
+        )
+
+        self.client.get(reverse("theatre:performance-list"))
+
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels),
+            requests + 1,
+        )
+        self.assertEqual(
+            sample("http_request_db_queries_sum", **PERFORMANCE_ROUTE),
+            queries + 1,
+        )
+        self.assertGreater(
+            sample("http_request_db_duration_seconds_sum", **PERFORMANCE_ROUTE),
+            0,
+        )
+        self.assertEqual(
+            sample(
+                "http_response_render_duration_seconds_count",
+                **PERFORMANCE_ROUTE,
+            ),
+            renders + 1,
+        )
+
+    def test_unknown_paths_share_one_label(self):
+        labels = {"route": "<unmatched>", "method": "GET", "status": "4xx"}
+        before = sample("http_request_duration_seconds_count", **labels)
+
+        self.client.get("/no/such/path/1/")
+        self.client.get("/no/such/path/2/")
+
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **labels),
+            before + 2,
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("theatre:performance-list"))
+
+        res = self.client.get(reverse("metrics"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"http_request_duration_seconds_bucket", res.content)
+        self.assertNotIn(b'route="metrics"', res.content)
+
+    @override_settings(METRICS_ALLOWED_IPS=["10.0.0.1"], METRICS_TOKEN="")
+    def test_metrics_endpoint_is_restricted(self):
+        res = self.client.get(reverse("metrics"))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.1")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(METRICS_ALLOWED_IPS=[], METRICS_TOKEN="secret")
+    def test_metrics_endpoint_accepts_token(self):
+        res = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer wrong"
+        )
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        res = self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_response_cache_hits_and_misses(self):
+        hits = sample("theatre_response_cache_hits_total", **PERFORMANCE_ROUTE)
+        misses = sample(
+            "theatre_response_cache_misses_total", **PERFORMANCE_ROUTE
+        )
+
+        self.client.get(reverse("theatre:performance-list"))
+        self.client.get(reverse("theatre:performance-list"))
+        self.client.get(reverse("theatre:performance-list"))
+
+        self.assertEqual(
+            sample("theatre_response_cache_hits_total", **PERFORMANCE_ROUTE),
+            hits + 2,
+        )
+        self.assertEqual(
+            sample(
+                "theatre_response_cache_misses_total", **PERFORMANCE_ROUTE
+            ),
+            misses + 1,
+        )
+
+    def test_reservations_and_tickets_are_counted_on_commit(self):
+        reservations = sample("theatre_reservations_created_total")
+        tickets = sample("theatre_tickets_sold_total")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.reserve((1, 1), (1, 2))
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(
+                sample("theatre_reservations_created_total"), reservations
+            )
+
+        self.assertEqual(
+            sample("theatre_reservations_created_total"), reservations + 1
+        )
+        self.assertEqual(sample("theatre_tickets_sold_total"), tickets + 2)
+
+    def test_seat_conflicts_are_counted(self):
+        Ticket.objects.create(
+            row=1,
+            seat=1,
+            performance=self.performance,
+            reservation=Reservation.objects.create(user=self.user),
+        )
+        before = sample("theatre_seat_conflicts_total", reason="taken")
+
+        res = self.reserve((1, 1), (1, 2))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            sample("theatre_seat_conflicts_total", reason="taken"), before + 1
+        )
+
+    def test_celery_task_duration(self):
+        labels = {"task": send_email_task.name, "state": "SUCCESS"}
+        before = sample("celery_task_duration_seconds_count", **labels)
+
+        send_email_task.apply(
+            ("Subject", "Message", "from@test.com", ["to@test.com"])
+        )
+
+        self.assertEqual(
+            sample("celery_task_duration_seconds_count", **labels), before + 1
+        )
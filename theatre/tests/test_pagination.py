@@ -0,0 +1,138 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+
+PERFORMANCE_URL = reverse("theatre:performance-list")
+RESERVATION_URL = reverse("theatre:reservation-list")
+TICKET_URL = reverse("theatre:ticket-list")
+
+User = get_user_model()
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performances = [
+            Performance.objects.create(
+                show_time=show_time, play=play, theatre_hall=hall
+            )
+            for show_time in [
+                "2024-08-01T19:00:00Z",
+                "2024-08-02T19:00:00Z",
+                "2024-08-02T19:00:00Z",
+                "2024-08-02T19:00:00Z",
+                "2024-08-03T19:00:00Z",
+            ]
+        ]
+
+    def walk(self, url, direction="next", **params):
+        ids = []
+        pages = 0
+        while url:
+            res = self.client.get(url, params)
+            params = {}
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", res.data)
+            ids.append([item["id"] for item in res.data["results"]])
+            url = res.data[direction]
+            pages += 1
+            self.assertLess(pages, 20)
+        return ids
+
+    def test_performances_follow_show_time_with_id_tie_break(self):
+        expected = [
+            performance.id
+            for performance in sorted(
+                self.performances,
+                key=lambda performance: (performance.show_time, performance.id),
+                reverse=True,
+            )
+        ]
+
+        pages = self.walk(PERFORMANCE_URL, page_size=2)
+
+        self.assertEqual(
+            pages, [expected[0:2], expected[2:4], expected[4:5]]
+        )
+
+    def test_previous_link_walks_back(self):
+        pages = []
+        res = self.client.get(PERFORMANCE_URL, {"page_size": 2})
+        self.assertIsNone(res.data["previous"])
+        while res.data["next"]:
+            pages.append([item["id"] for item in res.data["results"]])
+            res = self.client.get(res.data["next"])
+        last = [item["id"] for item in res.data["results"]]
+
+        self.assertEqual(self.walk(res.data["previous"], "previous"), pages[::-1])
+        self.assertEqual(len(last), 1)
+
+    def test_page_size_is_bounded(self):
+        res = self.client.get(PERFORMANCE_URL, {"page_size": 1000})
+
+        self.assertEqual(len(res.data["results"]), 5)
+        self.assertIsNone(res.data["next"])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(PERFORMANCE_URL, {"cursor": "garbage"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_runs_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.client.get(PERFORMANCE_URL, {"page_size": 2})
+
+    def test_tickets_ordered_by_row_and_seat(self):
+        reservation = Reservation.objects.create(user=self.user)
+        for performance in self.performances[:3]:
+            for row, seat in [(2, 1), (1, 2), (1, 1)]:
+                Ticket.objects.create(
+                    row=row,
+                    seat=seat,
+                    performance=performance,
+                    reservation=reservation,
+                )
+        expected = list(
+            Ticket.objects.order_by("row", "seat", "id").values_list(
+                "id", flat=True
+            )
+        )
+
+        pages = self.walk(TICKET_URL, page_size=4)
+
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 1])
+
+    def test_reservations_newest_first(self):
+        reservations = [
+            Reservation.objects.create(user=self.user) for _ in range(3)
+        ]
+
+        pages = self.walk(RESERVATION_URL, page_size=2)
+
+        self.assertEqual(
+            sum(pages, []),
+            [reservation.id for reservation in reversed(reservations)],
+        )
@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre.models import TheatreHall, Play, Performance
+
+PERFORMANCE_URL = reverse("theatre:performance-list")
+
+User = get_user_model()
+
+
+class PerformanceFilterTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.hamlet = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.macbeth = Play.objects.create(
+            title="Macbeth", description="A Shakespeare play"
+        )
+        self.othello = Play.objects.create(
+            title="Othello", description="A Shakespeare play"
+        )
+        self.first = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z", play=self.hamlet, theatre_hall=hall
+        )
+        self.late = Performance.objects.create(
+            show_time="2024-08-01T23:30:00Z", play=self.macbeth, theatre_hall=hall
+        )
+        self.second = Performance.objects.create(
+            show_time="2024-08-02T19:00:00Z", play=self.othello, theatre_hall=hall
+        )
+        self.third = Performance.objects.create(
+            show_time="2024-08-03T19:00:00Z", play=self.hamlet, theatre_hall=hall
+        )
+
+    def filter_ids(self, **params):
+        res = self.client.get(PERFORMANCE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return {performance["id"] for performance in res.data["results"]}
+
+    def test_filter_by_date(self):
+        self.assertEqual(
+            self.filter_ids(date="2024-08-01"), {self.first.id, self.late.id}
+        )
+
+    def test_filter_by_date_range(self):
+        self.assertEqual(
+            self.filter_ids(date_from="2024-08-02"),
+            {self.second.id, self.third.id},
+        )
+        self.assertEqual(
+            self.filter_ids(date_to="2024-08-02"),
+            {self.first.id, self.late.id, self.second.id},
+        )
+        self.assertEqual(
+            self.filter_ids(date_from="2024-08-02", date_to="2024-08-02"),
+            {self.second.id},
+        )
+
+    @override_settings(TIME_ZONE="Europe/Kyiv")
+    def test_dates_are_days_of_the_configured_time_zone(self):
+        self.assertEqual(self.filter_ids(date="2024-08-01"), {self.first.id})
+        self.assertEqual(
+            self.filter_ids(date="2024-08-02"), {self.late.id, self.second.id}
+        )
+
+    def test_filter_by_plays(self):
+        self.assertEqual(
+            self.filter_ids(play=str(self.macbeth.id)), {self.late.id}
+        )
+        self.assertEqual(
+            self.filter_ids(play=f"{self.hamlet.id},{self.othello.id}"),
+            {self.first.id, self.second.id, self.third.id},
+        )
+        self.assertEqual(
+            self.filter_ids(play=str(self.hamlet.id), date_from="2024-08-02"),
+            {self.third.id},
+        )
+
+    def test_date_filter_does_not_cast_show_time(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.filter_ids(date="2024-08-01")
+
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("cast_date", queries[0]["sql"])
+        self.assertIn('"theatre_performance"."show_time" >=', queries[0]["sql"])
+
+    def test_invalid_filters(self):
+        for params in (
+            {"date": "01.08.2024"},
+            {"date_from": "tomorrow"},
+            {"date_to": "2024-13-01"},
+            {"play": "1,two"},
+        ):
+            with self.subTest(params=params):
+                res = self.client.get(PERFORMANCE_URL, params)
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(next(iter(params)), res.data)
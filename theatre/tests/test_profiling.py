@@ -0,0 +1,142 @@
+import marshal
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from theatre_service import profiling
+
+User = get_user_model()
+
+
+def slow_view(request):
+    time.sleep(0.05)
+    return HttpResponse("ok")
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(
+            PROFILING_DIR=self.directory, PROFILING_INTERVAL=0.001
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.staff = User.objects.create_user(
+            email="admin@test.com", password="testpass", is_staff=True
+        )
+        self.user = User.objects.create_user(
+            email="user@test.com", password="testpass"
+        )
+
+    def profiles(self, suffix=".collapsed"):
+        return sorted(self.directory.glob(f"*{suffix}"))
+
+
+class ProfilingMiddlewareTest(ProfilingTestCase):
+    def request(self, user=None, **headers):
+        request = RequestFactory().get("/", headers=headers)
+        if user is not None:
+            request.user = user
+        return request
+
+    @override_settings(PROFILING_SAMPLE_RATE=0, PROFILING_HEADER_ENABLED=False)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(slow_view)
+
+    @override_settings(PROFILING_SAMPLE_RATE=1)
+    def test_sampled_requests_write_collapsed_stacks(self):
+        middleware = profiling.ProfilingMiddleware(slow_view)
+
+        response = middleware(self.request())
+
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        [profile] = self.profiles()
+        lines = profile.read_text().splitlines()
+        self.assertTrue(lines)
+        stack, samples = lines[0].rsplit(" ", 1)
+        self.assertIn("slow_view (test_profiling.py:", stack.split(";")[-1])
+        self.assertGreater(int(samples), 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0.5)
+    def test_sample_rate(self):
+        middleware = profiling.ProfilingMiddleware(HttpResponse)
+
+        with mock.patch.object(profiling.random, "random", return_value=0.6):
+            middleware(self.request())
+        self.assertEqual(self.profiles(), [])
+
+        with mock.patch.object(profiling.random, "random", return_value=0.4):
+            middleware(self.request())
+        self.assertEqual(len(self.profiles()), 1)
+
+    @override_settings(PROFILING_HEADER_ENABLED=True)
+    def test_header_is_honoured_for_staff_only(self):
+        middleware = profiling.ProfilingMiddleware(slow_view)
+
+        middleware(self.request(self.user, x_profile="1"))
+        self.assertEqual(self.profiles(), [])
+
+        response = middleware(self.request(self.staff, x_profile="1"))
+        [profile] = self.profiles()
+        self.assertEqual(
+            response[profiling.RESPONSE_HEADER], profile.stem
+        )
+
+    @override_settings(PROFILING_HEADER_ENABLED=True)
+    def test_cprofile_dump(self):
+        middleware = profiling.ProfilingMiddleware(slow_view)
+
+        middleware(self.request(self.staff, x_profile="cprofile"))
+
+        [dump] = self.profiles(".prof")
+        stats = marshal.loads(dump.read_bytes())
+        self.assertIn("slow_view", {name for _, _, name in stats})
+
+    @override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_FILES=3)
+    def test_directory_is_rotated(self):
+        middleware = profiling.ProfilingMiddleware(HttpResponse)
+
+        for _ in range(5):
+            middleware(self.request())
+
+        self.assertEqual(len(self.profiles()), 3)
+
+
+@override_settings(PROFILING_HEADER_ENABLED=True)
+class ProfilingRequestTest(ProfilingTestCase):
+    def test_staff_jwt_header_profiles_api_request(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer "
+            f"{RefreshToken.for_user(self.staff).access_token}",
+            HTTP_X_PROFILE="1",
+        )
+
+        response = client.get(reverse("theatre:play-list"))
+
+        [profile] = self.profiles()
+        self.assertEqual(response[profiling.RESPONSE_HEADER], profile.stem)
+        self.assertIn("-get-theatre-play-list-200-", profile.name)
+
+    def test_invalid_token_is_not_profiled(self):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION="Bearer nonsense", HTTP_X_PROFILE="1"
+        )
+
+        response = client.get(reverse("theatre:play-list"))
+
+        self.assertNotIn(profiling.RESPONSE_HEADER, response)
+        self.assertEqual(self.profiles(), [])
@@ -0,0 +1,412 @@
+"""Query budgets of every API endpoint.
+
+Each endpoint is requested twice, once with a single row of everything in
+the database and once with several, with the response cache cleared before
+each request. The test fails if either request runs more queries than the
+endpoint's budget or if the count changes with the number of rows, which is
+how an N+1 query shows up. Set ``QUERY_BUDGET_REPORT=1`` to print the
+measured counts of every endpoint.
+"""
+import os
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Callable, Optional
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from theatre import holds
+from theatre.models import (
+    Actor,
+    Genre,
+    Performance,
+    Play,
+    Reservation,
+    ReservationSummary,
+    TheatreHall,
+    Ticket,
+)
+from theatre.urls import router
+from user.urls import urlpatterns as user_urlpatterns
+
+User = get_user_model()
+
+REPORT = os.getenv("QUERY_BUDGET_REPORT") == "1"
+
+SMALL = 1
+LARGE = 6
+PASSWORD = "testpass"
+
+
+@dataclass
+class Budget:
+    """At most ``queries`` queries for ``method`` on the URL named ``name``.
+
+    ``args`` and ``data`` are called with the test case to build the URL
+    arguments and the request payload; ``user`` is ``"user"``, ``"admin"``
+    or ``None`` for an anonymous request.
+    """
+
+    name: str
+    queries: int
+    method: str = "get"
+    args: Callable = lambda test: ()
+    data: Optional[Callable] = None
+    user: Optional[str] = "user"
+    params: dict = field(default_factory=dict)
+
+    @property
+    def label(self):
+        return f"{self.method.upper()} {self.name}"
+
+
+BUDGETS = [
+    Budget("theatre:api-root", 0),
+    Budget("theatre:genre-list", 2),
+    Budget(
+        "theatre:genre-list",
+        2,
+        method="post",
+        user="admin",
+        data=lambda test: {"name": f"Genre {test.next_id()}"},
+    ),
+    Budget("theatre:actor-list", 2),
+    Budget(
+        "theatre:actor-list",
+        1,
+        method="post",
+        user="admin",
+        data=lambda test: {"first_name": "Jane", "last_name": "Doe"},
+    ),
+    Budget("theatre:theatrehall-list", 2),
+    Budget(
+        "theatre:theatrehall-list",
+        1,
+        method="post",
+        user="admin",
+        data=lambda test: {"name": "Hall", "rows": 5, "seats_in_row": 5},
+    ),
+    Budget("theatre:play-list", 2),
+    Budget("theatre:play-list", 2, params={"title": "Play"}),
+    # The search vocabulary is rebuilt, as the cache is cleared.
+    Budget("theatre:play-list", 5, params={"search": "another pla"}),
+    Budget(
+        "theatre:play-list",
+        2,
+        method="post",
+        user="admin",
+        data=lambda test: {"title": "New play", "description": "New"},
+    ),
+    Budget("theatre:play-detail", 1, args=lambda test: [test.play.id]),
+    Budget("theatre:performance-list", 1),
+    Budget(
+        "theatre:performance-list",
+        1,
+        params={"date_from": "2024-08-01", "play": "1,2,3"},
+    ),
+    Budget(
+        "theatre:performance-list",
+        3,
+        method="post",
+        user="admin",
+        data=lambda test: {
+            "show_time": "2024-09-01T19:00:00Z",
+            "play": test.play.id,
+            "theatre_hall": test.hall.id,
+        },
+    ),
+    Budget(
+        "theatre:performance-detail",
+        1,
+        args=lambda test: [test.performance.id],
+    ),
+    Budget(
+        "theatre:performance-schedule",
+        6,
+        method="post",
+        user="admin",
+        data=lambda test: {
+            "performances": [
+                {
+                    "show_time": f"{2100 + test.next_id()}-09-01T19:00:00Z",
+                    "play": test.play.id,
+                    "theatre_hall": test.hall.id,
+                }
+                for _ in range(3)
+            ]
+        },
+    ),
+    Budget(
+        "theatre:performance-schedule",
+        6,
+        method="post",
+        user="admin",
+        data=lambda test: {"recurrence": test.season()},
+    ),
+    Budget(
+        "theatre:performance-allocate",
+        1,
+        method="post",
+        args=lambda test: [test.performance.id],
+        data=lambda test: {"party_size": 2},
+    ),
+    Budget(
+        "theatre:performance-allocate",
+        1,
+        method="post",
+        args=lambda test: [test.performance.id],
+        data=lambda test: {"party_size": 2, "hold": True},
+    ),
+    Budget("theatre:performance-cache-stats", 0, user="admin"),
+    Budget("theatre:reservation-list", 3),
+    Budget("theatre:reservation-history", 1),
+    Budget("theatre:export-tickets", 1, user="admin"),
+    Budget(
+        "theatre:export-tickets",
+        1,
+        user="admin",
+        params={"format": "csv", "play": "1,2", "date_from": "2024-08-01"},
+    ),
+    Budget("theatre:export-reservations", 1, user="admin"),
+    Budget(
+        "theatre:reservation-list",
+        12,
+        method="post",
+        data=lambda test: {
+            "tickets": [
+                {"row": 9, "seat": seat, "performance": test.performance.id}
+                for seat in test.free_seats(2)
+            ]
+        },
+    ),
+    Budget(
+        "theatre:hold-list",
+        1,
+        method="post",
+        data=lambda test: {
+            "performance": test.performance.id,
+            "seats": [
+                {"row": 10, "seat": seat} for seat in test.free_seats(2)
+            ],
+        },
+    ),
+    Budget("theatre:hold-detail", 0, args=lambda test: [test.hold()["id"]]),
+    Budget(
+        "theatre:hold-detail",
+        1,
+        method="delete",
+        args=lambda test: [test.hold()["id"]],
+    ),
+    Budget("theatre:ticket-list", 1),
+    Budget(
+        "user:create",
+        2,
+        method="post",
+        user=None,
+        data=lambda test: {
+            "email": f"new{test.next_id()}@test.com",
+            "password": PASSWORD,
+        },
+    ),
+    Budget(
+        "user:login",
+        2,
+        method="post",
+        user=None,
+        data=lambda test: {"email": test.user.email, "password": PASSWORD},
+    ),
+    Budget("user:manage", 0),
+    Budget(
+        "user:manage",
+        2,
+        method="patch",
+        data=lambda test: {"email": test.user.email},
+    ),
+    Budget(
+        "user:token_obtain_pair",
+        1,
+        method="post",
+        user=None,
+        data=lambda test: {"email": test.user.email, "password": PASSWORD},
+    ),
+    Budget(
+        "user:token_refresh",
+        0,
+        method="post",
+        user=None,
+        data=lambda test: {"refresh": str(RefreshToken.for_user(test.user))},
+    ),
+    Budget(
+        "user:token_verify",
+        0,
+        method="post",
+        user=None,
+        data=lambda test: {
+            "token": str(RefreshToken.for_user(test.user).access_token)
+        },
+    ),
+    Budget("user:send_notification", 0, user=None),
+]
+
+
+class QueryBudgetTest(TestCase):
+    report = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if REPORT and cls.report:
+            width = max(len(label) for label, *_ in cls.report)
+            print("\nQuery counts per endpoint (budget, few rows, many rows)")
+            for label, budget, small, large in cls.report:
+                print(f"  {label:<{width}}  {budget:>3} {small:>4} {large:>4}")
+
+    def setUp(self):
+        cache.clear()
+        self.ids = count()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password=PASSWORD
+        )
+        self.admin = User.objects.create_user(
+            email="admin@test.com", password=PASSWORD, is_staff=True
+        )
+        # Otherwise the first login also pays for creating the token.
+        Token.objects.create(user=self.user)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(title="Play", description="A play")
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+        self.seats = iter(range(1, 21))
+        self.rows = 0
+        self.populate(SMALL)
+
+    def next_id(self):
+        return next(self.ids)
+
+    def free_seats(self, number):
+        return [next(self.seats) for _ in range(number)]
+
+    def season(self):
+        """Weekly recurrence over a year no performance is scheduled in."""
+        year = 2100 + self.next_id()
+        return {
+            "play": self.play.id,
+            "theatre_hall": self.hall.id,
+            "weekdays": ["fri", "sat", "sun"],
+            "time": "19:00",
+            "date_from": f"{year}-01-01",
+            "date_to": f"{year}-03-31",
+        }
+
+    def hold(self):
+        return holds.hold_seats(
+            self.user.id,
+            Performance.objects.get(pk=self.performance.pk),
+            [(8, seat) for seat in self.free_seats(1)],
+        )
+
+    def populate(self, rows):
+        """Bring every table listed by the API up to ``rows`` rows."""
+        for _ in range(self.rows, rows):
+            index = self.next_id()
+            Genre.objects.create(name=f"Genre {index}")
+            Actor.objects.create(first_name="John", last_name=f"Doe {index}")
+            hall = TheatreHall.objects.create(
+                name=f"Hall {index}", rows=10, seats_in_row=20
+            )
+            play = Play.objects.create(
+                title=f"Play {index}", description="Another play"
+            )
+            performance = Performance.objects.create(
+                show_time="2024-08-02T19:00:00Z",
+                play=play,
+                theatre_hall=hall,
+            )
+            reservation = Reservation.objects.create(user=self.user)
+            Ticket.objects.bulk_reserve(
+                Ticket(
+                    row=1,
+                    seat=seat,
+                    performance=target,
+                    reservation=reservation,
+                )
+                for target, seat in (
+                    (performance, 1),
+                    (self.performance, index + 1),
+                )
+            )
+            ReservationSummary.objects.refresh([reservation.id])
+        self.rows = max(self.rows, rows)
+
+    def request(self, budget):
+        cache.clear()
+        client = APIClient()
+        if budget.user:
+            client.force_authenticate(getattr(self, budget.user))
+        url = reverse(budget.name, args=budget.args(self))
+        kwargs = {"format": "json"} if budget.data else {}
+        data = budget.data(self) if budget.data else budget.params
+
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, budget.method)(url, data, **kwargs)
+            if response.streaming:
+                # Streamed rows are only read as the body is consumed.
+                b"".join(response.streaming_content)
+
+        self.assertLess(
+            response.status_code,
+            400,
+            f"{budget.label} failed: {getattr(response, 'data', response)}",
+        )
+        return len(queries)
+
+    def measure(self):
+        with patch("user.views.send_email_task.delay"):
+            return [self.request(budget) for budget in BUDGETS]
+
+    def test_endpoints_stay_within_budget(self):
+        small = self.measure()
+        self.populate(LARGE)
+        large = self.measure()
+
+        measured = [
+            (budget.label, budget.queries, *counts)
+            for budget, *counts in zip(BUDGETS, small, large)
+        ]
+        self.report.extend(measured)
+        for label, queries, small, large in measured:
+            with self.subTest(endpoint=label):
+                self.assertEqual(
+                    small,
+                    large,
+                    f"{label} ran {small} queries with {SMALL} row(s) and "
+                    f"{large} with {LARGE}.",
+                )
+                self.assertLessEqual(
+                    large,
+                    queries,
+                    f"{label} ran {large} queries, over its budget of "
+                    f"{queries}.",
+                )
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {f"theatre:{url.name}" for url in router.urls} | {
+            f"user:{url.name}" for url in user_urlpatterns
+        }
+
+        self.assertEqual(
+            names - {budget.name for budget in BUDGETS}, set()
+        )
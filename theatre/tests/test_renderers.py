@@ -0,0 +1,136 @@
+import datetime
+import decimal
+import io
+import uuid
+from collections import OrderedDict
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from theatre import parsers, renderers
+from theatre.models import Play
+
+PAYLOAD = {
+    "id": 1,
+    "title": "Ромео і Джульєтта \u2028\u2029 \"quoted\" \\ \x01",
+    "price": decimal.Decimal("12.50"),
+    "ratio": 0.1,
+    "large": 2**60,
+    "show_time": datetime.datetime(
+        2024, 8, 1, 19, 0, 0, 123456, tzinfo=datetime.timezone.utc
+    ),
+    "date": datetime.date(2024, 8, 1),
+    "time": datetime.time(19, 30),
+    "duration": datetime.timedelta(hours=2),
+    "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "label": gettext_lazy("Hamlet"),
+    "seats": [OrderedDict(row=1, seat=2), (3, 4), None, True, False],
+    "empty": {},
+    2: "non-string key",
+}
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD),
+        )
+
+    def test_uses_orjson(self):
+        with mock.patch.object(
+            renderers.orjson, "dumps", wraps=renderers.orjson.dumps
+        ) as dumps:
+            renderers.FastJSONRenderer().render({"id": 1})
+
+        dumps.assert_called_once()
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(renderers, "orjson", None):
+            self.assertEqual(
+                renderers.FastJSONRenderer().render(PAYLOAD),
+                JSONRenderer().render(PAYLOAD),
+            )
+
+    def test_indented_output_falls_back(self):
+        renderer = renderers.FastJSONRenderer()
+
+        self.assertEqual(
+            renderer.render(PAYLOAD, "application/json; indent=4"),
+            JSONRenderer().render(PAYLOAD, "application/json; indent=4"),
+        )
+        self.assertEqual(
+            renderer.render(PAYLOAD, renderer_context={"indent": 2}),
+            JSONRenderer().render(PAYLOAD, renderer_context={"indent": 2}),
+        )
+
+    def test_none_renders_empty_body(self):
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b"")
+
+
+class FastJSONParserTest(SimpleTestCase):
+    def parse(self, body, **context):
+        return parsers.FastJSONParser().parse(
+            io.BytesIO(body), parser_context=context
+        )
+
+    def test_parses_like_json_parser(self):
+        body = '{"title": "Гамлет", "seats": [{"row": 1, "seat": 2.5}]}'
+
+        for encoding in ("utf-8", "utf-16"):
+            with self.subTest(encoding=encoding):
+                self.assertEqual(
+                    self.parse(body.encode(encoding), encoding=encoding),
+                    JSONParser().parse(
+                        io.BytesIO(body.encode(encoding)),
+                        parser_context={"encoding": encoding},
+                    ),
+                )
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch.object(parsers, "orjson", None):
+            self.assertEqual(self.parse(b'{"id": 1}'), {"id": 1})
+
+    def test_invalid_json(self):
+        for body in (b'{"id": ', b'{"id": NaN}'):
+            with self.subTest(body=body):
+                with self.assertRaisesMessage(ParseError, "JSON parse error"):
+                    self.parse(body)
+
+
+class FastJSONSettingsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(
+                email="admin@test.com", password="testpass", is_staff=True
+            )
+        )
+
+    def test_api_renders_and_parses_with_fast_json(self):
+        res = self.client.post(
+            reverse("theatre:play-list"),
+            {"title": "Гамлет", "description": "Act\u2028one"},
+            format="json",
+        )
+
+        self.assertIsInstance(
+            res.accepted_renderer, renderers.FastJSONRenderer
+        )
+        self.assertEqual(Play.objects.get().title, "Гамлет")
+        self.assertIn(b'"description":"Act\\u2028one"', res.content)
+
+    def test_browsable_api_still_renders(self):
+        res = self.client.get(
+            reverse("theatre:play-list"), HTTP_ACCEPT="text/html"
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertContains(res, "Play List")
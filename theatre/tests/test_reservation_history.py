@@ -0,0 +1,219 @@
+from datetime import datetime, timezone
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+
+from theatre.models import (
+    Performance,
+    Play,
+    Reservation,
+    ReservationSummary,
+    Ticket,
+)
+from theatre.tests.test_reservations import (
+    RESERVATION_URL,
+    ReservationApiTestMixin,
+)
+
+HISTORY_URL = reverse("theatre:reservation-history")
+
+User = get_user_model()
+
+
+class ReservationHistoryTest(ReservationApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.matinee = Performance.objects.create(
+            show_time=datetime(2024, 8, 1, 13, tzinfo=timezone.utc),
+            play=Play.objects.create(title="Macbeth", description="A play"),
+            theatre_hall=self.hall,
+        )
+
+    def reserve_both(self):
+        res = self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {"row": 1, "seat": 1, "performance": self.performance.id},
+                    {"row": 1, "seat": 2, "performance": self.performance.id},
+                    {"row": 1, "seat": 1, "performance": self.matinee.id},
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data["id"]
+
+    def test_history_summarizes_reservations(self):
+        reservation_id = self.reserve_both()
+        later_id = self.reserve([(2, 1)]).data["id"]
+
+        with self.assertNumQueries(1):
+            res = self.client.get(HISTORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]],
+            [later_id, reservation_id],
+        )
+        summary = res.data["results"][1]
+        self.assertEqual(summary["ticket_count"], 3)
+        self.assertEqual(
+            summary["performance_ids"],
+            [self.matinee.id, self.performance.id],
+        )
+        self.assertEqual(
+            summary["show_times"],
+            ["2024-08-01T13:00:00Z", "2024-08-01T19:00:00Z"],
+        )
+        self.assertEqual(summary["play_titles"], ["Macbeth", "Hamlet"])
+        self.assertEqual(
+            summary["created_at"],
+            Reservation.objects.get(pk=reservation_id)
+            .created_at.isoformat()
+            .replace("+00:00", "Z"),
+        )
+
+    def test_history_is_paginated(self):
+        first_id = self.reserve([(1, 1)]).data["id"]
+        second_id = self.reserve([(1, 2)]).data["id"]
+
+        res = self.client.get(HISTORY_URL, {"page_size": 1})
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]], [second_id]
+        )
+        res = self.client.get(res.data["next"])
+
+        self.assertEqual(
+            [item["id"] for item in res.data["results"]], [first_id]
+        )
+        self.assertIsNone(res.data["next"])
+
+    def test_reservations_are_scoped_to_user(self):
+        self.reserve([(1, 1)])
+        other = User.objects.create_user(email="other@test.com")
+        self.client.force_authenticate(other)
+        own_id = self.reserve([(1, 2)]).data["id"]
+
+        for url in (HISTORY_URL, RESERVATION_URL):
+            res = self.client.get(url)
+
+            self.assertEqual(
+                [item["id"] for item in res.data["results"]], [own_id]
+            )
+
+    def test_summary_follows_play_and_performance_changes(self):
+        reservation_id = self.reserve_both()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.matinee.play.title = "The Scottish Play"
+            self.matinee.play.save()
+            self.performance.show_time = datetime(
+                2024, 8, 1, 11, tzinfo=timezone.utc
+            )
+            self.performance.save()
+
+        summary = ReservationSummary.objects.get(pk=reservation_id)
+        self.assertEqual(
+            summary.performance_ids, [self.performance.id, self.matinee.id]
+        )
+        self.assertEqual(
+            summary.play_titles, ["Hamlet", "The Scottish Play"]
+        )
+
+    def test_updated_summary_matches_rebuilt_one(self):
+        reservation_id = self.reserve_both()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.performance.play.title = "Hamlet, Prince of Denmark"
+            self.performance.play.save()
+            self.matinee.show_time = datetime(
+                2024, 8, 1, 21, 30, 15, 123456, tzinfo=timezone.utc
+            )
+            self.matinee.save()
+        updated = ReservationSummary.objects.values().get(pk=reservation_id)
+        ReservationSummary.objects.refresh([reservation_id])
+
+        self.assertEqual(
+            updated["performance_ids"], [self.performance.id, self.matinee.id]
+        )
+        self.assertEqual(
+            ReservationSummary.objects.values().get(pk=reservation_id),
+            updated,
+        )
+
+    def test_other_changes_leave_summaries_alone(self):
+        self.reserve_both()
+
+        with patch.object(
+            ReservationSummary.objects, "update_performances"
+        ) as update_performances:
+            self.matinee.play.description = "A Scottish play"
+            self.matinee.play.save()
+            self.matinee.theatre_hall = self.hall
+            self.matinee.save()
+
+        update_performances.assert_not_called()
+
+    def test_play_rename_rewrites_summaries_after_commit(self):
+        reservation_id = self.reserve_both()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.matinee.play.title = "The Scottish Play"
+            self.matinee.play.save()
+            self.assertNotIn(
+                "The Scottish Play",
+                ReservationSummary.objects.get(pk=reservation_id).play_titles,
+            )
+
+        self.assertIn(
+            "The Scottish Play",
+            ReservationSummary.objects.get(pk=reservation_id).play_titles,
+        )
+
+    def test_rebuild_reservation_summaries(self):
+        reservation_id = self.reserve_both()
+        summary = ReservationSummary.objects.values().get(pk=reservation_id)
+        ReservationSummary.objects.all().delete()
+        out = StringIO()
+
+        call_command("rebuild_reservation_summaries", stdout=out)
+
+        self.assertIn("Rebuilt 1 reservation summaries.", out.getvalue())
+        self.assertEqual(
+            ReservationSummary.objects.values().get(pk=reservation_id),
+            summary,
+        )
+
+    def test_summary_follows_ticket_changes(self):
+        reservation_id = self.reserve_both()
+
+        Ticket.objects.get(performance=self.matinee).delete()
+
+        summary = ReservationSummary.objects.get(pk=reservation_id)
+        self.assertEqual(summary.ticket_count, 2)
+        self.assertEqual(summary.performance_ids, [self.performance.id])
+
+        for ticket in Ticket.objects.all():
+            ticket.delete()
+
+        self.assertFalse(
+            ReservationSummary.objects.filter(pk=reservation_id).exists()
+        )
+
+    def test_refresh_rebuilds_summary_written_on_reservation(self):
+        reservation_id = self.reserve_both()
+        written = ReservationSummary.objects.values().get(pk=reservation_id)
+        ReservationSummary.objects.all().delete()
+
+        ReservationSummary.objects.refresh([reservation_id])
+
+        self.assertEqual(
+            ReservationSummary.objects.values().get(pk=reservation_id),
+            written,
+        )
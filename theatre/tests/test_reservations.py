@@ -0,0 +1,505 @@
+import threading
+import time
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import benchmarking, holds
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+    TicketManager,
+)
+
+RESERVATION_URL = reverse("theatre:reservation-list")
+HOLD_URL = reverse("theatre:hold-list")
+
+User = get_user_model()
+
+
+class ReservationApiTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+
+    def reserve(self, seats, performance=None, **payload):
+        performance = performance or self.performance
+        return self.client.post(
+            RESERVATION_URL,
+            {
+                "tickets": [
+                    {"row": row, "seat": seat, "performance": performance.id}
+                    for row, seat in seats
+                ],
+                **payload,
+            },
+            format="json",
+        )
+
+
+class BulkReservationTest(ReservationApiTestMixin, TestCase):
+    def test_create_reservation(self):
+        res = self.reserve([(1, 1), (1, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [
+                (ticket["row"], ticket["seat"], ticket["performance"])
+                for ticket in res.data["tickets"]
+            ],
+            [(1, 1, self.performance.id), (1, 2, self.performance.id)],
+        )
+        reservation = Reservation.objects.get(id=res.data["id"])
+        self.assertEqual(reservation.user, self.user)
+        self.assertEqual(reservation.tickets.count(), 2)
+        self.performance.refresh_from_db()
+        self.assertEqual(
+            list(self.performance.seat_map.taken()), [(1, 1), (1, 2)]
+        )
+
+    def test_query_count_does_not_grow_with_tickets(self):
+        with CaptureQueriesContext(connection) as single:
+            res = self.reserve([(1, 1)])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as group:
+            res = self.reserve([(2, seat) for seat in range(1, 11)])
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(single), len(group))
+
+    def test_all_conflicting_seats_are_reported(self):
+        self.reserve([(1, 1), (1, 3)])
+
+        res = self.reserve([(1, 1), (1, 2), (1, 3)])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.json(),
+            {
+                "detail": "Some seats are taken or held by another customer.",
+                "tickets": [
+                    f"Seat (row: 1, seat: 1) of performance "
+                    f"{self.performance.id} is already taken.",
+                    f"Seat (row: 1, seat: 3) of performance "
+                    f"{self.performance.id} is already taken.",
+                ],
+                "seats": [
+                    {"performance": self.performance.id, "row": 1, "seat": 1},
+                    {"performance": self.performance.id, "row": 1, "seat": 3},
+                ],
+            },
+        )
+        self.assertEqual(Ticket.objects.count(), 2)
+
+    def test_duplicate_seats_in_request(self):
+        res = self.reserve([(1, 1), (1, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"],
+            [
+                f"Seat (row: 1, seat: 1) of performance "
+                f"{self.performance.id} is requested more than once."
+            ],
+        )
+
+    def test_seat_outside_hall(self):
+        self.reserve([(1, 1)])
+
+        res = self.reserve([(1, 1), (11, 1), (1, 21)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"],
+            [
+                f"Seat (row: 11, seat: 1) of performance "
+                f"{self.performance.id} is outside the hall: row number "
+                f"must be in available range: (1, rows): (1, 10).",
+                f"Seat (row: 1, seat: 21) of performance "
+                f"{self.performance.id} is outside the hall: seat number "
+                f"must be in available range: (1, seats_in_row): (1, 20).",
+            ],
+        )
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_unknown_performance(self):
+        res = self.client.post(
+            RESERVATION_URL,
+            {"tickets": [{"row": 1, "seat": 1, "performance": 999}]},
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"], ["Performance 999 does not exist."]
+        )
+
+
+class SeatHoldTest(ReservationApiTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_user = User.objects.create_user(
+            email="other@test.com", password="testpass"
+        )
+
+    def hold(self, seats, user=None, **payload):
+        if user:
+            self.client.force_authenticate(user)
+        res = self.client.post(
+            HOLD_URL,
+            {
+                "performance": self.performance.id,
+                "seats": [{"row": row, "seat": seat} for row, seat in seats],
+                **payload,
+            },
+            format="json",
+        )
+        self.client.force_authenticate(self.user)
+        return res
+
+    def test_create_hold(self):
+        res = self.hold([(1, 2), (1, 1)], minutes=5)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            res.data["seats"], [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}]
+        )
+        self.assertEqual(res.data["performance"], self.performance.id)
+        self.assertIn("expires_at", res.data)
+
+        detail = self.client.get(
+            reverse("theatre:hold-detail", args=[res.data["id"]])
+        )
+        self.assertEqual(detail.data, res.data)
+
+    def test_held_seats_reduce_availability(self):
+        self.hold([(1, 1), (1, 2)])
+
+        res = self.client.get(reverse("theatre:performance-list"))
+        self.assertEqual(res.data["results"][0]["tickets_available"], 198)
+
+        res = self.client.get(
+            reverse("theatre:performance-detail", args=[self.performance.id])
+        )
+        self.assertEqual(
+            res.data["held_places"],
+            [{"row": 1, "seat": 1}, {"row": 1, "seat": 2}],
+        )
+
+    def test_held_seats_cannot_be_held_again(self):
+        self.hold([(1, 1), (1, 2)])
+
+        res = self.hold([(1, 2), (1, 3)], user=self.other_user)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["seats"],
+            ["Seat (row: 1, seat: 2) is held by another customer."],
+        )
+        self.assertEqual(
+            holds.held_seats(self.performance.id), [(1, 1), (1, 2)]
+        )
+
+    def test_sold_seats_cannot_be_held(self):
+        self.reserve([(1, 1)])
+
+        res = self.hold([(1, 1)])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["seats"], ["Seat (row: 1, seat: 1) is already taken."]
+        )
+
+    def test_held_seats_cannot_be_reserved_by_others(self):
+        self.hold([(1, 1)], user=self.other_user)
+
+        res = self.reserve([(1, 1), (1, 2)])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["tickets"],
+            [
+                f"Seat (row: 1, seat: 1) of performance "
+                f"{self.performance.id} is held by another customer."
+            ],
+        )
+        self.assertEqual(
+            res.data["seats"],
+            [{"performance": self.performance.id, "row": 1, "seat": 1}],
+        )
+
+    def test_convert_hold_to_reservation(self):
+        hold = self.hold([(2, 1), (2, 2)]).data
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                RESERVATION_URL, {"hold": hold["id"]}, format="json"
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [(ticket["row"], ticket["seat"]) for ticket in res.data["tickets"]],
+            [(2, 1), (2, 2)],
+        )
+        self.assertIsNone(holds.get_hold(hold["id"]))
+        self.assertEqual(holds.held_seats(self.performance.id), [])
+        self.assertEqual(
+            holds.holders_of([(self.performance.id, 2, 1)]), {}
+        )
+
+    def test_convert_hold_with_explicit_tickets(self):
+        hold = self.hold([(2, 1), (2, 2)]).data
+
+        res = self.reserve([(2, 1), (2, 3)], hold=hold["id"])
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["tickets"],
+            [
+                f"Seat (row: 2, seat: 3) of performance "
+                f"{self.performance.id} is not part of the hold."
+            ],
+        )
+
+    def test_hold_of_another_user_cannot_be_used(self):
+        hold = self.hold([(2, 1)], user=self.other_user).data
+
+        res = self.client.post(
+            RESERVATION_URL, {"hold": hold["id"]}, format="json"
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("hold", res.data)
+
+        res = self.client.get(reverse("theatre:hold-detail", args=[hold["id"]]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_release_hold(self):
+        hold = self.hold([(3, 3)]).data
+
+        res = self.client.delete(
+            reverse("theatre:hold-detail", args=[hold["id"]])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(holds.held_seats(self.performance.id), [])
+        self.assertEqual(self.hold([(3, 3)], user=self.other_user).status_code, 201)
+
+    def test_expired_holds_are_ignored(self):
+        self.hold([(1, 1), (1, 2)], minutes=1)
+        self.hold([(5, 5)], user=self.other_user, minutes=5)
+
+        with patch("time.time", return_value=time.time() + 61):
+            self.assertEqual(holds.held_seats(self.performance.id), [(5, 5)])
+            self.assertEqual(
+                holds.held_seat_counts([self.performance.id]),
+                {self.performance.id: 1},
+            )
+            self.assertEqual(self.hold([(1, 1)]).status_code, 201)
+
+    def test_concurrent_holds_are_all_kept(self):
+        performance = Performance.objects.get(pk=self.performance.pk)
+        rows = range(1, self.hall.rows + 1)
+        barrier = threading.Barrier(len(rows))
+
+        def hold(row):
+            barrier.wait()
+            holds.hold_seats(self.user.id, performance, [(row, 1)], minutes=1)
+
+        threads = [threading.Thread(target=hold, args=(row,)) for row in rows]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(
+            holds.held_seats(self.performance.id), [(row, 1) for row in rows]
+        )
+        with patch("time.time", return_value=time.time() + 61), patch.object(
+            holds.seats_changed, "send"
+        ) as send:
+            holds.reap_expired()
+        send.assert_called_once_with(
+            sender=Performance,
+            performance=self.performance,
+            unheld=[(row, 1) for row in rows],
+        )
+
+
+class SeatConflictTest(ReservationApiTestMixin, TestCase):
+    @contextmanager
+    def race(self, taken):
+        """Let another customer reserve ``taken`` between validation and
+        the reservation being written."""
+        reservation = Reservation.objects.create(
+            user=User.objects.create_user(email="rival@test.com")
+        )
+        Ticket.objects.bulk_reserve(
+            Ticket(
+                row=row,
+                seat=seat,
+                performance=self.performance,
+                reservation=reservation,
+            )
+            for row, seat in taken
+        )
+        taken_of = TicketManager.taken_of
+        calls = []
+
+        def validated_before_race(manager, seats):
+            calls.append(seats)
+            return [] if len(calls) == 1 else taken_of(manager, seats)
+
+        with patch.object(
+            TicketManager,
+            "taken_of",
+            autospec=True,
+            side_effect=validated_before_race,
+        ):
+            yield
+
+    def test_seats_lost_to_concurrent_reservation(self):
+        with self.race(taken=[(1, 2)]):
+            res = self.reserve([(1, 1), (1, 2), (1, 3)])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.json(),
+            {
+                "detail": "Some seats were reserved by another customer.",
+                "tickets": [
+                    f"Seat (row: 1, seat: 2) of performance "
+                    f"{self.performance.id} was reserved by another customer."
+                ],
+                "seats": [
+                    {"performance": self.performance.id, "row": 1, "seat": 2}
+                ],
+            },
+        )
+        self.assertFalse(Reservation.objects.filter(user=self.user).exists())
+        self.performance.refresh_from_db()
+        self.assertEqual(list(self.performance.seat_map.taken()), [(1, 2)])
+        self.assertEqual(self.performance.tickets_sold, 1)
+
+    def test_hold_is_kept_when_seats_are_lost(self):
+        hold = self.client.post(
+            HOLD_URL,
+            {
+                "performance": self.performance.id,
+                "seats": [{"row": 2, "seat": 1}, {"row": 2, "seat": 2}],
+            },
+            format="json",
+        ).data
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.race(taken=[(2, 2)]):
+                res = self.client.post(
+                    RESERVATION_URL, {"hold": hold["id"]}, format="json"
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            res.data["seats"],
+            [{"performance": self.performance.id, "row": 2, "seat": 2}],
+        )
+        self.assertIsNotNone(holds.get_hold(hold["id"]))
+
+
+class ConcurrentReservationTest(TransactionTestCase):
+    bookers = 50
+
+    def setUp(self):
+        cache.clear()
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=5, seats_in_row=10
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=Play.objects.create(title="Hamlet", description="A play"),
+            theatre_hall=hall,
+        )
+        self.users = [
+            User.objects.create_user(email=f"booker{index}@test.com")
+            for index in range(self.bookers)
+        ]
+
+    def test_contended_seats_are_sold_once(self):
+        # Every pair of seats is wanted by two bookers.
+        pairs = [
+            [(row, seat), (row, seat + 1)]
+            for row in range(1, 6)
+            for seat in range(1, 11, 2)
+        ]
+        bookings = iter(
+            (user, pairs[index % len(pairs)])
+            for index, user in enumerate(self.users)
+        )
+        lock = threading.Lock()
+
+        def request(state):
+            with lock:
+                user, seats = next(bookings)
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(user)
+            response = client.post(
+                RESERVATION_URL,
+                {
+                    "tickets": [
+                        {
+                            "row": row,
+                            "seat": seat,
+                            "performance": self.performance.id,
+                        }
+                        for row, seat in seats
+                    ]
+                },
+                format="json",
+            )
+            return response.status_code, response.status_code in (400, 409)
+
+        summary = benchmarking.run_concurrently(
+            request, self.bookers, self.bookers
+        )
+
+        self.assertEqual(summary["statuses"].get("201"), len(pairs))
+        self.assertEqual(
+            summary["statuses"].get("400", 0)
+            + summary["statuses"].get("409", 0),
+            len(pairs),
+        )
+        # Well below the time SQLite waits for a lock before giving up.
+        self.assertLess(summary["max_ms"], 5000)
+        self.performance.refresh_from_db()
+        tickets = sorted(
+            self.performance.tickets.values_list("row", "seat")
+        )
+        self.assertEqual(tickets, sorted(sum(pairs, [])))
+        self.assertEqual(list(self.performance.seat_map.taken()), tickets)
+        self.assertEqual(self.performance.tickets_sold, len(tickets))
+        self.assertEqual(Reservation.objects.count(), len(pairs))
@@ -0,0 +1,322 @@
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import scheduling
+from theatre.models import Performance, Play, TheatreHall
+
+PERFORMANCE_URL = reverse("theatre:performance-list")
+SCHEDULE_URL = reverse("theatre:performance-schedule")
+
+User = get_user_model()
+
+
+def at(day, hour=19, minute=0):
+    return datetime(2024, 9, day, hour, minute, tzinfo=timezone.utc)
+
+
+class HallScheduleTest(SimpleTestCase):
+    def test_overlapping(self):
+        schedule = scheduling.HallSchedule(timedelta(hours=3))
+        schedule.add(1, at(2, 19), 10)
+        schedule.add(1, at(2, 12), 11)
+        schedule.add(2, at(2, 19), 12)
+
+        for show_time, overlapping in (
+            (at(2, 19), (at(2, 19), 10)),
+            (at(2, 17), (at(2, 19), 10)),
+            (at(2, 21, 59), (at(2, 19), 10)),
+            (at(2, 14), (at(2, 12), 11)),
+            (at(2, 9, 1), (at(2, 12), 11)),
+            # Back to back.
+            (at(2, 22), None),
+            (at(2, 15), None),
+            (at(2, 9), None),
+        ):
+            with self.subTest(show_time=show_time):
+                self.assertEqual(
+                    schedule.overlapping(1, show_time), overlapping
+                )
+        self.assertIsNone(schedule.overlapping(3, at(2, 19)))
+
+    @override_settings(TIME_ZONE="Europe/Kyiv")
+    def test_occurrences(self):
+        show_times = scheduling.occurrences(
+            ["fri", "sun"],
+            datetime(2024, 1, 1, 19).time(),
+            datetime(2024, 10, 24).date(),
+            datetime(2024, 11, 3).date(),
+        )
+
+        # In local time across the end of summer time.
+        self.assertEqual(
+            show_times,
+            [
+                datetime(2024, 10, 25, 16, tzinfo=timezone.utc),
+                datetime(2024, 10, 27, 17, tzinfo=timezone.utc),
+                datetime(2024, 11, 1, 17, tzinfo=timezone.utc),
+                datetime(2024, 11, 3, 17, tzinfo=timezone.utc),
+            ],
+        )
+
+
+@override_settings(PERFORMANCE_DURATION_MINUTES=180)
+class PerformanceScheduleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(
+            email="admin@test.com", password="testpass", is_staff=True
+        )
+        self.client.force_authenticate(self.admin)
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.small_hall = TheatreHall.objects.create(
+            name="Small Hall", rows=5, seats_in_row=10
+        )
+        self.hamlet = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.macbeth = Play.objects.create(
+            title="Macbeth", description="A Shakespeare play"
+        )
+        self.booked = Performance.objects.create(
+            show_time=at(2), play=self.hamlet, theatre_hall=self.hall
+        )
+
+    def performance(self, show_time, play=None, hall=None):
+        return {
+            "show_time": show_time.isoformat(),
+            "play": (play or self.macbeth).id,
+            "theatre_hall": (hall or self.hall).id,
+        }
+
+    def recurrence(self, **fields):
+        return {
+            "play": self.macbeth.id,
+            "theatre_hall": self.hall.id,
+            "weekdays": ["fri", "sat"],
+            "time": "19:00",
+            "date_from": "2024-09-01",
+            "date_to": "2024-09-30",
+            **fields,
+        }
+
+    def schedule(self, data):
+        return self.client.post(SCHEDULE_URL, data, format="json")
+
+    def test_schedule_list(self):
+        res = self.schedule(
+            {
+                "performances": [
+                    self.performance(at(3)),
+                    self.performance(at(2), hall=self.small_hall),
+                    # Right after the booked performance.
+                    self.performance(at(2, 22), play=self.hamlet),
+                ]
+            }
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["performances"]), 3)
+        created = Performance.objects.exclude(pk=self.booked.pk)
+        self.assertEqual(
+            [performance["id"] for performance in res.data["performances"]],
+            sorted(created.values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            res.data["performances"][1],
+            {
+                "id": res.data["performances"][1]["id"],
+                "show_time": "2024-09-02T19:00:00Z",
+                "play": self.macbeth.id,
+                "theatre_hall": self.small_hall.id,
+            },
+        )
+        self.assertEqual(created.get(show_time=at(3)).seat_bitmap, b"")
+
+    def test_schedule_recurrence(self):
+        res = self.schedule({"recurrence": self.recurrence()})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [
+                performance["show_time"][:10]
+                for performance in res.data["performances"]
+            ],
+            [
+                "2024-09-06",
+                "2024-09-07",
+                "2024-09-13",
+                "2024-09-14",
+                "2024-09-20",
+                "2024-09-21",
+                "2024-09-27",
+                "2024-09-28",
+            ],
+        )
+        self.assertEqual(
+            Performance.objects.filter(play=self.macbeth).count(), 8
+        )
+
+    def test_queries_do_not_grow_with_performances(self):
+        with CaptureQueriesContext(connection) as few:
+            res = self.schedule(
+                {"recurrence": self.recurrence(date_to="2024-09-07")}
+            )
+        self.assertEqual(len(res.data["performances"]), 2)
+        with CaptureQueriesContext(connection) as many:
+            res = self.schedule(
+                {
+                    "recurrence": self.recurrence(
+                        weekdays=["mon", "tue", "wed"],
+                        date_from="2024-09-03",
+                        date_to="2024-12-31",
+                    )
+                }
+            )
+        self.assertEqual(len(res.data["performances"]), 52)
+
+        self.assertEqual(len(many), len(few))
+
+    def test_overlap_with_scheduled_performance(self):
+        res = self.schedule(
+            {
+                "performances": [
+                    self.performance(at(3)),
+                    self.performance(at(2, 21, 59)),
+                ]
+            }
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["performances"],
+            [
+                "Performance at 2024-09-02T21:59:00Z in Main Hall overlaps "
+                f"performance {self.booked.id} at 2024-09-02T19:00:00Z."
+            ],
+        )
+        # Nothing of the batch is created.
+        self.assertEqual(Performance.objects.count(), 1)
+
+    def test_overlap_within_batch(self):
+        res = self.schedule(
+            {
+                "performances": [
+                    self.performance(at(3)),
+                    self.performance(at(3), hall=self.small_hall),
+                    self.performance(at(3, 17)),
+                ]
+            }
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["performances"],
+            [
+                "Performance at 2024-09-03T17:00:00Z in Main Hall overlaps "
+                "another performance of the schedule at "
+                "2024-09-03T19:00:00Z."
+            ],
+        )
+
+    def test_recurrence_overlap(self):
+        res = self.schedule(
+            {
+                "recurrence": self.recurrence(
+                    weekdays=["mon"], time="20:30", date_to="2024-09-09"
+                )
+            }
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(res.data["performances"]), 1)
+        self.assertIn("2024-09-02T20:30:00Z", res.data["performances"][0])
+
+    def test_performance_list_shows_scheduled_performances(self):
+        self.assertEqual(
+            len(self.client.get(PERFORMANCE_URL).data["results"]), 1
+        )
+
+        self.schedule({"recurrence": self.recurrence()})
+
+        self.assertEqual(
+            len(self.client.get(PERFORMANCE_URL).data["results"]), 9
+        )
+
+    def test_invalid(self):
+        for data, field in (
+            ({}, "non_field_errors"),
+            (
+                {
+                    "performances": [self.performance(at(3))],
+                    "recurrence": self.recurrence(),
+                },
+                "non_field_errors",
+            ),
+            ({"performances": []}, "performances"),
+            (
+                {"performances": [self.performance(at(3)) | {"play": 0}]},
+                "performances",
+            ),
+            (
+                {"recurrence": self.recurrence(weekdays=["fri", "fr"])},
+                "recurrence",
+            ),
+            (
+                {"recurrence": self.recurrence(date_to="2024-08-31")},
+                "recurrence",
+            ),
+            (
+                {"recurrence": self.recurrence(date_to="2024-09-05")},
+                "recurrence",
+            ),
+            (
+                {
+                    "recurrence": self.recurrence(
+                        weekdays=list(scheduling.WEEKDAYS),
+                        date_to="2027-09-01",
+                    )
+                },
+                "recurrence",
+            ),
+        ):
+            with self.subTest(data=data):
+                res = self.schedule(data)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(field, res.data)
+        self.assertEqual(Performance.objects.count(), 1)
+
+    def test_unknown_play_and_hall(self):
+        res = self.schedule(
+            {
+                "performances": [
+                    self.performance(at(3)) | {"play": 0},
+                    self.performance(at(4)) | {"theatre_hall": 0},
+                ]
+            }
+        )
+
+        self.assertEqual(
+            res.data["performances"],
+            ["Play 0 does not exist.", "Theatre hall 0 does not exist."],
+        )
+
+    def test_admin_only(self):
+        self.client.force_authenticate(
+            User.objects.create_user(email="user@test.com")
+        )
+
+        res = self.schedule({"recurrence": self.recurrence()})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
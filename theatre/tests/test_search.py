@@ -0,0 +1,246 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import search
+from theatre.models import Play, PlaySearchToken
+
+PLAY_URL = reverse("theatre:play-list")
+
+
+class TokenizeTest(SimpleTestCase):
+    def test_tokenize(self):
+        self.assertEqual(
+            search.tokenize("Cyrano de Bergerac: Héroïque_Comédie, 1897!"),
+            ["cyrano", "de", "bergerac", "heroique", "comedie", "1897"],
+        )
+        # Diacritics are folded in every script, as for queries.
+        self.assertEqual(
+            search.tokenize("Кайдашева сім'я"), ["каидашева", "сім", "я"]
+        )
+
+    def test_edit_distance(self):
+        for a, b, distance in (
+            ("hamlet", "hamlet", 0),
+            ("hamlet", "hamet", 1),
+            ("hamlet", "hamlte", 1),
+            ("hamlet", "gamlet", 1),
+            ("hamlet", "hamlets", 1),
+            ("hamlet", "omelet", 3),
+            ("", "abc", 3),
+        ):
+            with self.subTest(a=a, b=b):
+                self.assertEqual(search.edit_distance(a, b), distance)
+
+    def test_corrections(self):
+        vocabulary = search.Vocabulary(
+            dict.fromkeys(
+                ["hamlet", "helmet", "tempest", "shakespeare", "the"], 1
+            )
+        )
+
+        self.assertEqual(vocabulary.corrections("hamlte"), ["hamlet"])
+        self.assertEqual(vocabulary.corrections("shakspear"), ["shakespeare"])
+        self.assertEqual(vocabulary.corrections("tempets"), ["tempest"])
+        # Too short to guess.
+        self.assertEqual(vocabulary.corrections("teh"), [])
+
+    def test_completions(self):
+        vocabulary = search.Vocabulary(
+            {"king": 5, "kingdom": 2, "kings": 3, "kinz": 1, "kiosk": 4}
+        )
+
+        self.assertEqual(
+            vocabulary.completions("kin"), ["king", "kings", "kingdom", "kinz"]
+        )
+        self.assertEqual(vocabulary.completions("king"), ["kings", "kingdom"])
+        with patch.object(search, "MAX_EXPANSIONS", 2):
+            self.assertEqual(vocabulary.completions("k"), ["king", "kiosk"])
+
+    def test_update(self):
+        vocabulary = search.Vocabulary({"hamlet": 2, "king": 1})
+
+        vocabulary.update({"tempest": 1, "king": -1, "hamlet": -1})
+
+        self.assertEqual(vocabulary.corrections("tempets"), ["tempest"])
+        self.assertEqual(vocabulary.completions("te"), ["tempest"])
+        self.assertEqual(
+            vocabulary.matches(["hamlet"]), {"hamlet": {"hamlet": 1.0}}
+        )
+        # Without postings, as if it had never been indexed.
+        self.assertEqual(vocabulary.matches(["king"]), {"king": {}})
+        self.assertEqual(vocabulary.completions("ki"), [])
+
+
+class PlaySearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hamlet = Play.objects.create(
+            title="Hamlet", description="The prince of Denmark seeks revenge"
+        )
+        self.lear = Play.objects.create(
+            title="King Lear", description="An old king divides his kingdom"
+        )
+        self.prince = Play.objects.create(
+            title="The Little Prince", description="A pilot meets a boy"
+        )
+
+    def test_index_follows_saves(self):
+        self.assertEqual(
+            dict(
+                PlaySearchToken.objects.filter(play=self.lear).values_list(
+                    "token", "weight"
+                )
+            ),
+            {
+                "king": 4,
+                "lear": 3,
+                "an": 1,
+                "old": 1,
+                "divides": 1,
+                "his": 1,
+                "kingdom": 1,
+            },
+        )
+
+        self.lear.title = "Queen Lear"
+        self.lear.save()
+        self.assertEqual(search.search("queen"), [self.lear.id])
+        self.assertEqual(search.search("king"), [self.lear.id])
+
+        self.lear.delete()
+        self.assertFalse(
+            PlaySearchToken.objects.filter(play_id=self.lear.id).exists()
+        )
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(
+            search.search("prince"), [self.prince.id, self.hamlet.id]
+        )
+
+    def test_every_word_must_match(self):
+        self.assertEqual(search.search("prince denmark"), [self.hamlet.id])
+        self.assertEqual(search.search("prince lear"), [])
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(search.search("old kin"), [self.lear.id])
+        # Only the word being typed is a prefix.
+        self.assertEqual(search.search("ol king"), [])
+
+    def test_exact_match_ranks_above_prefix(self):
+        kingdom = Play.objects.create(title="Kingdom", description="")
+
+        self.assertEqual(search.search("king"), [self.lear.id, kingdom.id])
+
+    def test_rarest_word_picks_the_candidates(self):
+        Play.objects.create(title="Prince Igor", description="")
+
+        with patch.object(search, "MAX_CANDIDATES", 1):
+            self.assertEqual(
+                search.search("prince denmark"), [self.hamlet.id]
+            )
+            self.assertEqual(search.search("denmark prince"), [self.hamlet.id])
+
+    def test_typos(self):
+        self.assertEqual(search.search("hamlte"), [self.hamlet.id])
+        self.assertEqual(search.search("denmrak prince"), [self.hamlet.id])
+
+    def test_vocabulary_follows_new_plays(self):
+        self.assertEqual(search.search("tempets"), [])
+
+        tempest = Play.objects.create(title="The Tempest", description="")
+
+        self.assertEqual(search.search("tempets"), [tempest.id])
+
+    def test_vocabulary_is_updated_without_reading_the_index(self):
+        search.search("hamlet")
+
+        with patch.object(search, "Vocabulary") as vocabulary:
+            tempest = Play.objects.create(title="The Tempest", description="")
+            self.assertEqual(search.search("tempets"), [tempest.id])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                tempest.delete()
+            self.assertEqual(search.search("tempets"), [])
+        vocabulary.assert_not_called()
+
+    def test_vocabulary_is_read_again_when_the_journal_is_lost(self):
+        search.search("hamlet")
+        tempest = Play.objects.create(title="The Tempest", description="")
+
+        cache.clear()
+
+        self.assertEqual(search.search("tempets"), [tempest.id])
+
+    def test_searches_keep_the_vocabulary_while_it_is_read_again(self):
+        search.search("hamlet")
+        tempest = Play.objects.create(title="The Tempest", description="")
+        cache.clear()
+
+        with patch.object(search, "Vocabulary") as vocabulary:
+            with search._read_lock:
+                self.assertEqual(search.search("hamlet"), [self.hamlet.id])
+                self.assertEqual(search.search("tempets"), [])
+        vocabulary.assert_not_called()
+
+        self.assertEqual(search.search("tempets"), [tempest.id])
+
+    def test_reindex_plays(self):
+        PlaySearchToken.objects.all().delete()
+        cache.clear()
+        out = StringIO()
+
+        call_command("reindex_plays", stdout=out)
+
+        self.assertIn("Indexed 3 play(s).", out.getvalue())
+        self.assertEqual(search.search("hamlet"), [self.hamlet.id])
+        self.assertEqual(search.search("king"), [self.lear.id])
+
+
+class VocabularyWarmUpTest(TransactionTestCase):
+    def test_read_vocabulary_in_background(self):
+        Play.objects.create(title="Hamlet", description="")
+        cache.clear()
+
+        with patch.object(search, "_vocabulary", (None, None)):
+            search.read_vocabulary_in_background().join()
+
+            self.assertEqual(search._vocabulary[1].frequencies, {"hamlet": 1})
+
+
+class PlaySearchApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(
+            get_user_model().objects.create_user(email="user@test.com")
+        )
+        self.macbeth = Play.objects.create(
+            title="Macbeth", description="A Scottish general's ambition"
+        )
+        self.general = Play.objects.create(
+            title="The General", description="A silent comedy"
+        )
+
+    def test_search(self):
+        res = self.client.get(PLAY_URL, {"search": "general"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [play["id"] for play in res.data["results"]],
+            [self.general.id, self.macbeth.id],
+        )
+
+    def test_search_with_title_filter(self):
+        res = self.client.get(PLAY_URL, {"search": "genral", "title": "mac"})
+
+        self.assertEqual(
+            [play["id"] for play in res.data["results"]], [self.macbeth.id]
+        )
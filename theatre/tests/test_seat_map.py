@@ -0,0 +1,290 @@
+import base64
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from theatre import events
+from theatre.models import (
+    TheatreHall,
+    Play,
+    Performance,
+    Reservation,
+    Ticket,
+)
+from theatre.seat_map import SeatMap
+
+User = get_user_model()
+
+
+class SeatMapTest(TestCase):
+    def test_take_and_release(self):
+        seat_map = SeatMap(rows=3, seats_in_row=5)
+        self.assertTrue(seat_map.take(2, 3))
+        self.assertFalse(seat_map.take(2, 3))
+        self.assertTrue(seat_map.is_taken(2, 3))
+        self.assertEqual(seat_map.count(), 1)
+        self.assertTrue(seat_map.release(2, 3))
+        self.assertFalse(seat_map.release(2, 3))
+        self.assertEqual(seat_map.count(), 0)
+
+    def test_seat_outside_hall(self):
+        seat_map = SeatMap(rows=3, seats_in_row=5)
+        with self.assertRaises(ValueError):
+            seat_map.take(4, 1)
+        with self.assertRaises(ValueError):
+            seat_map.take(1, 6)
+
+    def test_packed_layout(self):
+        seat_map = SeatMap(rows=2, seats_in_row=5)
+        seat_map.take(1, 1)
+        seat_map.take(2, 5)
+        self.assertEqual(seat_map.to_bytes(), bytes([0b10000000, 0b01000000]))
+        self.assertEqual(
+            base64.b64decode(seat_map.to_base64()), seat_map.to_bytes()
+        )
+
+    def test_taken_and_row_ranges(self):
+        seat_map = SeatMap(rows=3, seats_in_row=10)
+        for row, seat in [(3, 1), (1, 2), (1, 3), (1, 4), (1, 7), (3, 10)]:
+            seat_map.take(row, seat)
+        self.assertEqual(
+            list(seat_map.taken()),
+            [(1, 2), (1, 3), (1, 4), (1, 7), (3, 1), (3, 10)],
+        )
+        self.assertEqual(
+            seat_map.row_ranges(),
+            [
+                {"row": 1, "seats": [[2, 4], [7, 7]]},
+                {"row": 3, "seats": [[1, 1], [10, 10]]},
+            ],
+        )
+
+    def test_data_is_resized_to_hall(self):
+        seat_map = SeatMap(rows=2, seats_in_row=4, data=b"\xff\xff\xff")
+        self.assertEqual(len(seat_map.to_bytes()), 1)
+        self.assertEqual(SeatMap(rows=4, seats_in_row=4).to_bytes(), b"\0\0")
+
+
+class PerformanceTicketsMixin:
+    def setUp(self):
+        self.hall = TheatreHall.objects.create(
+            name="Main Hall", rows=10, seats_in_row=20
+        )
+        self.play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z",
+            play=self.play,
+            theatre_hall=self.hall,
+        )
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.reservation = Reservation.objects.create(user=self.user)
+
+    def create_ticket(self, row, seat):
+        return Ticket.objects.create(
+            row=row,
+            seat=seat,
+            performance=self.performance,
+            reservation=self.reservation,
+        )
+
+
+class PerformanceSeatBitmapTest(PerformanceTicketsMixin, TestCase):
+    def test_bitmap_follows_ticket_writes(self):
+        ticket = self.create_ticket(5, 10)
+        self.create_ticket(1, 1)
+        self.performance.refresh_from_db()
+        self.assertEqual(
+            list(self.performance.seat_map.taken()), [(1, 1), (5, 10)]
+        )
+        self.assertEqual(self.performance.tickets_sold, 2)
+        self.assertEqual(self.performance.tickets_available, 198)
+
+        ticket.delete()
+        self.performance.refresh_from_db()
+        self.assertEqual(list(self.performance.seat_map.taken()), [(1, 1)])
+        self.assertEqual(self.performance.tickets_sold, 1)
+
+    def test_bitmap_follows_reservation_delete(self):
+        self.create_ticket(2, 2)
+        self.create_ticket(2, 3)
+        self.reservation.delete()
+        self.performance.refresh_from_db()
+        self.assertEqual(self.performance.seat_map.count(), 0)
+        self.assertEqual(self.performance.tickets_sold, 0)
+
+    def test_bitmap_follows_moved_ticket(self):
+        ticket = self.create_ticket(3, 3)
+        ticket.seat = 4
+        ticket.save()
+        self.performance.refresh_from_db()
+        self.assertEqual(list(self.performance.seat_map.taken()), [(3, 4)])
+
+    def test_rebuild_seat_map(self):
+        self.create_ticket(4, 4)
+        Performance.objects.filter(pk=self.performance.pk).update(
+            seat_bitmap=b"", tickets_sold=0
+        )
+        performance = Performance.rebuild_seat_map(self.performance.pk)
+        self.assertEqual(list(performance.seat_map.taken()), [(4, 4)])
+        self.assertEqual(performance.tickets_sold, 1)
+
+
+class HallResizeTest(PerformanceTicketsMixin, TestCase):
+    def test_resize_rebuilds_bitmaps(self):
+        self.create_ticket(2, 1)
+        self.create_ticket(10, 20)
+
+        with patch.object(events, "publish_seats") as publish_seats:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.hall.seats_in_row = 23
+                self.hall.save()
+
+        self.performance.refresh_from_db()
+        self.assertEqual(
+            list(self.performance.seat_map.taken()), [(2, 1), (10, 20)]
+        )
+        self.assertEqual(self.performance.tickets_sold, 2)
+        # The same seats are taken, so there is nothing to announce.
+        publish_seats.assert_not_called()
+
+    def test_resize_cannot_drop_sold_seats(self):
+        self.create_ticket(10, 20)
+
+        for rows, seats_in_row in ((9, 20), (10, 19)):
+            self.hall.rows, self.hall.seats_in_row = rows, seats_in_row
+            with self.subTest(rows=rows, seats_in_row=seats_in_row):
+                with self.assertRaises(ValidationError):
+                    self.hall.full_clean()
+
+        self.hall.rows, self.hall.seats_in_row = 11, 20
+        self.hall.full_clean()
+
+
+class RebuildSeatStatsCommandTest(PerformanceTicketsMixin, TestCase):
+    def call_command(self, *args):
+        out = StringIO()
+        call_command("rebuild_seat_stats", *args, stdout=out)
+        return out.getvalue()
+
+    def test_verify_in_sync(self):
+        self.create_ticket(1, 1)
+
+        out = self.call_command("--verify")
+
+        self.assertIn("1 performance(s) are in sync.", out)
+
+    def test_verify_reports_mismatch(self):
+        self.create_ticket(1, 1)
+        Performance.objects.filter(pk=self.performance.pk).update(
+            tickets_sold=5
+        )
+
+        with self.assertRaisesMessage(
+            CommandError, "1 of 1 performance(s) are out of sync."
+        ):
+            self.call_command("--verify")
+
+    def test_rebuild_mismatched(self):
+        self.create_ticket(1, 1)
+        self.create_ticket(1, 2)
+        Performance.objects.filter(pk=self.performance.pk).update(
+            tickets_sold=0, seat_bitmap=b""
+        )
+
+        out = self.call_command(str(self.performance.pk))
+
+        self.assertIn(
+            f"Performance {self.performance.pk}: counter 0, seat map 0, "
+            f"tickets 2",
+            out,
+        )
+        self.assertIn("Rebuilt 1 of 1 performance(s).", out)
+        self.performance.refresh_from_db()
+        self.assertEqual(self.performance.tickets_sold, 2)
+        self.assertEqual(
+            list(self.performance.seat_map.taken()), [(1, 1), (1, 2)]
+        )
+
+
+class PerformanceSeatMapApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            email="testuser@test.com", password="testpass"
+        )
+        self.client.force_authenticate(self.user)
+        hall = TheatreHall.objects.create(
+            name="Main Hall", rows=3, seats_in_row=4
+        )
+        play = Play.objects.create(
+            title="Hamlet", description="A Shakespeare play"
+        )
+        self.performance = Performance.objects.create(
+            show_time="2024-08-01T19:00:00Z", play=play, theatre_hall=hall
+        )
+        reservation = Reservation.objects.create(user=self.user)
+        for row, seat in [(1, 1), (1, 2), (3, 4)]:
+            Ticket.objects.create(
+                row=row,
+                seat=seat,
+                performance=self.performance,
+                reservation=reservation,
+            )
+        self.url = reverse(
+            "theatre:performance-detail", args=[self.performance.id]
+        )
+
+    def test_retrieve_serves_seats_from_bitmap(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data["taken_places"],
+            [
+                {"row": 1, "seat": 1},
+                {"row": 1, "seat": 2},
+                {"row": 3, "seat": 4},
+            ],
+        )
+        self.assertEqual(
+            res.data["seat_map"],
+            {
+                "rows": 3,
+                "seats_in_row": 4,
+                "encoding": "base64",
+                "data": base64.b64encode(bytes([0b11000000, 0b00010000])).decode(),
+            },
+        )
+
+    def test_retrieve_seat_map_as_ranges(self):
+        res = self.client.get(self.url, {"seat_map": "ranges"})
+
+        self.assertEqual(
+            res.data["seat_map"]["data"],
+            [
+                {"row": 1, "seats": [[1, 2]]},
+                {"row": 3, "seats": [[4, 4]]},
+            ],
+        )
+
+    def test_list_reads_availability_from_counter(self):
+        with self.assertNumQueries(1):
+            res = self.client.get(reverse("theatre:performance-list"))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"][0]["tickets_available"], 9)
@@ -3,10 +3,12 @@ from rest_framework import routers
 from theatre.views import (
     GenreViewSet,
     ActorViewSet,
+    ExportViewSet,
     TheatreHallViewSet,
     PlayViewSet,
     PerformanceViewSet,
     ReservationViewSet,
+    SeatHoldViewSet,
     TicketViewSet,
 )
 
@@ -18,7 +20,9 @@ router.register("theatre_halls", TheatreHallViewSet)
 router.register("plays", PlayViewSet)
 router.register("performances", PerformanceViewSet)
 router.register("reservations", ReservationViewSet)
+router.register("holds", SeatHoldViewSet, basename="hold")
 router.register("tickets", TicketViewSet)
+router.register("exports", ExportViewSet, basename="export")
 
 urlpatterns = router.urls
 
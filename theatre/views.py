@@ -1,20 +1,41 @@
-from datetime import datetime
+from datetime import date as date_type, datetime, timedelta
 
-from django.db.models import Count, F
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from rest_framework import mixins
-from rest_framework.permissions import IsAuthenticated
+from django.db.models import Prefetch
+from django.http import Http404
+from rest_framework import mixins, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from theatre import caching, exports, filters, holds, idempotency, search
+from theatre.fast_lists import (
+    FastListMixin,
+    PerformanceValuesSerializer,
+    ReservationValuesSerializer,
+)
+from theatre.idempotency import IdempotentCreateMixin
+
+from theatre.pagination import (
+    PerformancePagination,
+    ReservationHistoryPagination,
+    ReservationPagination,
+    TicketPagination,
+)
 from theatre.models import (
     Genre,
     Actor,
     TheatreHall,
     Play,
     Performance,
-    Reservation, Ticket,
+    Reservation,
+    ReservationSummary,
+    Ticket,
 )
 from theatre.permissions import IsAdminOrIfAuthenticatedReadOnly
+from theatre.renderers import CSVRenderer, NDJSONRenderer
+from theatre_service.db_router import ReplicaReadMixin, pin_to_primary
 from theatre.serializers import (
     GenreSerializer,
     ActorSerializer,
@@ -23,13 +44,19 @@ from theatre.serializers import (
     PerformanceSerializer,
     PerformanceDetailSerializer,
     PerformanceListSerializer,
+    PerformanceScheduleSerializer,
     ReservationSerializer,
     ReservationListSerializer,
+    ReservationSummarySerializer,
+    SeatAllocationSerializer,
+    SeatHoldSerializer,
     TicketSerializer,
 )
 
 
 class GenreViewSet(
+    ReplicaReadMixin,
+    caching.ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     GenericViewSet,
@@ -38,8 +65,13 @@ class GenreViewSet(
     serializer_class = GenreSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def get_cache_versions(self):
+        return ["genres"]
+
 
 class ActorViewSet(
+    ReplicaReadMixin,
+    caching.ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     GenericViewSet,
@@ -48,8 +80,13 @@ class ActorViewSet(
     serializer_class = ActorSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def get_cache_versions(self):
+        return ["actors"]
+
 
 class TheatreHallViewSet(
+    ReplicaReadMixin,
+    caching.ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     GenericViewSet,
@@ -58,8 +95,13 @@ class TheatreHallViewSet(
     serializer_class = TheatreHallSerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def get_cache_versions(self):
+        return ["theatre_halls"]
+
 
 class PlayViewSet(
+    ReplicaReadMixin,
+    caching.ConditionalGetMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
@@ -69,14 +111,22 @@ class PlayViewSet(
     serializer_class = PlaySerializer
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
 
+    def get_cache_versions(self):
+        if self.action == "retrieve":
+            return [f"plays:{self.kwargs['pk']}"]
+        return ["plays"]
+
     def get_queryset(self):
         title = self.request.query_params.get("title")
+        query = self.request.query_params.get("search")
 
         queryset = self.queryset
 
         if title:
             queryset = queryset.filter(title__icontains=title)
-        return queryset.distinct()
+        if query:
+            queryset = search.search_plays(queryset, query)
+        return queryset
 
     @extend_schema(
         parameters=[
@@ -85,46 +135,111 @@ class PlayViewSet(
                 type=str,
                 description="Filter by title name (ex. ?title=Wick)",
             ),
+            OpenApiParameter(
+                name="search",
+                type=str,
+                description=(
+                    "Search titles and descriptions, best matches first; "
+                    "the last word may be a prefix and longer words may "
+                    "have typos (ex. ?search=hamlet prin)"
+                ),
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
 
 class PerformanceViewSet(
+    ReplicaReadMixin,
+    caching.ConditionalGetMixin,
+    caching.CachedResponseMixin,
+    FastListMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     mixins.RetrieveModelMixin,
     GenericViewSet,
 ):
-    queryset = (
-        Performance.objects.all()
-        .select_related("play", "theatre_hall")
-        .annotate(
-            tickets_available=(
-                    F("theatre_hall__rows") * F("theatre_hall__seats_in_row")
-                    - Count("tickets")
-            )
-        )
-    )
+    queryset = Performance.objects.all().select_related("play", "theatre_hall")
     serializer_class = PerformanceSerializer
+    values_serializer_class = PerformanceValuesSerializer
+    pagination_class = PerformancePagination
     permission_classes = (IsAdminOrIfAuthenticatedReadOnly,)
+    replica_actions = ("list",)
+
+    def get_cache_versions(self):
+        if self.action == "retrieve":
+            return ["performances", f"performances:{self.kwargs['pk']}"]
 
-    def get_queryset(self):
         date = self.request.query_params.get("date")
-        play_id_str = self.request.query_params.get("play")
+        try:
+            date = datetime.strptime(date, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            return ["performances", "performances:tickets"]
+        return ["performances", f"performances:day:{date.isoformat()}"]
+
+    def get_current_versions(self):
+        if getattr(self, "_current_versions", None) is None:
+            # Responses show held seats, and holds expire without a write:
+            # reaping them bumps the stamps of their performances, so it
+            # has to happen before the stamps are read.
+            pk = self.kwargs.get("pk", "")
+            holds.reap_expired([int(pk)] if pk.isdigit() else [])
+        return super().get_current_versions()
+
+    def get_queryset(self):
+        params = self.request.query_params
+        date = filters.parse_date(params, "date")
+        date_from = filters.parse_date(params, "date_from")
+        date_to = filters.parse_date(params, "date_to")
+        play_ids = filters.parse_ids(params, "play")
 
         queryset = self.queryset
 
         if date:
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-            queryset = queryset.filter(show_time__date=date)
+            queryset = queryset.filter(
+                show_time__gte=filters.day_start(date),
+                show_time__lt=filters.day_start(date + timedelta(days=1)),
+            )
+
+        if date_from:
+            queryset = queryset.filter(
+                show_time__gte=filters.day_start(date_from)
+            )
+
+        if date_to:
+            queryset = queryset.filter(
+                show_time__lt=filters.day_start(date_to + timedelta(days=1))
+            )
 
-        if play_id_str:
-            queryset = queryset.filter(play_id=int(play_id_str))
+        if play_ids is not None:
+            queryset = queryset.filter(play_id__in=play_ids)
+
+        if self.action == "list":
+            queryset = queryset.defer("seat_bitmap")
 
         return queryset
 
+    def get_serializer(self, *args, **kwargs):
+        if self.action == "list" and args:
+            kwargs.setdefault("context", self.get_serializer_context())
+            kwargs["context"]["held_seats"] = holds.held_seat_counts(
+                performance.id for performance in args[0]
+            )
+        return super().get_serializer(*args, **kwargs)
+
+    def get_values_serializer_context(self, rows):
+        context = super().get_values_serializer_context(rows)
+        context["held_seats"] = holds.held_seat_counts(
+            row["id"] for row in rows
+        )
+        return context
+
     def get_serializer_class(self):
         if self.action == "list":
             return PerformanceListSerializer
@@ -132,19 +247,39 @@ class PerformanceViewSet(
         if self.action == "retrieve":
             return PerformanceDetailSerializer
 
+        if self.action == "allocate":
+            return SeatAllocationSerializer
+
+        if self.action == "schedule":
+            return PerformanceScheduleSerializer
+
         return PerformanceSerializer
 
     @extend_schema(
         parameters=[
             OpenApiParameter(
                 name="date",
-                type=datetime,
+                type=date_type,
                 description="Filter by date (ex. ?date=2012-05-22)",
             ),
+            OpenApiParameter(
+                name="date_from",
+                type=date_type,
+                description=(
+                    "Filter by first date, inclusive (ex. ?date_from=2012-05-22)"
+                ),
+            ),
+            OpenApiParameter(
+                name="date_to",
+                type=date_type,
+                description=(
+                    "Filter by last date, inclusive (ex. ?date_to=2012-05-29)"
+                ),
+            ),
             OpenApiParameter(
                 name="play",
                 type={"type": "array", "items": {"type": "number"}},
-                description="Filter by plays id (ex. ?plays=2,3)"
+                description="Filter by plays id (ex. ?play=2,3)"
             ),
         ]
     )
@@ -152,25 +287,159 @@ class PerformanceViewSet(
         """Get list of movies."""
         return super().list(request, *args, **kwargs)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="seat_map",
+                type=str,
+                enum=PerformanceDetailSerializer.SEAT_MAP_FORMATS,
+                description=(
+                    "Encoding of the seat map: packed base64 bitmap "
+                    "(default) or taken seat ranges per row "
+                    "(ex. ?seat_map=ranges)"
+                ),
+            ),
+        ]
+    )
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache_stats",
+        permission_classes=(IsAdminUser,),
+    )
+    def cache_stats(self, request):
+        """Hit and miss counts of the performance response cache."""
+        return Response(caching.get_stats())
+
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=(IsAdminUser,),
+    )
+    def schedule(self, request):
+        """Create many performances at once, from a list or from a weekly
+        recurrence, none of them overlapping another one in its hall."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=True,
+        methods=["post"],
+        permission_classes=(IsAuthenticated,),
+    )
+    def allocate(self, request, pk=None):
+        """Find, and optionally hold, the best block of adjacent free seats.
+
+        Blocks near the centre of a row and rows near the middle of the hall
+        score best; ``rows`` limits the search to the given rows.
+        """
+        context = self.get_serializer_context()
+        context["performance"] = self.get_object()
+        serializer = self.get_serializer(data=request.data, context=context)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(
+            serializer.data,
+            status=(
+                status.HTTP_201_CREATED
+                if serializer.data["hold"]
+                else status.HTTP_200_OK
+            ),
+        )
+
 
 class ReservationViewSet(
+    FastListMixin,
+    IdempotentCreateMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
     GenericViewSet,
 ):
     queryset = Reservation.objects.prefetch_related(
-        "tickets__performance__play", "tickets__performance__theatre_hall"
+        Prefetch(
+            "tickets__performance",
+            queryset=Performance.objects.select_related(
+                "play", "theatre_hall"
+            ).defer("seat_bitmap"),
+        )
     )
     serializer_class = ReservationSerializer
+    values_serializer_class = ReservationValuesSerializer
+    pagination_class = ReservationPagination
     permission_classes = (IsAuthenticated,)
 
+    def get_queryset(self):
+        if self.action == "history":
+            queryset = ReservationSummary.objects.all()
+        else:
+            queryset = self.queryset
+        return queryset.filter(user=self.request.user)
+
     def get_serializer_class(self):
         if self.action == "list":
             return ReservationListSerializer
+        if self.action == "history":
+            return ReservationSummarySerializer
         return ReservationSerializer
 
+    @action(
+        detail=False,
+        methods=["get"],
+        pagination_class=ReservationHistoryPagination,
+    )
+    def history(self, request):
+        """The user's reservations, newest first, as summaries of their
+        tickets' performances."""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name=idempotency.HEADER,
+                type=str,
+                location=OpenApiParameter.HEADER,
+                description="Client generated key; retries sent with the "
+                "same key get the response of the first request",
+            ),
+        ]
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+        pin_to_primary(self.request.user)
+
+
+class SeatHoldViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    GenericViewSet,
+):
+    """Hold seats for a few minutes before turning them into a reservation."""
+
+    serializer_class = SeatHoldSerializer
+    permission_classes = (IsAuthenticated,)
+    lookup_value_regex = "[0-9a-f]{32}"
+
+    def get_object(self):
+        hold = holds.get_hold(self.kwargs["pk"])
+        if hold is None or hold["user"] != self.request.user.id:
+            raise Http404
+        return hold
+
+    def perform_destroy(self, instance):
+        holds.release_hold(instance)
 
 
 class TicketViewSet(
@@ -179,4 +448,101 @@ class TicketViewSet(
 ):
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    pagination_class = TicketPagination
     permission_classes = (IsAuthenticated,)
+
+
+class ExportViewSet(GenericViewSet):
+    """Full exports of tickets and reservations for reconciliation, streamed
+    as NDJSON (default) or CSV, chosen with ``?format=`` or the Accept
+    header."""
+
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (NDJSONRenderer, CSVRenderer)
+    pagination_class = None
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="performance",
+                type={"type": "array", "items": {"type": "number"}},
+                description="Filter by performances id (ex. ?performance=2,3)",
+            ),
+            OpenApiParameter(
+                name="play",
+                type={"type": "array", "items": {"type": "number"}},
+                description="Filter by plays id (ex. ?play=2,3)",
+            ),
+            OpenApiParameter(
+                name="date_from",
+                type=date_type,
+                description=(
+                    "Filter by first show date, inclusive "
+                    "(ex. ?date_from=2012-05-22)"
+                ),
+            ),
+            OpenApiParameter(
+                name="date_to",
+                type=date_type,
+                description=(
+                    "Filter by last show date, inclusive "
+                    "(ex. ?date_to=2012-05-29)"
+                ),
+            ),
+        ]
+    )
+    @action(detail=False, methods=["get"])
+    def tickets(self, request):
+        """Every ticket with its reservation, performance and play."""
+        return exports.stream(
+            exports.tickets(request.query_params),
+            exports.TICKET_COLUMNS,
+            request.accepted_renderer,
+            "tickets",
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="performance",
+                type={"type": "array", "items": {"type": "number"}},
+                description=(
+                    "Only reservations with tickets for these performances "
+                    "(ex. ?performance=2,3)"
+                ),
+            ),
+            OpenApiParameter(
+                name="play",
+                type={"type": "array", "items": {"type": "number"}},
+                description=(
+                    "Only reservations with tickets for these plays "
+                    "(ex. ?play=2,3)"
+                ),
+            ),
+            OpenApiParameter(
+                name="date_from",
+                type=date_type,
+                description=(
+                    "Only reservations with tickets for shows from this "
+                    "date, inclusive (ex. ?date_from=2012-05-22)"
+                ),
+            ),
+            OpenApiParameter(
+                name="date_to",
+                type=date_type,
+                description=(
+                    "Only reservations with tickets for shows until this "
+                    "date, inclusive (ex. ?date_to=2012-05-29)"
+                ),
+            ),
+        ]
+    )
+    @action(detail=False, methods=["get"])
+    def reservations(self, request):
+        """Every reservation with its owner and number of tickets."""
+        return exports.stream(
+            exports.reservations(request.query_params),
+            exports.RESERVATION_COLUMNS,
+            request.accepted_renderer,
+            "reservations",
+        )
@@ -3,6 +3,11 @@ ASGI config for theatre_service project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Live seat updates (``/api/theatre/performances/{id}/events/``) are streamed
+by ``theatre.sse.SeatEventsMiddleware`` in front of Django, which also
+handles the lifespan protocol to close event subscriptions and pooled
+database connections on shutdown.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -12,5 +17,16 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'theatre_service.settings')
+# Settings pool PostgreSQL connections by default when this is set.
+os.environ['SERVING_ASGI'] = '1'
+
+django_application = get_asgi_application()
+
+# Imported once Django is set up, since they depend on the models.
+from theatre import search  # noqa: E402
+from theatre.sse import SeatEventsMiddleware  # noqa: E402
+
+application = SeatEventsMiddleware(django_application)
 
-application = get_asgi_application()
+# Read the search vocabulary now rather than on the first search.
+search.read_vocabulary_in_background()
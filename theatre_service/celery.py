@@ -11,6 +11,9 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
 
+# Connects the task timing signal handlers.
+from theatre_service import metrics  # noqa: E402,F401
+
 
 @app.task(bind=True)
 def debug_task(self):
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.checks import Info, Warning, register
+
+POOLED_ENGINE = "theatre_service.db.postgresql"
+
+
+@register()
+def check_connection_pools(app_configs, **kwargs):
+    return pool_messages(settings.DATABASES)
+
+
+def pool_messages(databases):
+    """Report the connection pool of every database that has one."""
+    messages = []
+    for alias, database in databases.items():
+        pool = database.get("OPTIONS", {}).get("pool")
+        if pool is None:
+            continue
+        if database["ENGINE"] != POOLED_ENGINE:
+            messages.append(
+                Warning(
+                    f"Database '{alias}' has pool options but its engine, "
+                    f"{database['ENGINE']}, does not pool connections.",
+                    hint=f"Use the {POOLED_ENGINE} engine.",
+                    id="theatre_service.W001",
+                )
+            )
+            continue
+        if database.get("CONN_MAX_AGE"):
+            messages.append(
+                Warning(
+                    f"Database '{alias}' pools connections but keeps them "
+                    f"for CONN_MAX_AGE={database['CONN_MAX_AGE']} seconds "
+                    f"instead of returning them after each request.",
+                    hint="Set CONN_MAX_AGE to 0.",
+                    id="theatre_service.W002",
+                )
+            )
+        messages.append(
+            Info(
+                f"Database '{alias}' pools up to {pool.get('max_size', 10)} "
+                f"connections per process, waiting up to "
+                f"{pool.get('timeout', 30.0)}s for a free one.",
+                id="theatre_service.I001",
+            )
+        )
+    return messages
@@ -0,0 +1,148 @@
+"""In-process pool of database connections.
+
+Under ASGI, Django runs the synchronous parts of each request in whichever
+worker thread is free, so persistent connections (``CONN_MAX_AGE``), which
+belong to a thread, are rarely reused. A pool is shared by all the threads
+of a process instead: connections are borrowed when a request first needs
+the database and given back when Django closes them at the end of the
+request.
+"""
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Keep up to ``max_size`` DB-API connections, idle ones last in first
+    out so the warmest are reused.
+
+    Callers wait up to ``timeout`` seconds for a connection when all of them
+    are in use. A connection idle for more than ``check_after`` seconds is
+    checked with ``SELECT 1`` before it is handed out; ``None`` disables the
+    check.
+    """
+
+    def __init__(self, max_size=10, timeout=30.0, check_after=30.0):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = deque()
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, connect):
+        """Return an idle connection or one made by ``connect()``."""
+        while True:
+            connection, idle_since = self._checkout()
+            if connection is None:
+                try:
+                    return connect()
+                except BaseException:
+                    self._discard(None)
+                    raise
+            if self._usable(connection, idle_since):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection):
+        try:
+            # Leaves no transaction open; a no-op for an idle connection.
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+        if connection.closed:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Close the idle connections; those in use are closed when they are
+        released."""
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+            self._size -= len(idle)
+            self.max_size = 0
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+            }
+
+    def _checkout(self):
+        deadline = time.monotonic() + self.timeout
+        with self._condition:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        f"No database connection became free within "
+                        f"{self.timeout} seconds ({self._size} in use)."
+                    )
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+            return None, None
+
+    def _usable(self, connection, idle_since):
+        if connection.closed:
+            return False
+        if (
+            self.check_after is None
+            or time.monotonic() - idle_since <= self.check_after
+        ):
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, connection):
+        if connection is not None:
+            self._close(connection)
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, options):
+    """Pool registered under ``key``, created with ``options`` (the keyword
+    arguments of ``ConnectionPool``) on first use."""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**options)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
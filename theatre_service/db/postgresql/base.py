@@ -0,0 +1,52 @@
+"""PostgreSQL backend borrowing connections from ``theatre_service.db.pool``.
+
+Configured like ``django.db.backends.postgresql``, with the pool settings,
+the keyword arguments of ``ConnectionPool``, in ``OPTIONS["pool"]``.
+``CONN_MAX_AGE`` should be 0 so connections go back to the pool at the end
+of each request.
+"""
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+
+from theatre_service.db.pool import PoolTimeout, get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    @property
+    def pool(self):
+        # Keyed by the database too: the test runner points an alias at the
+        # test database after connecting to the real one.
+        key = tuple(
+            self.settings_dict[name]
+            for name in ("NAME", "USER", "HOST", "PORT")
+        )
+        return get_pool(
+            (self.alias, *key), self.settings_dict["OPTIONS"]["pool"]
+        )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("pool", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e)) from e
+        # Set by the parent when it opens a connection; pooled connections
+        # keep the isolation level they were opened with.
+        self.isolation_level = IsolationLevel(
+            self.settings_dict["OPTIONS"].get(
+                "isolation_level", IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(self.connection)
@@ -0,0 +1,95 @@
+"""Read replica routing.
+
+Reads go to the database alias held by a context variable, which is unset,
+and so the primary (``default``), unless a view sets it for the duration of
+a request. ``ReplicaReadMixin`` does so for the safe actions a viewset lists
+in ``replica_actions``, picking one of ``settings.DATABASE_REPLICAS``, except
+for users who wrote recently: ``pin_to_primary`` keeps a user on the primary
+for ``DATABASE_PRIMARY_PIN_SECONDS`` so they read their own writes despite
+replication lag. Writes always go to the primary.
+
+A replica may lag behind version stamps already bumped on the primary, so
+responses read from one are cached and validated only for
+``REPLICA_RESPONSE_CACHE_TIMEOUT`` seconds, while pages built on the primary
+are served to replica readers as they are (see ``theatre.caching``).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+_read_database = ContextVar("read_database", default=None)
+
+
+def read_database():
+    """Alias reads of the current context go to."""
+    return _read_database.get() or PRIMARY
+
+
+def reading_from_replica():
+    return read_database() != PRIMARY
+
+
+@contextmanager
+def reading_from(alias):
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def _pin_key(user_id):
+    return f"db:primary:{user_id}"
+
+
+def pin_to_primary(user):
+    if settings.DATABASE_REPLICAS and user.is_authenticated:
+        cache.set(_pin_key(user.id), 1, settings.DATABASE_PRIMARY_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(_pin_key(user.id)) is not None
+
+
+def replica_for(user):
+    """Replica alias for a read by ``user``, or None to read the primary."""
+    if not settings.DATABASE_REPLICAS or is_pinned(user):
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+class ReplicaReadMixin:
+    """Serve ``replica_actions`` on safe methods from a replica."""
+
+    replica_actions = ("list", "retrieve")
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            request.method in SAFE_METHODS
+            and self.action in self.replica_actions
+        ):
+            _read_database.set(replica_for(request.user))
@@ -0,0 +1,208 @@
+"""Prometheus metrics of the API and of the Celery workers.
+
+``MetricsMiddleware`` records, per route, the request latency, the number
+and total time of database queries (through a connection execute wrapper)
+and the time spent rendering the response data. Routes are labelled with
+the URL pattern name, never the path, so the number of series stays bounded
+by the URL configuration.
+
+Metrics are served by ``metrics_view`` at ``/metrics`` to the addresses in
+``METRICS_ALLOWED_IPS`` and to requests carrying ``METRICS_TOKEN`` as a
+bearer token; everyone else gets a 403. When several
+processes serve the API or run tasks, set ``PROMETHEUS_MULTIPROC_DIR`` to a
+directory shared by all of them so the view reports their combined values.
+"""
+import hmac
+import os
+import time
+from contextlib import ExitStack
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request.",
+    ["route", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries run by a request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time a request spent waiting on database queries.",
+    ["route"],
+)
+RESPONSE_RENDER_TIME = Histogram(
+    "http_response_render_duration_seconds",
+    "Time spent rendering the data of a response, e.g. to JSON.",
+    ["route"],
+)
+
+RESERVATIONS_CREATED = Counter(
+    "theatre_reservations_created",
+    "Reservations committed.",
+)
+TICKETS_SOLD = Counter(
+    "theatre_tickets_sold",
+    "Seats taken by committed tickets.",
+)
+RESPONSE_CACHE_HITS = Counter(
+    "theatre_response_cache_hits",
+    "Responses served from the response cache.",
+    ["route"],
+)
+RESPONSE_CACHE_MISSES = Counter(
+    "theatre_response_cache_misses",
+    "Responses built because the response cache had no entry.",
+    ["route"],
+)
+SEAT_CONFLICTS = Counter(
+    "theatre_seat_conflicts",
+    "Seats refused because they were already taken, held or lost to a "
+    "concurrent reservation.",
+    ["reason"],
+)
+
+CELERY_TASK_RUNTIME = Histogram(
+    "celery_task_duration_seconds",
+    "Time a Celery task spent running.",
+    ["task", "state"],
+)
+CELERY_TASK_QUEUE_TIME = Histogram(
+    "celery_task_queue_duration_seconds",
+    "Time between publishing a Celery task and a worker starting it.",
+    ["task"],
+)
+
+
+def count_seat_conflicts(**reasons):
+    """Count refused seats, given as ``reason=number of seats``."""
+    for reason, seats in reasons.items():
+        if seats:
+            SEAT_CONFLICTS.labels(reason).inc(seats)
+
+
+def route_of(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None or not match.view_name:
+        return UNMATCHED_ROUTE
+    return match.view_name
+
+
+class QueryTimer:
+    """Execute wrapper adding up the number and duration of queries."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+
+        route = route_of(request)
+        if route == "metrics":
+            return response
+        method = request.method if request.method in METHODS else "other"
+        REQUEST_LATENCY.labels(
+            route, method, f"{response.status_code // 100}xx"
+        ).observe(time.perf_counter() - started)
+        REQUEST_DB_QUERIES.labels(route).observe(timer.queries)
+        REQUEST_DB_TIME.labels(route).observe(timer.duration)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns.
+        started = time.perf_counter()
+        route = route_of(request)
+        response.add_post_render_callback(
+            lambda rendered: RESPONSE_RENDER_TIME.labels(route).observe(
+                time.perf_counter() - started
+            )
+        )
+        return response
+
+
+def metrics_allowed(request):
+    if request.META.get("REMOTE_ADDR") in settings.METRICS_ALLOWED_IPS:
+        return True
+    token = settings.METRICS_TOKEN
+    if not token:
+        return False
+    return hmac.compare_digest(
+        request.META.get("HTTP_AUTHORIZATION", "").encode(),
+        f"Bearer {token}".encode(),
+    )
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+@before_task_publish.connect
+def stamp_task_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+
+@task_prerun.connect
+def start_task_timer(task=None, **kwargs):
+    task.request.metrics_started_at = time.perf_counter()
+    published_at = getattr(task.request, "published_at", None)
+    if published_at is not None:
+        CELERY_TASK_QUEUE_TIME.labels(task.name).observe(
+            max(time.time() - published_at, 0)
+        )
+
+
+@task_postrun.connect
+def stop_task_timer(task=None, state=None, **kwargs):
+    started_at = getattr(task.request, "metrics_started_at", None)
+    if started_at is not None:
+        CELERY_TASK_RUNTIME.labels(task.name, state or "UNKNOWN").observe(
+            time.perf_counter() - started_at
+        )
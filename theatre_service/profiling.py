@@ -0,0 +1,172 @@
+"""Sampled profiling of single requests.
+
+``ProfilingMiddleware`` profiles a share of requests picked at random
+(``PROFILING_SAMPLE_RATE``) and every request from a staff user that carries
+the ``X-Profile`` header. While a request is profiled, a background thread
+samples the stack of the thread serving it every ``PROFILING_INTERVAL``
+seconds. The samples are written in the collapsed-stack format read by
+``flamegraph.pl`` and speedscope, one file per request, to
+``PROFILING_DIR``, which keeps only the newest ``PROFILING_MAX_FILES`` files.
+With the ``X-Profile: cprofile`` header a cProfile dump of the request is
+written next to it as well.
+
+The middleware removes itself from the stack when profiling is disabled, so
+it costs nothing then.
+"""
+import cProfile
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from theatre_service.metrics import route_of
+
+HEADER = "HTTP_X_PROFILE"
+RESPONSE_HEADER = "X-Profile-Id"
+
+
+class StackSampler:
+    """Count the stacks of one thread, sampled from a daemon thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                f":{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {samples}\n"
+            for stack, samples in self.stacks.most_common()
+        )
+
+
+def write_profile(directory, name, content, max_files):
+    """Write ``content`` to ``directory/name`` and delete the oldest files
+    beyond ``max_files``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, bytes):
+        (directory / name).write_bytes(content)
+    else:
+        (directory / name).write_text(content)
+
+    files = sorted(directory.iterdir(), key=lambda path: path.name)
+    for stale in files[: max(len(files) - max_files, 0)]:
+        stale.unlink(missing_ok=True)
+
+
+def is_staff(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_staff:
+        return True
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.header_enabled = settings.PROFILING_HEADER_ENABLED
+        if not self.sample_rate and not self.header_enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = settings.PROFILING_DIR
+        self.interval = settings.PROFILING_INTERVAL
+        self.max_files = settings.PROFILING_MAX_FILES
+
+    def __call__(self, request):
+        mode = self.requested_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        profiler = cProfile.Profile() if mode == "cprofile" else None
+        started = time.perf_counter()
+        sampler.start()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        name = self.profile_name(request, response, duration)
+        write_profile(
+            self.directory,
+            f"{name}.collapsed",
+            sampler.collapsed(),
+            self.max_files,
+        )
+        if profiler is not None:
+            # The format written by cProfile.Profile.dump_stats().
+            profiler.create_stats()
+            write_profile(
+                self.directory,
+                f"{name}.prof",
+                marshal.dumps(profiler.stats),
+                self.max_files,
+            )
+        if mode != "sampled":
+            response[RESPONSE_HEADER] = name
+        return response
+
+    def requested_mode(self, request):
+        """Return ``"sampled"``, ``"stack"`` or ``"cprofile"`` for a
+        request to profile and ``None`` otherwise."""
+        header = request.META.get(HEADER)
+        if header and self.header_enabled and is_staff(request):
+            return "cprofile" if header.lower() == "cprofile" else "stack"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    @staticmethod
+    def profile_name(request, response, duration):
+        # Names sort by time, which is what rotation relies on.
+        route = route_of(request).replace(":", "-").strip("<>")
+        return (
+            f"{time.time_ns()}-{request.method.lower()}-{route}-"
+            f"{response.status_code}-{round(duration * 1000)}ms"
+        )
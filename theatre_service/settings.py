@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 from pathlib import Path
@@ -17,6 +18,8 @@ from pathlib import Path
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+load_dotenv(BASE_DIR / ".env")
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -44,12 +47,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'drf_spectacular',
     'django_celery_results',
-    'debug_toolbar',
     'theatre',
     'user',
 ]
 
 MIDDLEWARE = [
+    'theatre_service.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,9 +60,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'theatre_service.profiling.ProfilingMiddleware',
 ]
 
+if DEBUG:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.append('debug_toolbar.middleware.DebugToolbarMiddleware')
+
 ROOT_URLCONF = 'theatre_service.urls'
 
 TEMPLATES = [
@@ -85,13 +92,175 @@ WSGI_APPLICATION = 'theatre_service.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
+if os.getenv("POSTGRES_DB"):
+    # A pool shared by the threads of a process; pooled connections go back
+    # to the pool after each request, persistent ones stay with their thread
+    # for CONN_MAX_AGE seconds. Under ASGI requests are served by a changing
+    # set of threads, which cannot keep persistent connections, so they are
+    # pooled unless POSTGRES_POOL_SIZE, e.g. in .env, says otherwise.
+    POSTGRES_POOL_SIZE = int(
+        os.getenv(
+            "POSTGRES_POOL_SIZE", 10 if os.getenv("SERVING_ASGI") else 0
+        )
+    )
+    POSTGRES = {
+        "ENGINE": (
+            "theatre_service.db.postgresql"
+            if POSTGRES_POOL_SIZE
+            else "django.db.backends.postgresql"
+        ),
+        "NAME": os.getenv("POSTGRES_DB"),
+        "USER": os.getenv("POSTGRES_USER"),
+        "PASSWORD": os.getenv("POSTGRES_PASSWORD"),
+        "PORT": os.getenv("POSTGRES_PORT", 5432),
+        "CONN_MAX_AGE": (
+            0 if POSTGRES_POOL_SIZE else int(os.getenv("CONN_MAX_AGE", 60))
+        ),
+        "CONN_HEALTH_CHECKS": os.getenv("CONN_HEALTH_CHECKS", "1") == "1",
+        "OPTIONS": (
+            {
+                "pool": {
+                    "max_size": POSTGRES_POOL_SIZE,
+                    "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", 30)),
+                }
+            }
+            if POSTGRES_POOL_SIZE
+            else {}
+        ),
+    }
+    DATABASES = {
+        "default": {**POSTGRES, "HOST": os.getenv("POSTGRES_HOST")},
+    }
+    for index, host in enumerate(
+        filter(None, os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",")),
+        start=1,
+    ):
+        DATABASES[f"replica_{index}"] = {
+            **POSTGRES,
+            "HOST": host,
+            "TEST": {"MIRROR": "default"},
+        }
+else:
+    # A second alias of the SQLite database stands in for a read replica in
+    # development and tests.
+    DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # A test database file rather than a shared in-memory one, on
+            # which concurrent writers fail at once instead of waiting for
+            # the table lock.
+            "TEST": {
+                "NAME": os.path.join(
+                    tempfile.gettempdir(), "test_theatre_service.sqlite3"
+                ),
+            },
+        },
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        },
+    }
+
+# Aliases of the read replicas catalogue reads are spread over
+
+DATABASE_REPLICAS = [
+    alias
+    for alias in os.getenv(
+        "DATABASE_REPLICAS",
+        ",".join(alias for alias in DATABASES if alias.startswith("replica_")),
+    ).split(",")
+    if alias
+]
+DATABASE_ROUTERS = ["theatre_service.db_router.ReplicaRouter"]
+
+# Seconds a user keeps reading from the primary after writing a reservation
+
+DATABASE_PRIMARY_PIN_SECONDS = int(
+    os.getenv("DATABASE_PRIMARY_PIN_SECONDS", 10)
+)
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         }
     }
 
+# Seconds a cached API response may be served before it is rebuilt, even
+# if none of the versions it depends on has changed
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv("RESPONSE_CACHE_TIMEOUT", 60))
+
+# Seconds a response read from a replica, which may lag behind the primary,
+# is cached and revalidated for
+
+REPLICA_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv("REPLICA_RESPONSE_CACHE_TIMEOUT", 5)
+)
+
+# How long a performance occupies its hall, which bulk scheduling keeps
+# performances in the same hall apart by
+
+PERFORMANCE_DURATION_MINUTES = int(
+    os.getenv("PERFORMANCE_DURATION_MINUTES", 180)
+)
+
+# Seat holds taken before a reservation is committed
+
+SEAT_HOLD_MINUTES = int(os.getenv("SEAT_HOLD_MINUTES", 10))
+SEAT_HOLD_MAX_MINUTES = int(os.getenv("SEAT_HOLD_MAX_MINUTES", 15))
+SEAT_HOLD_INDEX = os.getenv(
+    "SEAT_HOLD_INDEX",
+    "theatre.holds.RedisHoldIndex"
+    if REDIS_URL
+    else "theatre.holds.CacheHoldIndex",
+)
+SEAT_HOLD_INDEX_OPTIONS = {}
+
+# Outcomes of requests sent with an Idempotency-Key header, and how long a
+# retry waits for the first request with its key to finish. A running
+# request keeps its key claimed for REQUEST_TIMEOUT_SECONDS, which must be
+# at least the worker timeout of the server (gunicorn's --timeout, 30 s by
+# default) so a slow request cannot lose its claim while still running
+
+IDEMPOTENCY_KEY_HOURS = int(os.getenv("IDEMPOTENCY_KEY_HOURS", 24))
+IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 30))
+REQUEST_TIMEOUT_SECONDS = int(os.getenv("REQUEST_TIMEOUT_SECONDS", 60))
+
+# Live seat changes streamed to clients as server-sent events
+
+SEAT_EVENTS_BROKER = os.getenv(
+    "SEAT_EVENTS_BROKER",
+    "theatre.events.RedisBroker"
+    if REDIS_URL
+    else "theatre.events.InMemoryBroker",
+)
+SEAT_EVENTS_BROKER_OPTIONS = {}
+SEAT_EVENTS_QUEUE_SIZE = int(os.getenv("SEAT_EVENTS_QUEUE_SIZE", 100))
+SEAT_EVENTS_KEEPALIVE = int(os.getenv("SEAT_EVENTS_KEEPALIVE", 15))
+
+# Request profiling, off unless a sample rate is set or staff users may ask
+# for a profile with the X-Profile header
+
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0))
+PROFILING_HEADER_ENABLED = os.getenv("PROFILING_HEADER_ENABLED") == "1"
+PROFILING_DIR = os.getenv("PROFILING_DIR", BASE_DIR / "profiles")
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", 0.005))
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", 200))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -127,6 +296,12 @@ INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+# /metrics is served to these addresses, and to anyone sending
+# "Authorization: Bearer <METRICS_TOKEN>" when a token is set
+
+METRICS_ALLOWED_IPS = os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1").split(",")
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
@@ -149,8 +324,17 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'theatre.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'theatre.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 1,
+    'PAGE_SIZE': int(os.getenv("API_PAGE_SIZE", 20)),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'theatre_service.settings')
 
 application = get_wsgi_application()
+
+# Read the search vocabulary now rather than on the first search.
+from theatre import search  # noqa: E402
+
+search.read_vocabulary_in_background()